@@ -0,0 +1,1459 @@
+#!/usr/bin/env python3
+"""
+RAM Guardian benchmarks
+Measures daemon hot paths offline, without a desktop session.
+
+  bench.py ipc [--clients N] [--requests N] [--command CMD] [--socket PATH]
+  bench.py history [--appends N] [--records N]
+  bench.py forecast [--processes N] [--scans N] [--leaking N]
+  bench.py scan [--processes N,N] [--workers N,N] [--live]
+  bench.py suite [--processes N] [--save-baseline] [--tolerance PCT]
+  bench.py relief
+  bench.py notify [--notifications N]
+  bench.py cgroups [--processes N] [--repeat N]
+  bench.py replay [--processes N] [--hours H]
+  bench.py stress [--processes N] [--clients N] [--seconds S]
+  bench.py pressure [--wakeups N]
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import multiprocessing
+import platform
+import random
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Optional, Union
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import ramguardd as ramguard  # noqa: E402
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def _report(title: str, rows: list[tuple[str, str]]) -> None:
+    print(title)
+    width = max(len(key) for key, _ in rows)
+    for key, value in rows:
+        print(f"  {key:<{width}}  {value}")
+
+
+# === Synthetic /proc ===
+
+CHROMIUM_FLAGS = (
+    "--enable-crashpad --enable-features=SharedArrayBuffer,WebRTCPipeWireCapturer "
+    "--disable-features=SpareRendererForSitePerProcess,WinRetrieveSuggestionsOnlyOnDemand "
+    "--lang=en-US --num-raster-threads=4 --enable-main-frame-before-activation "
+    "--renderer-client-id={id} --time-ticks-at-unix-epoch=-1729235412345678 "
+    "--launch-time-ticks=123456789 --shared-files=v8_context_snapshot_data:100 "
+    "--field-trial-handle=3,i,1234567890123456789,9876543210987654321,262144"
+)
+
+
+def _write_proc(root: Path, pid: int, ppid: int, comm: str, rss_mb: float, start: int,
+                argv: list[str]) -> None:
+    d = root / str(pid)
+    d.mkdir()
+    pages = int(rss_mb * 256)  # 4 KiB pages
+    fields = ["S", ppid, pid, pid, 0, -1, 4194560, 1200, 0, 3, 0, 150, 40, 0, 0, 20, 0,
+              12, 0, start, int(rss_mb * 3 * 2**20), pages] + [0] * 30
+    (d / "stat").write_text(f"{pid} ({comm[:15]}) " + " ".join(map(str, fields)) + "\n")
+    (d / "cmdline").write_bytes("\0".join(argv).encode() + b"\0" if argv else b"")
+    if pages:
+        (d / "oom_score").write_text(f"{min(1000, pages // 4096)}\n")
+        (d / "oom_score_adj").write_text("0\n")
+        kib = pages * 4
+        (d / "smaps_rollup").write_text(
+            f"00400000-7fff00000000 ---p 00000000 00:00 0 [rollup]\n"
+            f"Rss: {kib} kB\nPss: {kib * 2 // 3} kB\n"
+            f"Shared_Clean: {kib // 2} kB\nShared_Dirty: 0 kB\n"
+            f"Private_Clean: {kib // 8} kB\nPrivate_Dirty: {kib * 3 // 8} kB\n"
+        )
+
+
+def make_procfs(root: Path, processes: int, seed: int = 1) -> None:
+    """Populate root with a /proc-like tree of about `processes` processes.
+
+    A desktop's worth of Electron apps (main, zygote, GPU, utility and
+    renderer helpers with Chromium-style cmdlines), a browser with content
+    processes, kernel threads and, to make up the count, container workloads.
+    """
+    rng = random.Random(seed)
+    pid = 100
+    start = 1000
+    count = 2
+
+    def spawn(ppid: int, comm: str, rss_mb: float, argv: list[str]) -> int:
+        nonlocal pid, start, count
+        pid += rng.randint(1, 3)
+        start += rng.randint(1, 50)
+        count += 1
+        _write_proc(root, pid, ppid, comm, rss_mb, start, argv)
+        return pid
+
+    _write_proc(root, 1, 0, "systemd", 12, 1, ["/sbin/init"])
+    _write_proc(root, 2, 0, "kthreadd", 0, 1, [])
+    for cpu in range(min(32, processes // 20)):
+        spawn(2, f"kworker/{cpu}:1", 0, [])
+    user = spawn(1, "systemd", 10, ["/usr/lib/systemd/systemd", "--user"])
+
+    apps = ["code", "slack", "discord", "obsidian", "spotify", "signal-desktop", "notion", "teams"]
+    for app in apps[:max(1, min(len(apps), processes // 100))]:
+        exe = f"/opt/{app}/{app}"
+        main = spawn(user, app, rng.uniform(80, 300), [exe])
+        zygote = spawn(main, app, rng.uniform(5, 20), [exe, "--type=zygote", "--no-zygote-sandbox"])
+        spawn(main, app, rng.uniform(60, 200), [exe, "--type=gpu-process", CHROMIUM_FLAGS.format(id=0)])
+        spawn(main, app, rng.uniform(20, 60),
+              [exe, "--type=utility", "--utility-sub-type=network.mojom.NetworkService"])
+        for i in range(rng.randint(3, 25)):
+            spawn(zygote, app, rng.uniform(30, 400),
+                  [exe, "--type=renderer", CHROMIUM_FLAGS.format(id=i + 4)])
+
+    firefox = spawn(user, "firefox", 450, ["/usr/lib/firefox/firefox"])
+    for i in range(min(12, processes // 50)):
+        spawn(firefox, "Isolated Web Co", rng.uniform(40, 350),
+              ["/usr/lib/firefox/firefox", "-contentproc", "-childID", str(i), "tab"])
+
+    # Containers: a shim, the workload's main process and its same-named workers
+    workloads = [("postgres", 30), ("nginx", 8), ("python3", 60), ("node", 90), ("java", 400)]
+    while count < processes:
+        shim = spawn(1, "containerd-shim", 10, ["/usr/bin/containerd-shim-runc-v2"])
+        comm, mb = rng.choice(workloads)
+        main = spawn(shim, comm, rng.uniform(mb * 0.5, mb * 2), [comm])
+        for _ in range(min(rng.randint(0, 16), processes - count)):
+            spawn(main, comm, rng.uniform(mb * 0.05, mb * 0.5), [comm, "--worker"])
+
+
+def _scratch_dir(prefix: str) -> Path:
+    """A scratch directory, in RAM when /dev/shm is available."""
+    parent = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return Path(tempfile.mkdtemp(prefix=prefix, dir=parent))
+
+
+# === Scanner ===
+
+def _time_scans(scanner, repeat: int) -> tuple[float, float]:
+    """Median wall and CPU seconds of a scan (CPU covers all daemon threads)."""
+    min_rss = ramguard.MIN_PROCESS_MB * ramguard.MIB
+    scanner.scan(min_rss, lambda name: False)  # Warm up the pool and the dentry cache
+    wall, cpu = [], []
+    for _ in range(repeat):
+        start, start_cpu = time.perf_counter(), time.process_time()
+        scanner.scan(min_rss, lambda name: False)
+        wall.append(time.perf_counter() - start)
+        cpu.append(time.process_time() - start_cpu)
+    return statistics.median(wall), statistics.median(cpu)
+
+
+def _spawn_idle(count: int) -> list[subprocess.Popen]:
+    return [subprocess.Popen(["sleep", "3600"]) for _ in range(count)]
+
+
+def bench_scan(args: argparse.Namespace) -> None:
+    for processes in args.processes:
+        children = []
+        if args.live:
+            # Real procfs: pad the live process table with idle children
+            live = sum(1 for name in os.listdir("/proc") if name.isdigit())
+            children = _spawn_idle(max(0, processes - live))
+            root, where = Path("/proc"), "live /proc"
+        else:
+            root, where = _scratch_dir("ramguard-proc-"), "synthetic /proc"
+            make_procfs(root, processes)
+        try:
+            rows = []
+            serial = None
+            for workers in args.workers:
+                scanner = ramguard.ProcessScanner(root, workers=workers)
+                wall, cpu = _time_scans(scanner, args.repeat)
+                scanner.close()
+                serial = serial or wall
+                rows.append((
+                    f"{workers} worker{'s' if workers > 1 else ''}",
+                    f"wall {wall * 1000:7.2f} ms  cpu {cpu * 1000:7.2f} ms  x{serial / wall:.2f}",
+                ))
+            _report(f"Scan, {where}, {scanner.stats.total} processes", rows)
+        finally:
+            for child in children:
+                child.kill()
+            for child in children:
+                child.wait()
+            if not args.live:
+                subprocess.run(["rm", "-rf", str(root)], check=False)
+
+
+# === IPC ===
+
+def _serve(socket_path: str, ready, proc_root: str = "", config: str = "") -> None:
+    """Run only the daemon's IPC server (no main loop) in a child process."""
+    ramguard.SOCKET_PATH = Path(socket_path)
+    if config:
+        guard = _offline_guard(Path(proc_root), Path(config))
+    else:
+        ramguard.CONFIG_FILE = Path(socket_path).with_suffix(".toml")  # never exists
+        guard = ramguard.RamGuard()
+    guard._sample_system()
+    guard._scan_processes()
+    guard._start_socket_server()
+    ready.set()
+    while True:
+        time.sleep(3600)
+
+
+def _request(path: str, command: str) -> str:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall(command.encode() + b"\n")
+        with sock.makefile("rb") as f:
+            return f.readline().decode()
+
+
+async def _client(path: str, command: bytes, requests: int, latencies: list[float]) -> None:
+    reader, writer = await asyncio.open_unix_connection(path, limit=ramguard.MAX_REQUEST_BYTES)
+    try:
+        for _ in range(requests):
+            start = time.perf_counter()
+            writer.write(command)
+            await writer.drain()
+            await reader.readuntil(b"\n")
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+
+async def _run_clients(path: str, command: bytes, clients: int, requests: int) -> list[float]:
+    latencies: list[float] = []
+    await asyncio.gather(*(_client(path, command, requests, latencies) for _ in range(clients)))
+    return latencies
+
+
+def bench_ipc(args: argparse.Namespace) -> None:
+    server = None
+    path = args.socket
+    if path is None:
+        path = str(Path(tempfile.mkdtemp(prefix="ramguard-bench-")) / "ramguard.sock")
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=_serve, args=(path, ready), daemon=True)
+        server.start()
+        if not ready.wait(10):
+            sys.exit("IPC server did not start")
+
+    try:
+        command = args.command.encode() + b"\n"
+        start = time.perf_counter()
+        latencies = asyncio.run(_run_clients(path, command, args.clients, args.requests))
+        elapsed = time.perf_counter() - start
+    finally:
+        if server is not None:
+            server.terminate()
+
+    ms = [latency * 1000 for latency in latencies]
+    _report(f"IPC '{args.command}' x {len(ms)}", [
+        ("clients", str(args.clients)),
+        ("requests/client", str(args.requests)),
+        ("wall time", f"{elapsed:.3f} s"),
+        ("throughput", f"{len(ms) / elapsed:,.0f} req/s"),
+        ("latency p50", f"{statistics.median(ms):.3f} ms"),
+        ("latency p95", f"{_percentile(ms, 95):.3f} ms"),
+        ("latency p99", f"{_percentile(ms, 99):.3f} ms"),
+        ("latency max", f"{max(ms):.3f} ms"),
+    ])
+
+
+# === History ===
+
+def bench_history(args: argparse.Namespace) -> None:
+    path = Path(tempfile.mkdtemp(prefix="ramguard-bench-")) / "history.bin"
+    log = ramguard.HistoryLog(path, args.records)
+    log.open()
+    state = ramguard.SystemState(
+        memory_percent=50.0, memory_used_gb=8.0, memory_total_gb=16.0,
+        memory_used=8 << 30, memory_total=16 << 30, memory_available=8 << 30,
+        top_processes=[
+            ramguard.ProcessInfo(1000 + i, 0, f"proc-{i}", (800 - i * 50) << 20, 0, 0, False)
+            for i in range(ramguard.HISTORY_TOP_N)
+        ],
+    )
+
+    timings = []
+    clock = time.perf_counter
+    for i in range(args.appends):
+        start = clock()
+        log.append(float(i + 1), state)
+        timings.append(clock() - start)
+    log.close()
+
+    start = clock()
+    records = ramguard.HistoryLog.read(path)
+    read_time = clock() - start
+    size = path.stat().st_size
+    path.unlink()
+
+    us = [t * 1e6 for t in timings]
+    _report(f"History append x {len(us)}", [
+        ("file size", f"{size:,} bytes"),
+        ("append p50", f"{statistics.median(us):.2f} us"),
+        ("append p99", f"{_percentile(us, 99):.2f} us"),
+        ("append max", f"{max(us):.2f} us"),
+        (f"read {len(records):,} records", f"{read_time * 1000:.1f} ms"),
+    ])
+
+
+# === Forecast ===
+
+def bench_forecast(args: argparse.Namespace) -> None:
+    """Feed synthetic RSS series through the growth tracker and check its verdicts.
+
+    Leaking processes grow linearly with noise; the rest wobble around a
+    level or saw-tooth like a garbage-collected heap. Available memory
+    falls at a known rate, so the exhaustion estimate can be checked too.
+    """
+    rng = random.Random(args.seed)
+    policy = ramguard.Policy.compile(copy.deepcopy(ramguard.DEFAULT_CONFIG))
+    mib = ramguard.MIB
+    leak_rate = policy.leak_rate * 2  # comfortably above the threshold
+    drain = 100 * mib / 60  # available memory falls 100 MB/min
+    available0 = 4096 * mib
+
+    records = []
+    for i in range(args.processes):
+        base = rng.randint(60, 1500) * mib
+        records.append(ramguard.ProcessInfo(10_000 + i, 0, f"proc-{i}", base, 0, 0, False))
+    bases = [rec.rss for rec in records]
+    leaking = set(range(args.leaking))
+
+    tracker = ramguard.GrowthTracker()
+    forecast = ramguard.Forecast()
+    timings = []
+    for scan in range(args.scans):
+        now = scan * args.interval
+        for i, rec in enumerate(records):
+            noise = rng.gauss(0, 4 * mib)
+            if i in leaking:
+                rec.rss = int(bases[i] + leak_rate * now + noise)
+            elif i % 3 == 0:  # GC saw-tooth: climbs for 90s, then drops back
+                rec.rss = int(bases[i] + (now % 90) * 2 * mib + noise)
+            else:
+                rec.rss = int(bases[i] + noise)
+        start = time.perf_counter()
+        tracker.add_processes(now, records, forecast, policy)
+        tracker.add_system(now, int(available0 - drain * now + rng.gauss(0, 8 * mib)),
+                           forecast, policy)
+        timings.append(time.perf_counter() - start)
+
+    found = {rec.pid - 10_000 for rec, _ in forecast.leaks}
+    errors = [abs(rate - leak_rate) / leak_rate * 100 for _, rate in forecast.leaks]
+    now = (args.scans - 1) * args.interval
+    true_exhaustion = (available0 - drain * now) / drain
+    us = [t * 1e6 for t in timings]
+    _report(f"Forecast over {args.processes} processes x {args.scans} scans", [
+        ("update p50", f"{statistics.median(us):.1f} us"),
+        ("per process", f"{statistics.median(us) / args.processes:.2f} us"),
+        ("update p99", f"{_percentile(us, 99):.1f} us"),
+        ("leaks found", f"{len(found & leaking)}/{len(leaking)}"),
+        ("false positives", str(len(found - leaking))),
+        ("slope error max", f"{max(errors):.1f} %" if errors else "-"),
+        ("exhaustion", f"{forecast.exhaustion_seconds or 0:.0f} s (true {true_exhaustion:.0f} s)"),
+    ])
+    if found != leaking:
+        sys.exit("forecast: leak verdicts differ from the synthetic truth")
+
+
+# === Suite ===
+
+BASELINE_FILE = ramguard.STATE_DIR / "bench-baseline.json"
+
+
+def make_cgroupfs(root: Path) -> Path:
+    """Populate root with a cgroup v2-like tree; returns the user@UID.service dir.
+
+    Plain files are enough for CgroupLimiter to create scopes and "move"
+    PIDs into them, and for PressureMonitor to read averages.
+    """
+    user = root / "user.slice" / "user-1000.slice" / "user@1000.service"
+    user.mkdir(parents=True)
+    (root / "cgroup.controllers").write_text("cpuset cpu io memory hugetlb pids rdma misc\n")
+    (user / "cgroup.controllers").write_text("cpu memory pids\n")
+    (user / "cgroup.subtree_control").write_text("memory pids\n")
+    (user / "memory.pressure").write_text(
+        "some avg10=1.25 avg60=0.80 avg300=0.30 total=123456\n"
+        "full avg10=0.40 avg60=0.20 avg300=0.05 total=45678\n"
+    )
+    return user
+
+
+def _offline_config(path: Path, cgroup: Path, overrides: Optional[dict] = None) -> Path:
+    """Write a config that keeps the daemon inside the synthetic trees.
+
+    Electron limits are set low so every synthetic app crosses 80% of its
+    limit and the limiter path is exercised. overrides maps sections to
+    the keys to change in them.
+    """
+    config = copy.deepcopy(ramguard.DEFAULT_CONFIG)
+    config["electron"]["cgroup_root"] = str(cgroup)
+    config["electron"]["max_memory_mb"] = 256
+    config["pressure"]["path"] = str(cgroup / "memory.pressure")
+    config["history"]["enabled"] = False
+    for section, values in (overrides or {}).items():
+        config[section].update(values)
+    path.write_text(ramguard._dump_toml(config) + "\n")
+    return path
+
+
+def _offline_guard(proc_root: Path, config: Path, clock=time) -> "ramguard.RamGuard":
+    """A daemon on the synthetic trees: no session bus, notify-send or systemd.
+
+    The notifier is never started, so notifications only queue up.
+    """
+    ramguard.CONFIG_FILE = config
+    ramguard.HISTORY_FILE = config.with_name("history.bin")
+    guard = ramguard.RamGuard(proc_root, clock=clock)
+    guard._log = guard.relief.log = lambda msg: None
+    return guard
+
+
+def _median_time(fn, repeat: int, setup=None) -> float:
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def _format_seconds(seconds: float) -> str:
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:8.2f} us"
+    return f"{seconds * 1e3:8.2f} ms"
+
+
+def _suite_metrics(args: argparse.Namespace, scratch: Path) -> dict[str, float]:
+    """Median seconds per operation; lower is better for every metric."""
+    proc_root = scratch / "proc"
+    proc_root.mkdir()
+    make_procfs(proc_root, args.processes)
+    cgroup = make_cgroupfs(scratch / "cgroup")
+    config = _offline_config(scratch / "ramguard.toml", cgroup)
+
+    guard = _offline_guard(proc_root, config)
+    guard._poll_memory()  # Warm the classification and PSS caches
+    repeat = args.repeat
+    metrics = {}
+
+    min_rss = ramguard.MIN_PROCESS_MB * ramguard.MIB
+    metrics["scan"] = _median_time(
+        lambda: guard.scanner.scan(min_rss, guard._is_whitelisted), repeat
+    )
+    metrics["poll_memory"] = _median_time(guard._poll_memory, repeat)
+
+    samples = []
+    for entry in os.scandir(proc_root):
+        argv = guard.scanner.read_cmdline(int(entry.name)) or []
+        samples.append((os.path.basename(argv[0]) if argv else entry.name, " ".join(argv)))
+
+    def classify_all() -> None:
+        for name, cmdline in samples:
+            guard._is_electron_process(name, cmdline)
+
+    metrics["is_electron_process"] = _median_time(classify_all, repeat) / len(samples)
+
+    def every_group_appears() -> None:
+        guard.diff = ramguard.ScanDiff(appeared=list(guard.table.records.values()))
+        guard.known_electron.clear()
+        guard.limited.clear()
+        guard.leak_suspects.clear()
+        guard.last_notification_time.clear()
+        guard.state.alert_level = "warning"
+        for scope in cgroup.glob("ramguard-*.scope"):
+            shutil.rmtree(scope)
+
+    metrics["check_and_notify"] = _median_time(guard._check_and_notify, repeat, every_group_appears)
+    metrics["status_json"] = _median_time(lambda: json.dumps(guard._get_status()), repeat)
+    metrics["render_waybar"] = _median_time(
+        lambda: json.dumps(ramguard.render_waybar(guard._get_status())), repeat
+    )
+
+    path = str(scratch / "ramguard.sock")
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=_serve, args=(path, ready, str(proc_root), str(config)), daemon=True
+    )
+    server.start()
+    try:
+        if not ready.wait(30):
+            sys.exit("IPC server did not start")
+        asyncio.run(_run_clients(path, b"status\n", 1, 20))  # Warm up
+        latencies = asyncio.run(_run_clients(path, b"status\n", 1, args.requests))
+        metrics["ipc_status_p50"] = statistics.median(latencies)
+        metrics["ipc_status_p99"] = _percentile(latencies, 99)
+        latencies = asyncio.run(_run_clients(path, b"processes\n", 1, max(1, args.requests // 10)))
+        metrics["ipc_processes_p50"] = statistics.median(latencies)
+        generation = json.loads(_request(path, "status"))["generation"]
+        since = f"processes?since={generation}\n".encode()
+        latencies = asyncio.run(_run_clients(path, since, 1, args.requests))
+        metrics["ipc_processes_since_p50"] = statistics.median(latencies)
+    finally:
+        server.terminate()
+        server.join()
+    return metrics
+
+
+def bench_suite(args: argparse.Namespace) -> None:
+    scratch = _scratch_dir("ramguard-suite-")
+    try:
+        metrics = _suite_metrics(args, scratch)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    # Baselines are kept per process count; only like is compared with like
+    key = str(args.processes)
+    try:
+        baselines = json.loads(args.baseline.read_text())
+    except (OSError, ValueError):
+        baselines = {}
+    baseline = baselines.get(key, {}).get("metrics", {})
+
+    rows = []
+    regressions = []
+    for name, value in metrics.items():
+        old = baseline.get(name)
+        if old:
+            delta = (value - old) / old * 100
+            verdict = ""
+            if delta > args.tolerance:
+                verdict = "  REGRESSION"
+                regressions.append(name)
+            rows.append((name, f"{_format_seconds(value)}  (baseline {_format_seconds(old).strip()}, "
+                               f"{delta:+.1f}%){verdict}"))
+        else:
+            rows.append((name, _format_seconds(value)))
+    _report(f"Suite, synthetic /proc, {args.processes} processes", rows)
+
+    if args.save_baseline:
+        baselines[key] = {
+            "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "metrics": metrics,
+        }
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(baselines, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+    elif not baseline:
+        print(f"No baseline for {args.processes} processes in {args.baseline}; use --save-baseline")
+    if regressions and not args.save_baseline:
+        sys.exit(f"Slower than baseline by more than {args.tolerance:.0f}%: {', '.join(regressions)}")
+
+
+# === Relief ===
+
+def bench_relief(args: argparse.Namespace) -> None:
+    """Walk the relief engine up and down its ladder on a fake cgroupfs.
+
+    Four apps, the top three acted on, Slack focused until the last tick.
+    Each app starts in its own app-*.scope; only VS Code's is writable, so
+    it is acted on in place and the others move into ramguard scopes and
+    back. Slack's shares a writable scope with the terminal it was started
+    from, which must not be acted on. Each tick's expected outcome is checked against the files the
+    engine wrote.
+    """
+    scratch = _scratch_dir("ramguard-relief-")
+    try:
+        mount = scratch / "cgroup"
+        cgroup = make_cgroupfs(mount)
+        config = copy.deepcopy(ramguard.DEFAULT_CONFIG)
+        config["relief"]["kill_after_seconds"] = 30
+        policy = ramguard.Policy.compile(config)
+        limiter = ramguard.CgroupLimiter(cgroup, mount, scratch / "proc")
+        engine = ramguard.ReliefEngine(limiter, lambda msg: None)
+
+        mib = ramguard.MIB
+        own_high = str(3 * 1024 * mib)  # VS Code's scope's memory.high before relief
+        offenders = []
+        units = {}
+        scopes = {}
+        for i, (app, mb) in enumerate([("Discord", 1500), ("Slack", 1200), ("VS Code", 900),
+                                       ("Spotify", 400)]):
+            pids = [1000 + i * 10 + j for j in range(5)]
+            offenders.append((app, mb * mib, pids))
+            if app == "Slack":  # Started from a terminal: its scope holds the terminal too
+                unit = units[app] = cgroup / "app.slice" / "app-Hyprland-kitty-1.scope"
+            else:
+                unit = units[app] = cgroup / "app.slice" / f"app-{limiter.scope_path(app).stem[9:]}.scope"
+            unit.mkdir(parents=True)
+            for pid in pids:
+                (scratch / "proc" / str(pid)).mkdir(parents=True)
+                (scratch / "proc" / str(pid) / "cgroup").write_text(f"0::/{unit.relative_to(mount)}\n")
+            if app in ("VS Code", "Slack"):  # Delegated and writable
+                (unit / "memory.high").write_text(own_high + "\n")
+                (unit / "cgroup.freeze").write_text("0\n")
+                terminal = [100] if app == "Slack" else []
+                (unit / "cgroup.procs").write_text("".join(f"{pid}\n" for pid in terminal + pids))
+            if app == "VS Code":  # Holds only VS Code: acted on in place
+                scope = unit
+            else:
+                scope = limiter.scope_path(app)
+                scope.mkdir()
+            (scope / "memory.current").write_text(str(mb * mib))
+            scopes[app] = scope
+
+        def read(app: str, name: str) -> str:
+            try:
+                return (scopes[app] / name).read_text().strip()
+            except OSError:
+                return ""
+
+        def procs_written(app: str) -> int:
+            return len((units[app] / "cgroup.procs").read_text().split())
+
+        limited_at = 0  # procs_written("Slack") when its scope got a memory limit
+
+        def moved_back(app: str) -> bool:
+            pids = next(pids for name, _, pids in offenders if name == app)
+            written = (units[app] / "cgroup.procs").read_text().split()
+            return written[-len(pids):] == [str(pid) for pid in pids]  # The fake file only grows
+
+        # (time, RAM %, level, PSI some avg10, check description, check)
+        ticks = [
+            (0, 70, "normal", 0, "normal: nothing touched",
+             lambda: not any(read(app, "memory.high") for app, _, _ in offenders if app != "VS Code")
+             and read("VS Code", "memory.high") == own_high),
+            (5, 82, "warning", 5, "warning: top three throttled to 90%",
+             lambda: read("Discord", "memory.high") == str(int(1500 * mib * 0.9))
+             and read("VS Code", "memory.high") == str(int(900 * mib * 0.9))
+             and (units["Slack"] / "memory.high").read_text().strip() == own_high
+             and not read("Spotify", "memory.high")
+             and not limiter.scope_path("VS Code").exists()),
+            (10, 84, "warning", 15, "rising PSI: background apps reclaimed",
+             lambda: read("Discord", "memory.reclaim") == str(int(1500 * mib * 0.1))
+             and not read("Slack", "memory.reclaim")),
+            (15, 92, "critical", 30, "critical: unfocused apps frozen",
+             lambda: read("Discord", "cgroup.freeze") == "1" and read("VS Code", "cgroup.freeze") == "1"
+             and not read("Slack", "cgroup.freeze")),
+            (50, 93, "critical", 35, "critical 35s after freezing: largest frozen app killed",
+             lambda: read("Discord", "cgroup.kill") == "1" and not read("VS Code", "cgroup.kill")),
+            (55, 86, "warning", 20, "within hysteresis of critical: still frozen",
+             lambda: read("VS Code", "cgroup.freeze") == "1"),
+            (60, 84, "warning", 10, "5% below critical: thawed",
+             lambda: read("VS Code", "cgroup.freeze") == "0" and not engine.frozen),
+            (65, 76, "normal", 2, "within hysteresis of warning: still throttled",
+             lambda: read("VS Code", "memory.high") != "max"),
+            (70, 74, "normal", 1, "5% below warning: throttles lifted, processes moved back",
+             lambda: read("Slack", "memory.high") == "max" and read("VS Code", "memory.high") == own_high
+             and moved_back("Slack") and not engine.active and not engine.origins),
+            (75, 92, "critical", 30, "critical, focus unknown: throttled, nothing frozen",
+             lambda: read("Slack", "memory.high") != "max" and not engine.frozen),
+            (80, 70, "normal", 0, "Slack limited meanwhile: released, kept in its limited scope",
+             lambda: not engine.active and not engine.origins and procs_written("Slack") == limited_at),
+        ]
+        rows = []
+        failed = []
+        for now, percent, level, psi, what, check in ticks:
+            if now == 80:  # As _apply_memory_limit would, into the same scope
+                (limiter.scope_path("Slack") / "memory.max").write_text(str(1024 * mib))
+                limited_at = procs_written("Slack")
+            state = ramguard.SystemState(percent, 0, 0, alert_level=level,
+                                         pressure={"some": {"avg10": psi}})
+            start = time.perf_counter()
+            focus = "Slack" if now < 75 else None
+            actions = engine.step(state, offenders, lambda: focus, policy, now)
+            elapsed = time.perf_counter() - start
+            ok = check()
+            if not ok:
+                failed.append(what)
+            steps = ", ".join(f"{a.step} {a.app}" for a in actions) or "-"
+            rows.append((f"{percent}% {level:<8}", f"{'ok  ' if ok else 'FAIL'} {elapsed * 1e6:6.0f} us  "
+                                                     f"{engine.stage:<8} {steps}"))
+        _report("Relief ladder on a fake cgroupfs", rows)
+        if failed:
+            sys.exit(f"relief: {'; '.join(failed)}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+# === Notifications ===
+
+BUS_CONFIG = """<!DOCTYPE busconfig PUBLIC "-//freedesktop//DTD D-Bus Bus Configuration 1.0//EN"
+ "http://www.freedesktop.org/standards/dbus/1.0/busconfig.dtd">
+<busconfig>
+  <type>session</type>
+  <listen>unix:path={path}</listen>
+  <auth>EXTERNAL</auth>
+  <policy context="default">
+    <allow send_destination="*" eavesdrop="true"/>
+    <allow eavesdrop="true"/>
+    <allow own="*"/>
+  </policy>
+</busconfig>
+"""
+
+
+class _NotificationServer:
+    """A stand-in org.freedesktop.Notifications on a private bus.
+
+    Answers Notify with a fresh id (or the replaced one) and, for
+    notifications with actions, sends ActionInvoked for the first action
+    straight after the reply, as a server does when the user is quicker
+    than the daemon's threads.
+    """
+
+    def __init__(self, address: str):
+        self.bus = ramguard.DBusConnection(address)
+        self.received: list[tuple] = []  # Notify bodies
+        self.next_id = 100
+        self.ready = threading.Event()
+
+    def serve(self) -> None:
+        bus = self.bus
+        bus.connect()
+        name = ramguard.NotificationDispatcher.BUS_NAME
+        serial = bus.call("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                          "RequestName", "su", (name, 4))
+        while bus.read_message().reply_serial != serial:
+            pass
+        self.ready.set()
+        try:
+            while True:
+                msg = bus.read_message()
+                if msg.type != ramguard.DBUS_METHOD_CALL or msg.member != "Notify":
+                    continue
+                self.received.append(msg.body)
+                replaces, actions = msg.body[1], msg.body[5]
+                if replaces:
+                    notification_id = replaces
+                else:
+                    self.next_id += 1
+                    notification_id = self.next_id
+                bus.send(ramguard.DBUS_METHOD_RETURN, [(5, "u", msg.serial), (6, "s", msg.fields[7])],
+                         "u", (notification_id,))
+                if actions:
+                    bus.send(ramguard.DBUS_SIGNAL, [
+                        (1, "o", ramguard.NotificationDispatcher.OBJECT_PATH),
+                        (2, "s", name), (3, "s", "ActionInvoked"),
+                    ], "us", (notification_id, actions[0]))
+        except (OSError, ValueError):
+            pass  # Bus gone
+
+    def close_notification(self, notification_id: int) -> None:
+        self.bus.send(ramguard.DBUS_SIGNAL, [
+            (1, "o", ramguard.NotificationDispatcher.OBJECT_PATH),
+            (2, "s", ramguard.NotificationDispatcher.BUS_NAME), (3, "s", "NotificationClosed"),
+        ], "uu", (notification_id, 2))
+
+
+def bench_notify(args: argparse.Namespace) -> None:
+    """NotificationDispatcher against a stand-in notification server on a private dbus-daemon.
+
+    Checks that Notify arrives intact through the hand-written marshalling,
+    that an ActionInvoked sent right after the Notify reply still reaches
+    the action handler, and that replaces_id follows shown and closed
+    notifications.
+    """
+    daemon = shutil.which("dbus-daemon")
+    if daemon is None:
+        print("notify: dbus-daemon not installed; skipped")
+        return
+    scratch = _scratch_dir("ramguard-notify-")
+    bus = None
+    try:
+        socket_path = scratch / "bus"
+        config = scratch / "bus.conf"
+        config.write_text(BUS_CONFIG.format(path=socket_path))
+        bus = subprocess.Popen([daemon, "--nofork", f"--config-file={config}"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 5
+        while not socket_path.exists():
+            if time.monotonic() > deadline:
+                sys.exit("notify: dbus-daemon did not start")
+            time.sleep(0.01)
+        address = f"unix:path={socket_path}"
+
+        server = _NotificationServer(address)
+        threading.Thread(target=server.serve, daemon=True).start()
+        if not server.ready.wait(5):
+            sys.exit("notify: stand-in server did not start")
+
+        actions: list[tuple[str, str]] = []
+        routed = threading.Condition()
+
+        def on_action(action: str, category: str) -> None:
+            with routed:
+                actions.append((action, category))
+                routed.notify_all()
+
+        logs: list[str] = []
+        dispatcher = ramguard.NotificationDispatcher(on_action, logs.append, address=address)
+        dispatcher.start()
+
+        def delivered(count: int) -> bool:
+            deadline = time.monotonic() + 5
+            while dispatcher.sent < count and time.monotonic() < deadline:
+                time.sleep(0.005)
+            return dispatcher.sent >= count
+
+        checks = []
+
+        def check(what: str, ok: bool) -> None:
+            checks.append((what, "ok" if ok else "FAIL"))
+
+        start = time.perf_counter()
+        count = args.notifications
+        for i in range(count):
+            dispatcher.submit(f"Title {i} ✓", f"Body {i}\nline 2", "critical",
+                              [(f"kill:{i}", "Kill"), ("open_menu", "Open Menu")], f"ramguard-{i}")
+            if not delivered(i + 1):
+                break
+        elapsed = time.perf_counter() - start
+        with routed:
+            routed.wait_for(lambda: len(actions) >= count, 5)
+        first = server.received[0] if server.received else ()
+        check("Notify arguments arrive intact",
+              first[:5] == ("RAM Guardian", 0, "", "Title 0 ✓", "Body 0\nline 2")
+              and first[5] == ["kill:0", "Kill", "open_menu", "Open Menu"]
+              and first[6] == {"urgency": 2, "category": "ramguard-0"} and first[7] == -1)
+        check(f"{count} actions sent right after the reply all routed",
+              sorted(actions) == sorted((f"kill:{i}", f"ramguard-{i}") for i in range(count)))
+
+        dispatcher.submit("Again", "", "normal", [], "ramguard-0")
+        delivered(count + 1)
+        check("a category's next notification replaces the shown one", server.received[-1][1] == 101)
+        server.close_notification(101)
+        time.sleep(0.1)
+        dispatcher.submit("After close", "", "normal", [], "ramguard-0")
+        delivered(count + 2)
+        check("a closed notification is not replaced", server.received[-1][1] == 0)
+        check("nothing logged", not logs)
+        dispatcher.stop()
+
+        rows = checks + [("round trip", f"{elapsed / count * 1e3:.2f} ms per notification")]
+        _report(f"Notifications over a private dbus-daemon, {count} with actions", rows)
+        failed = [what for what, verdict in checks if verdict != "ok"]
+        if failed:
+            sys.exit(f"notify: {'; '.join(failed)}")
+    finally:
+        if bus is not None:
+            bus.terminate()
+            bus.wait()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+# === Cgroup accounting ===
+
+MEMORY_EVENTS = "low 0\nhigh 0\nmax 0\noom {oom}\noom_kill {oom_kill}\noom_group_kill 0\n"
+
+
+def _write_leaf(scope: Path, pids: list[int], current: int) -> None:
+    scope.mkdir(parents=True)
+    (scope / "cgroup.procs").write_text("".join(f"{pid}\n" for pid in pids))
+    (scope / "memory.current").write_text(f"{current}\n")
+    (scope / "memory.stat").write_text(
+        f"anon {current * 3 // 4}\nfile {current // 4}\nkernel 0\nshmem {current // 16}\n"
+    )
+    (scope / "memory.swap.current").write_text("0\n")
+    (scope / "memory.events").write_text(MEMORY_EVENTS.format(oom=0, oom_kill=0))
+
+
+def make_app_cgroups(proc_root: Path, user: Path) -> dict[str, Path]:
+    """Put each app the user manager in proc_root started into its own scope.
+
+    Like a systemd session: app.slice/app-Hyprland-<app>-<pid>.scope holds
+    the app and all its descendants, charged with their RSS. The container
+    workloads stay outside user@UID.service. Returns scopes by app name.
+    """
+    parent, comm, rss = {}, {}, {}
+    for entry in os.scandir(proc_root):
+        data = Path(entry.path, "stat").read_text()
+        rparen = data.rfind(")")
+        fields = data[rparen + 2:].split()
+        pid = int(entry.name)
+        parent[pid], comm[pid], rss[pid] = int(fields[1]), data[data.find("(") + 1:rparen], int(fields[21])
+    manager = next(pid for pid, name in comm.items() if name == "systemd" and parent[pid] == 1)
+    children: dict[int, list[int]] = {}
+    for pid, ppid in parent.items():
+        children.setdefault(ppid, []).append(pid)
+
+    scopes = {}
+    for app in children.get(manager, []):
+        members, stack = [], [app]
+        while stack:
+            pid = stack.pop()
+            members.append(pid)
+            stack.extend(children.get(pid, []))
+        unit = comm[app].replace("-", "\\x2d")
+        scope = user / "app.slice" / f"app-Hyprland-{unit}-{app}.scope"
+        _write_leaf(scope, members, sum(rss[pid] for pid in members) * ramguard.PAGE_SIZE)
+        scopes[comm[app]] = scope
+    return scopes
+
+
+def bench_cgroups(args: argparse.Namespace) -> None:
+    """Cgroup-first accounting on a fake cgroupfs, checked and timed against a full scan.
+
+    The detail budget sits at the median app, so about half the apps are
+    only read as cgroups. Then an app is OOM-killed and another requested
+    by a client, and both must be scanned per process on the next tick.
+    """
+    scratch = _scratch_dir("ramguard-cgroups-")
+    try:
+        proc_root = scratch / "proc"
+        proc_root.mkdir()
+        make_procfs(proc_root, args.processes)
+        cgroup = make_cgroupfs(scratch / "cgroup")
+        scopes = make_app_cgroups(proc_root, cgroup)
+        _write_leaf(cgroup / "session.slice" / "pipewire.service", [], 30 * ramguard.MIB)
+        currents = sorted(int((scope / "memory.current").read_text()) for scope in scopes.values())
+        detail_mb = currents[len(currents) // 2] // ramguard.MIB
+        config = _offline_config(scratch / "ramguard.toml", cgroup,
+                                 {"accounting": {"source": "cgroup", "cgroup_detail_mb": detail_mb}})
+        guard = _offline_guard(proc_root, config)
+        notes = []
+        guard._notify = lambda title, *args, **kwargs: notes.append(title)
+
+        checks = []
+
+        def check(what: str, ok: bool) -> None:
+            checks.append((what, "ok" if ok else "FAIL"))
+
+        def detailed() -> set[str]:
+            return {usage.name for usage in guard.cgroups.leaves.values() if usage.detailed}
+
+        def tick() -> None:
+            guard._poll_memory()
+            guard._check_and_notify()
+
+        tick()
+        leaves = guard.cgroups.leaves
+        names = {usage.name for usage in leaves.values()}
+        check("unit names decoded (signal-desktop, pipewire)",
+              {"signal-desktop", "pipewire"} <= names or "signal-desktop" not in scopes)
+        big = {name for name, scope in scopes.items()
+               if int((scope / "memory.current").read_text()) >= detail_mb * ramguard.MIB}
+        check("apps over the detail budget scanned, the rest not",
+              detailed() - {"pipewire"} >= big and not detailed() & (set(scopes) - big))
+        scanned = {pid for usage in leaves.values() if usage.detailed for pid in usage.pids}
+        check("only their processes read", guard.scanner.stats.total == len(scanned))
+        tick()
+        ours = [usage for usage in guard.cgroups.leaves.values() if usage.path.startswith("ramguard-")]
+        check("limit scopes always scanned", bool(ours) and all(usage.detailed for usage in ours))
+
+        small = sorted(set(scopes) - big, key=lambda name: int((scopes[name] / "memory.current").read_text()))
+        if len(small) >= 2:
+            victim, asked = small[0], small[1]
+            (scopes[victim] / "memory.events").write_text(MEMORY_EVENTS.format(oom=1, oom_kill=1))
+            guard.cgroups.request(asked, time.monotonic())
+            tick()
+            check(f"OOM kill in {victim} notified and scanned",
+                  any(victim in title for title in notes) and victim in detailed())
+            check("oom_kill counted in status", guard._get_status()["cgroups"]["oom_kill"] == 1)
+            check(f"{asked} scanned on request", asked in detailed()
+                  and any(rec.name == asked for rec in guard.table.records.values()))
+            tick()
+            rel = str(scopes[victim].relative_to(cgroup))
+            check(f"{victim} back to cgroup-only once its counters settle",
+                  not guard.cgroups.leaves[rel].detailed)
+
+        repeat = args.repeat
+        cgroup_time = _median_time(guard._scan_processes, repeat)
+        cgroup_reads = guard.cgroups.reads
+        cgroup_pids = guard.scanner.stats.total
+        guard.policy = replace(guard.policy, accounting_source="proc")
+        proc_time = _median_time(guard._scan_processes, repeat)
+        proc_pids = guard.scanner.stats.total
+
+        rows = checks + [
+            ("proc scan", f"{_format_seconds(proc_time).strip()}, {proc_pids} processes read"),
+            ("cgroup scan", f"{_format_seconds(cgroup_time).strip()}, {len(leaves)} cgroups "
+                            f"({cgroup_reads} files) and {cgroup_pids} processes read"),
+        ]
+        _report(f"Cgroup accounting, {args.processes} processes, detail above {detail_mb}MB", rows)
+        failed = [what for what, verdict in checks if verdict != "ok"]
+        if failed:
+            sys.exit(f"cgroups: {'; '.join(failed)}")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+# === Trace replay ===
+
+def _set_rss(root: Path, pid: int, rss_mb: float) -> None:
+    stat = root / str(pid) / "stat"
+    data = stat.read_text()
+    rparen = data.rfind(")")
+    fields = data[rparen + 2:].split()
+    fields[21] = str(int(rss_mb * 256))
+    stat.write_text(data[:rparen + 2] + " ".join(fields) + "\n")
+
+
+def bench_replay(args: argparse.Namespace) -> None:
+    """Record a simulated session, then replay it through the policy.
+
+    RAM climbs and falls three times over --hours while one app leaks,
+    renderers come and go and the focus sits on another app. Ticks are 5s
+    apart with a scan every minute, on the trace's own clock. The live run
+    has the recording limiter and notifier the replay uses, so replaying
+    with the recorded config must reproduce its actions exactly; a trace
+    cut short must still replay. Then the trace is replayed with other
+    thresholds, as `ramguard.py replay --set` would. Below 3h,
+    kill_after_seconds shrinks from 600s with --hours, so every climb still
+    stays critical long enough after its freeze to kill.
+    """
+    scratch = _scratch_dir("ramguard-replay-")
+    guard = None
+    try:
+        proc_root = scratch / "proc"
+        proc_root.mkdir()
+        make_procfs(proc_root, args.processes)
+        cgroup = make_cgroupfs(scratch / "cgroup")
+        kill_after = min(600, round(args.hours * 200))
+        config = _offline_config(scratch / "ramguard.toml", cgroup, {
+            "trace": {"enabled": True},
+            "accounting": {"budget_ms": 1000},  # Measure everything: no wall-clock budget in the run
+            "relief": {"kill_after_seconds": kill_after},
+        })
+        ramguard.TRACE_FILE = scratch / "trace.jsonl.gz"
+
+        clock = ramguard._TraceClock()
+        clock.now, clock.mono = 1.7e9, 1000.0
+        guard = _offline_guard(proc_root, config, clock)
+        live: list[tuple[str, str, str]] = []
+
+        def record(kind: str, subject: str, detail: str) -> None:
+            live.append((kind, subject, detail))
+
+        guard.limiter = guard.relief.limiter = ramguard.ReplayLimiter(
+            record, lambda: guard.scanner.start_times.keys()
+        )
+        guard.notifier = ramguard.ReplayNotifier(record)
+
+        comm, parent = {}, {}
+        for entry in os.scandir(proc_root):
+            data = Path(entry.path, "stat").read_text()
+            rparen = data.rfind(")")
+            pid = int(entry.name)
+            comm[pid], parent[pid] = data[data.find("(") + 1:rparen], int(data[rparen + 2:].split()[1])
+        manager = next(pid for pid, name in comm.items() if name == "systemd" and parent[pid] == 1)
+        apps = sorted(pid for pid, ppid in parent.items() if ppid == manager and comm[pid] != "firefox")
+        leaker, focused = apps[0], apps[-1]
+        guard.focus_source = lambda: focused
+        rng = random.Random(7)
+        next_pid = max(comm) + 10
+        helpers = [pid for pid in comm if comm[pid] == comm[apps[1]] and pid != apps[1]]
+
+        guard.trace.open()
+        total = 16 * 1024**3
+        ticks = int(args.hours * 3600 / 5)
+        leak_mb = 200.0
+        for i in range(ticks):
+            phase = (i / ticks * 3) % 1
+            percent = 55 + 42 * (1 - abs(2 * phase - 1)) + rng.uniform(-1, 1)
+            available = int(total * (100 - percent) / 100)
+            psi = max(0.0, (percent - 80) * 2)
+            guard._apply_sample(total, available, total - available, round(percent, 1),
+                                {"some": {"avg10": psi, "avg60": psi / 2, "avg300": psi / 4}})
+            if i % 12 == 0:
+                leak_mb += 8
+                _set_rss(proc_root, leaker, leak_mb)
+                if helpers and rng.random() < 0.5:
+                    shutil.rmtree(proc_root / str(helpers.pop()), ignore_errors=True)
+                else:
+                    next_pid += 1
+                    _write_proc(proc_root, next_pid, apps[1], comm[apps[1]], rng.uniform(30, 300),
+                                10**6 + i, [f"/opt/{comm[apps[1]]}", "--type=renderer"])
+                    helpers.append(next_pid)
+                guard._scan_processes()
+            guard._check_and_notify()
+            guard._relieve_pressure()
+            guard._commit_trace()
+            clock.now += 5
+            clock.mono += 5
+        recorded = guard.trace.ticks
+        guard.trace.close()
+        trace = ramguard.TRACE_FILE
+        size = trace.stat().st_size
+
+        checks = []
+
+        def check(what: str, ok: bool) -> None:
+            checks.append((what, "ok" if ok else "FAIL"))
+
+        report = ramguard.replay_trace([trace])
+        replayed = [(event.kind, event.subject, event.detail) for event in report.events]
+        check(f"{len(live)} recorded actions reproduced", replayed == live and report.ticks == recorded)
+        check("kills, freezes and leak limits in the trace",
+              {"kill", "freeze", "limit"} <= set(report.counts()))
+
+        cut = scratch / "cut.jsonl.gz"
+        cut.write_bytes(trace.read_bytes()[:size * 2 // 3])
+        partial = ramguard.replay_trace([cut])
+        check("a trace cut short replays up to the cut",
+              0 < partial.ticks < report.ticks
+              and [(e.kind, e.subject, e.detail) for e in partial.events] == live[:len(partial.events)])
+
+        variants = [
+            ("recorded config", []),
+            ("warning 75%, critical 85%", ["thresholds.warning_percent=75", "thresholds.critical_percent=85"]),
+            ("relief off", ["relief.enabled=false"]),
+            (f"kill after {kill_after * 3}s", [f"relief.kill_after_seconds={kill_after * 3}"]),
+        ]
+        rows = list(checks)
+        for name, settings in variants:
+            result = ramguard.replay_trace([trace], overrides=[ramguard.config_override(s) for s in settings])
+            counts = ", ".join(f"{kind} {n}" for kind, n in sorted(result.counts().items())) or "-"
+            rows.append((name, f"{result.ticks / result.elapsed:8.0f} ticks/s  {counts}"))
+        # Restarts keep the earlier files while the rotated ones fit in max_mb
+        for _ in range(3):
+            guard.trace.open()
+            guard.trace.close()
+        files = ramguard.trace_files(trace)
+        kept = len(files) == 4 and files[0].stat().st_size == size
+        guard.trace.max_bytes = size
+        guard.trace.open()
+        guard.trace.close()
+        files = ramguard.trace_files(trace)
+        check("restarts rotate within max_mb, keeping earlier traces",
+              kept and len(files) == 4 and sum(path.stat().st_size for path in files[:-1]) <= size)
+        rows.insert(len(checks) - 1, checks[-1])
+        _report(f"Trace replay, {args.processes} processes, {args.hours:g}h "
+                f"({recorded} ticks, {size / 1024:.0f}KB trace)", rows)
+        failed = [what for what, verdict in checks if verdict != "ok"]
+        if failed:
+            sys.exit(f"replay: {'; '.join(failed)}")
+    finally:
+        if guard is not None:
+            guard.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+# === Snapshot consistency ===
+
+def _figures(procs: list[dict]) -> list[dict]:
+    """A process list without memory_age, which depends on when it was rendered."""
+    return [{key: value for key, value in proc.items() if key != "memory_age"} for proc in procs]
+
+
+def _check_response(command: str, reply: Union[dict, list], published: dict[int, list[dict]],
+                    listings: set[str]) -> Optional[str]:
+    """What is inconsistent about one reply, or None."""
+    if command == "processes":
+        if json.dumps(_figures(reply), sort_keys=True) not in listings:
+            return "process list matches no published scan"
+        return None
+    generation = reply.get("generation")
+    if generation not in published:
+        return f"unknown generation {generation}"
+    top = published[generation][:1]
+    if command == "status":
+        if reply["top_process"] != (top[0]["name"] if top else None):
+            return f"top process {reply['top_process']!r} is not generation {generation}'s"
+        if top and abs(reply["top_memory_mb"] - top[0]["memory_mb"]) > 0.55:
+            return f"top memory {reply['top_memory_mb']} is not generation {generation}'s"
+        return None
+    # processes?since=<gen>: applied to the list at <gen>, it must give the list at generation
+    since = int(command.partition("=")[2])
+    if "processes" in reply:
+        current = reply["processes"]
+    elif reply.get("unchanged"):
+        current = published.get(since, [])
+    else:
+        by_pid = {proc["pid"]: proc for proc in published[since]}
+        for pid in reply["removed"]:
+            del by_pid[pid]
+        by_pid.update((proc["pid"], proc) for proc in reply["added"] + reply["changed"])
+        current = [by_pid[pid] for pid in reply["order"]]
+    if _figures(current) != _figures(published[generation]):
+        return f"delta from {since} does not give generation {generation}"
+    return None
+
+
+def bench_stress(args: argparse.Namespace) -> None:
+    """Hammer the socket while the main loop scans as fast as it can.
+
+    Every scan rewrites the RSS of a random tenth of the synthetic
+    processes, so records are updated in place throughout. Clients send
+    status, waybar, processes and processes?since=<gen> on persistent
+    connections; afterwards every reply is checked against the scans the
+    main loop published: a process list must be exactly one scan's, a
+    status must agree with its generation's top process, and a delta
+    applied to its base must give its generation's list.
+    """
+    scratch = _scratch_dir("ramguard-stress-")
+    try:
+        proc_root = scratch / "proc"
+        proc_root.mkdir()
+        make_procfs(proc_root, args.processes)
+        config = _offline_config(scratch / "ramguard.toml", make_cgroupfs(scratch / "cgroup"))
+        ramguard.SOCKET_PATH = scratch / "ramguard.sock"
+        guard = _offline_guard(proc_root, config)
+        published: dict[int, list[dict]] = {}
+
+        def tick() -> None:
+            guard._poll_memory()
+            guard._check_and_notify()
+            guard._publish_status()
+            published[guard.snapshot.generation] = guard.snapshot.processes
+
+        tick()
+        guard._start_socket_server()
+        user = [int(entry.name) for entry in os.scandir(proc_root)
+                if int(Path(entry.path, "stat").read_text().rsplit(")", 1)[1].split()[21])]
+
+        stop = threading.Event()
+        replies: list[tuple[str, bytes]] = []
+
+        def client(seed: int) -> None:
+            rng = random.Random(seed)
+            got = []
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.connect(str(ramguard.SOCKET_PATH))
+                with sock.makefile("rb") as f:
+                    generation = None
+                    while not stop.is_set():
+                        command = rng.choice(["status", "waybar", "processes", "since"])
+                        if command == "since":
+                            if generation is None:
+                                continue
+                            command = f"processes?since={generation}"
+                        sock.sendall(command.encode() + b"\n")
+                        line = f.readline()
+                        got.append((command, line))
+                        if command != "processes" and line.startswith(b"{"):
+                            generation = json.loads(line).get("generation", generation)
+            replies.extend(got)
+
+        clients = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        rng = random.Random(1)
+        scans = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < args.seconds:
+            for pid in rng.sample(user, len(user) // 10):
+                _set_rss(proc_root, pid, rng.uniform(20, 600))
+            tick()
+            scans += 1
+        stop.set()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        listings = {json.dumps(_figures(procs), sort_keys=True) for procs in published.values()}
+        counts: dict[str, int] = {}
+        failures = []
+        for command, line in replies:
+            kind = command.partition("?")[0] + ("?since" if "?" in command else "")
+            counts[kind] = counts.get(kind, 0) + 1
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("truncated reply")
+                reply = json.loads(line)
+                problem = None if command == "waybar" else _check_response(
+                    command, reply, published, listings
+                )
+                if command == "waybar" and reply.get("class") not in ("normal", "warning", "critical"):
+                    problem = "waybar reply without a level"
+            except (ValueError, KeyError, TypeError) as e:
+                problem = f"{type(e).__name__}: {e}"
+            if problem:
+                failures.append(f"{command}: {problem}")
+
+        rows = [(kind, f"{n:7d} replies") for kind, n in sorted(counts.items())]
+        rows += [
+            ("scans", f"{scans} ({scans / elapsed:.0f}/s)"),
+            ("throughput", f"{len(replies) / elapsed:,.0f} req/s over {args.clients} clients"),
+            ("inconsistent", str(len(failures))),
+        ]
+        _report(f"Socket stress, {args.processes} processes, {args.seconds:g}s", rows)
+        if failures:
+            for failure in failures[:5]:
+                print(f"  {failure}")
+            sys.exit(f"stress: {len(failures)} inconsistent replies")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+# === Pressure wakeups ===
+
+def bench_pressure(args: argparse.Namespace) -> None:
+    """The main loop waking on a pressure trigger, with a FIFO standing in for PSI.
+
+    The heartbeat is long enough that the loop only ticks when woken, so
+    every write to the FIFO must run exactly one tick, promptly, and count
+    as a wakeup. The loop runs on this thread, as in the daemon, since it
+    installs signal handlers; a second thread writes and then stops it.
+    """
+    scratch = _scratch_dir("ramguard-pressure-")
+    guard = None
+    try:
+        proc_root = scratch / "proc"
+        proc_root.mkdir()
+        make_procfs(proc_root, 300)
+        cgroup = make_cgroupfs(scratch / "cgroup")
+        trigger = scratch / "memory.pressure"
+        os.mkfifo(trigger)
+        config = _offline_config(scratch / "ramguard.toml", cgroup, {
+            "pressure": {"path": str(trigger), "heartbeat_seconds": 3600},
+            "thresholds": {"check_interval_seconds": 3600},
+        })
+        ramguard.SOCKET_PATH = scratch / "ramguard.sock"
+        guard = _offline_guard(proc_root, config)
+        guard.notifier.start = lambda: None  # No desktop notifications from a bench
+
+        latencies: list[float] = []
+        idle: list[bool] = []
+        errors: list[str] = []
+
+        def wait_for_tick(seen: int, timeout: float) -> bool:
+            deadline = time.perf_counter() + timeout
+            while guard.sample_runs == seen:
+                if time.perf_counter() > deadline:
+                    return False
+                time.sleep(0.0005)
+            return True
+
+        def drive() -> None:
+            try:
+                if not wait_for_tick(0, 10):
+                    errors.append("the main loop never ticked")
+                    return
+                fd = os.open(trigger, os.O_WRONLY | os.O_NONBLOCK)  # The daemon holds it open
+                try:
+                    for _ in range(args.wakeups):
+                        seen = guard.sample_runs
+                        time.sleep(0.05)
+                        idle.append(guard.sample_runs == seen)  # Nothing ticks unless woken
+                        start = time.perf_counter()
+                        os.write(fd, b"some\n")
+                        if not wait_for_tick(seen, 2):
+                            errors.append("a write to the trigger ran no tick")
+                            return
+                        latencies.append(time.perf_counter() - start)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                errors.append(str(e))
+            finally:
+                guard.running = False
+                guard._wake()
+
+        driver = threading.Thread(target=drive, daemon=True)
+        driver.start()
+        guard.run()
+        driver.join()
+
+        ms = sorted(latency * 1000 for latency in latencies)
+        checks = [
+            ("trigger armed", guard.pressure.error == ""),
+            (f"{args.wakeups} writes woke {len(latencies)} ticks", len(latencies) == args.wakeups),
+            ("no tick without a write", all(idle)),
+            (f"{guard.pressure.wakeups} wakeups counted", guard.pressure.wakeups == args.wakeups),
+        ]
+        rows = [(what, "ok" if ok else "FAIL") for what, ok in checks]
+        if ms:
+            rows += [
+                ("write to tick p50", f"{statistics.median(ms):.3f} ms"),
+                ("write to tick max", f"{ms[-1]:.3f} ms"),
+            ]
+        _report(f"Pressure wakeups, FIFO trigger, {args.wakeups} writes", rows)
+        failed = errors + [what for what, ok in checks if not ok]
+        if failed:
+            sys.exit(f"pressure: {'; '.join(failed)}")
+    finally:
+        if guard is not None:
+            guard.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RAM Guardian benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    ipc = sub.add_parser("ipc", help="parallel IPC round-trips")
+    ipc.add_argument("--clients", type=int, default=64)
+    ipc.add_argument("--requests", type=int, default=200, help="requests per client")
+    ipc.add_argument("--command", default="status")
+    ipc.add_argument("--socket", help="benchmark a running daemon instead of a private one")
+    ipc.set_defaults(func=bench_ipc)
+
+    history = sub.add_parser("history", help="history log append/read cost")
+    history.add_argument("--appends", type=int, default=100_000)
+    history.add_argument("--records", type=int, default=32768, help="ring capacity")
+    history.set_defaults(func=bench_history)
+
+    forecast = sub.add_parser("forecast", help="growth tracking on synthetic series")
+    forecast.add_argument("--processes", type=int, default=200)
+    forecast.add_argument("--scans", type=int, default=120)
+    forecast.add_argument("--interval", type=float, default=5.0, help="seconds between scans")
+    forecast.add_argument("--leaking", type=int, default=5)
+    forecast.add_argument("--seed", type=int, default=1)
+    forecast.set_defaults(func=bench_forecast)
+
+    def int_list(text: str) -> list[int]:
+        return [int(part) for part in text.split(",")]
+
+    scan = sub.add_parser("scan", help="scanner wall/CPU time vs. workers and process count")
+    scan.add_argument("--processes", type=int_list, default=[500, 1000, 3000, 6000])
+    scan.add_argument("--workers", type=int_list, default=[1, 2, 4, 8])
+    scan.add_argument("--repeat", type=int, default=7)
+    scan.add_argument("--live", action="store_true",
+                      help="scan the real /proc, padded with idle processes")
+    scan.set_defaults(func=bench_scan)
+
+    suite = sub.add_parser("suite", help="daemon hot paths against a stored baseline")
+    suite.add_argument("--processes", type=int, default=3000)
+    suite.add_argument("--repeat", type=int, default=15)
+    suite.add_argument("--requests", type=int, default=500, help="IPC round-trips")
+    suite.add_argument("--baseline", type=Path, default=BASELINE_FILE)
+    suite.add_argument("--save-baseline", action="store_true")
+    suite.add_argument("--tolerance", type=float, default=25.0,
+                       help="percent slowdown reported as a regression")
+    suite.set_defaults(func=bench_suite)
+
+    relief = sub.add_parser("relief", help="relief engine escalation and undo on a fake cgroupfs")
+    relief.set_defaults(func=bench_relief)
+
+    notify = sub.add_parser("notify", help="notification dispatcher on a private dbus-daemon")
+    notify.add_argument("--notifications", type=int, default=50)
+    notify.set_defaults(func=bench_notify)
+
+    cgroups = sub.add_parser("cgroups", help="cgroup-first accounting on a fake cgroupfs")
+    cgroups.add_argument("--processes", type=int, default=3000)
+    cgroups.add_argument("--repeat", type=int, default=15)
+    cgroups.set_defaults(func=bench_cgroups)
+
+    replay = sub.add_parser("replay", help="record a simulated session and replay it")
+    replay.add_argument("--processes", type=int, default=600)
+    replay.add_argument("--hours", type=float, default=12.0)
+    replay.set_defaults(func=bench_replay)
+
+    stress = sub.add_parser("stress", help="socket requests during back-to-back scans, checked")
+    stress.add_argument("--processes", type=int, default=600)
+    stress.add_argument("--clients", type=int, default=8)
+    stress.add_argument("--seconds", type=float, default=10.0)
+    stress.set_defaults(func=bench_stress)
+
+    pressure = sub.add_parser("pressure", help="main loop wakeups on a FIFO pressure trigger")
+    pressure.add_argument("--wakeups", type=int, default=50)
+    pressure.set_defaults(func=bench_pressure)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
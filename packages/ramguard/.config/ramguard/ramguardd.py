@@ -0,0 +1,4590 @@
+#!/usr/bin/env python3
+"""
+RAM Guardian daemon for Vibearchy
+Monitors system RAM, detects Electron apps, applies memory limits,
+and sends notifications via SwayNC. Started by `ramguard.py`, which
+keeps the client commands free of these imports.
+"""
+
+import asyncio
+import bisect
+import copy
+import ctypes
+import gzip
+import heapq
+import json
+import mmap
+import os
+import re
+import select
+import signal
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from operator import attrgetter, itemgetter
+from pathlib import Path
+from types import MappingProxyType
+from typing import AbstractSet, Callable, Iterable, Iterator, Mapping, Optional
+
+try:
+    import psutil
+except ImportError:
+    print("Error: psutil not installed. Run: sudo pacman -S python-psutil", file=sys.stderr)
+    sys.exit(1)
+
+try:
+    import tomllib
+except ImportError:
+    import tomli as tomllib
+
+# === Configuration ===
+
+CONFIG_DIR = Path.home() / ".config" / "ramguard"
+CONFIG_FILE = CONFIG_DIR / "ramguard.toml"
+SOCKET_PATH = Path("/tmp/ramguard.sock")  # Also in ramguard.py and the bash wrappers
+STATE_DIR = Path(os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state") / "ramguard"
+HISTORY_FILE = STATE_DIR / "history.bin"
+HISTORY_TOP_N = 8  # Processes stored per history record (part of the file format)
+TRACE_FILE = STATE_DIR / "trace.jsonl.gz"
+TRACE_VERSION = 1  # First line of every trace file
+MAX_REQUEST_BYTES = 64 * 1024
+# Commands that may block (waiting for a scan, a process to die, a lock);
+# they run on the IPC executor so other clients are served meanwhile
+BLOCKING_COMMANDS = ("victims", "cgroup:", "rofi:", "members:", "kill:", "limit:")
+# Served from the published snapshot, encoded once per tick or scan
+SNAPSHOT_COMMANDS = ("status", "waybar", "processes")
+GENERATIONS_KEPT = 32  # Past scans' top lists that processes?since=<gen> can diff against
+WAIT_SECONDS = 30  # wait?since=<gen> answers "unchanged" after this long without a scan
+RESEND_SECONDS = 20  # waybar streams repeat an unchanged line this often; ramguard.py waits 90s
+PROC_ROOT = Path("/proc")
+CGROUP_MOUNT = Path("/sys/fs/cgroup")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+MIN_PROCESS_MB = 50  # Processes below this are never reported
+TOP_N = 20  # Processes kept in the top list
+VICTIMS_KEPT = 15  # Ranked kill candidates kept per scan for clients
+VICTIMS_SECONDS = 60  # a client asking for kill candidates keeps scans ranking them this long
+CHANGE_MIN_MB = 1  # RSS movement that counts as a change in the scan diff
+PARALLEL_MIN_PIDS = 512  # Below this a parallel scan costs more than it saves
+STATE_TABLE_CAP = 4096  # Hard cap per daemon state table; oldest entries go first
+MIB = 1024 * 1024
+ACCOUNTING_MODES = ("rss", "pss", "uss")
+ACCOUNTING_SOURCES = ("proc", "cgroup")
+CGROUP_DETAIL_SECONDS = 60  # a client's request keeps a cgroup's processes scanned this long
+RELIEF_TARGETS = ("electron", "all")
+RELIEF_STAGES = ("none", "throttle", "reclaim", "freeze", "kill")  # in escalation order
+# Phases timed by DaemonMetrics; "tick" is one whole main loop iteration
+METRIC_PHASES = ("tick", "sample", "scan", "classify", "notify", "limit", "relief", "ipc")
+METRIC_BUCKETS = (  # seconds; Prometheus "le" bounds, +Inf implied
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+ELECTRON_SIGNATURES = [
+    "electron",
+    "--type=renderer",
+    "--type=gpu-process",
+    "--type=utility",
+    "chrome-sandbox",
+]
+
+KNOWN_ELECTRON_APPS = {
+    "code": "VS Code",
+    "discord": "Discord",
+    "slack": "Slack",
+    "spotify": "Spotify",
+    "obsidian": "Obsidian",
+    "signal-desktop": "Signal",
+    "teams": "Teams",
+    "notion": "Notion",
+    "bitwarden": "Bitwarden",
+    "1password": "1Password",
+    "figma": "Figma",
+    "postman": "Postman",
+    "insomnia": "Insomnia",
+    "zettlr": "Zettlr",
+    "logseq": "Logseq",
+}
+
+DEFAULT_CONFIG = {
+    "thresholds": {
+        "warning_percent": 80,
+        "critical_percent": 90,
+        "check_interval_seconds": 5,
+    },
+    "electron": {
+        "enabled": True,
+        "max_memory_mb": 2048,
+        "auto_limit": True,
+        "notify_on_detect": True,
+        "cgroup_root": "",  # empty: our user@UID.service cgroup
+    },
+    "notifications": {
+        "enabled": True,
+        "min_interval_seconds": 60,
+        "swaync_actions": True,
+    },
+    "sampling": {
+        "fast_interval_seconds": 1,  # cheap sample cadence at/near warning_percent
+        "warning_band_percent": 20,  # slow down linearly below warning - band
+        "scan_delta_mb": 256,  # full process scan when used memory moves this much
+        "max_staleness_seconds": 60,  # full process scan at least this often
+        "scan_workers": 1,  # threads reading /proc on big process tables; 1 = serial
+    },
+    "pressure": {
+        "enabled": True,
+        "path": "",  # empty: user cgroup memory.pressure, else /proc/pressure/memory
+        "stall_ms": 150,
+        "window_ms": 2000,  # unprivileged triggers need a multiple of 2s
+        "heartbeat_seconds": 30,
+    },
+    "accounting": {
+        "mode": "pss",  # rss, pss (shared pages split among sharers) or uss (private only)
+        "top_k": 10,  # largest processes by RSS, re-measured every scan
+        "budget_ms": 10,  # per scan, for re-measuring the rest oldest-first
+        "source": "proc",  # proc: scan every PID; cgroup: read per-app cgroups under user@UID
+        "cgroup_detail_mb": 256,  # cgroup source: scan the processes of cgroups above this
+    },
+    "forecast": {
+        "enabled": True,
+        "window_seconds": 300,  # growth rates are fitted over this much history
+        "min_span_seconds": 60,  # ignore fits over less time than this
+        "min_fit": 0.8,  # r² a trend needs before it is acted on
+        "leak_mb_per_minute": 20,  # sustained per-process growth that looks like a leak
+        "exhaustion_warning_minutes": 10,  # warn when memory runs out sooner than this
+        "preemptive_limit": True,  # limit leaking Electron apps before they hit the threshold
+    },
+    "history": {
+        "enabled": True,
+        "records": 32768,  # one per sample, 232 bytes each (~7.6 MB file)
+        "sync_seconds": 5,  # msync at most this often while above warning_percent
+    },
+    "trace": {
+        "enabled": False,  # record every tick's inputs for `ramguard.py replay`; read at startup
+        "max_mb": 256,  # per file, and for the rotated trace.jsonl.gz.1, .2, ... together
+        "sync_seconds": 30,  # a crash loses at most this much of the trace
+    },
+    "relief": {
+        "enabled": True,
+        "targets": "electron",  # electron, or all non-whitelisted, non-protected apps
+        "min_app_mb": 300,  # apps using less than this are left alone
+        "max_apps": 3,  # largest apps acted on
+        "high_percent": 90,  # warning: memory.high at this share of the app's current usage
+        "reclaim_psi": 10,  # rising PSI some avg10 above this: reclaim from background apps
+        "reclaim_percent": 10,  # of each background app's usage, per tick
+        "freeze": True,  # critical: freeze apps that aren't focused
+        "kill_after_seconds": 0,  # still critical this long after a freeze: kill; 0 = never
+        "hysteresis_percent": 5,  # undo a step once RAM is this far below its threshold
+        "protect": ["hyprland", "xwayland", "waybar", "swaync", "pipewire", "wireplumber", "rofi"],
+    },
+    "metrics": {
+        "enabled": True,  # per-phase timings; off costs one attribute check per phase
+        "textfile": "",  # Prometheus text written here (node_exporter textfile dir); empty: off
+        "textfile_seconds": 15,
+    },
+    "whitelist": {
+        "processes": ["firefox", "zen"],
+    },
+    "electron_apps": {},
+}
+
+
+def _toml_key(key: str) -> str:
+    return key if re.fullmatch(r"[A-Za-z0-9_-]+", key) else json.dumps(key)
+
+
+def _toml_value(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return json.dumps(value)  # TOML basic strings share JSON's escapes
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_toml_value(v) for v in value) + "]"
+    raise TypeError(f"Cannot serialize {type(value).__name__} to TOML")
+
+
+def _dump_toml(config: dict, prefix: str = "") -> str:
+    """Serialize the config dict (scalars, lists and nested tables) to TOML."""
+    lines = []
+    tables = []
+    for key, value in config.items():
+        if isinstance(value, dict):
+            tables.append((key, value))
+        else:
+            lines.append(f"{_toml_key(key)} = {_toml_value(value)}")
+    for key, value in tables:
+        name = f"{prefix}.{_toml_key(key)}" if prefix else _toml_key(key)
+        if lines:
+            lines.append("")
+        lines.append(f"[{name}]")
+        body = _dump_toml(value, name)
+        if body:
+            lines.append(body)
+    return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class Policy:
+    """Immutable, pre-compiled view of the config used on the hot path.
+
+    The daemon never reads the config dict per process; it swaps in a new
+    Policy whenever the config changes.
+    """
+    warning_percent: float
+    critical_percent: float
+    check_interval: float
+    fast_interval: float
+    warning_band: float
+    scan_delta_mb: float
+    max_staleness: float
+    scan_workers: int
+    electron_enabled: bool
+    auto_limit: bool
+    notify_on_detect: bool
+    max_memory_mb: int
+    cgroup_root: str
+    notifications_enabled: bool
+    min_notify_interval: float
+    swaync_actions: bool
+    pressure_enabled: bool
+    pressure_path: str
+    pressure_trigger: str
+    heartbeat: float
+    accounting_mode: str
+    accounting_top_k: int
+    accounting_budget: float  # seconds
+    accounting_source: str
+    cgroup_detail: int  # bytes
+    forecast_enabled: bool
+    forecast_window: float
+    forecast_min_span: float
+    forecast_min_fit: float
+    leak_rate: float  # bytes/s
+    exhaustion_warning: float  # seconds
+    preemptive_limit: bool
+    history_enabled: bool
+    history_records: int
+    history_sync: float
+    trace_enabled: bool
+    trace_max_bytes: int
+    trace_sync: float
+    relief_enabled: bool
+    relief_targets: str
+    relief_min_app: int  # bytes
+    relief_max_apps: int
+    relief_high_ratio: float
+    relief_reclaim_psi: float
+    relief_reclaim_ratio: float
+    relief_freeze: bool
+    relief_kill_after: float
+    relief_hysteresis: float
+    relief_protect: frozenset[str]
+    metrics_enabled: bool
+    metrics_textfile: str
+    metrics_textfile_interval: float
+    whitelist: frozenset[str]
+    app_limits: Mapping[str, int]
+    matcher: re.Pattern
+
+    @classmethod
+    def compile(cls, config: dict) -> "Policy":
+        thresholds = config["thresholds"]
+        electron = config["electron"]
+        notifications = config["notifications"]
+        pressure = config["pressure"]
+        sampling = config["sampling"]
+        history = config["history"]
+        trace = config["trace"]
+        forecast = config["forecast"]
+        accounting = config["accounting"]
+        metrics = config["metrics"]
+        relief = config["relief"]
+        if accounting["mode"] not in ACCOUNTING_MODES:
+            raise ValueError(f"accounting.mode must be one of {', '.join(ACCOUNTING_MODES)}")
+        if accounting["source"] not in ACCOUNTING_SOURCES:
+            raise ValueError(f"accounting.source must be one of {', '.join(ACCOUNTING_SOURCES)}")
+        if relief["targets"] not in RELIEF_TARGETS:
+            raise ValueError(f"relief.targets must be one of {', '.join(RELIEF_TARGETS)}")
+        # Longest keys first so "signal-desktop" wins over any shorter prefix
+        apps = sorted(KNOWN_ELECTRON_APPS, key=len, reverse=True)
+        matcher = re.compile(
+            "(?P<app>" + "|".join(map(re.escape, apps)) + ")"
+            "|(?P<sig>" + "|".join(map(re.escape, ELECTRON_SIGNATURES)) + ")"
+        )
+        return cls(
+            warning_percent=thresholds["warning_percent"],
+            critical_percent=thresholds["critical_percent"],
+            check_interval=thresholds["check_interval_seconds"],
+            fast_interval=sampling["fast_interval_seconds"],
+            warning_band=sampling["warning_band_percent"],
+            scan_delta_mb=sampling["scan_delta_mb"],
+            max_staleness=sampling["max_staleness_seconds"],
+            scan_workers=max(1, sampling["scan_workers"]),
+            electron_enabled=electron["enabled"],
+            auto_limit=electron["auto_limit"],
+            notify_on_detect=electron["notify_on_detect"],
+            max_memory_mb=electron["max_memory_mb"],
+            cgroup_root=electron["cgroup_root"],
+            notifications_enabled=notifications["enabled"],
+            min_notify_interval=notifications["min_interval_seconds"],
+            swaync_actions=notifications["swaync_actions"],
+            pressure_enabled=pressure["enabled"],
+            pressure_path=pressure["path"],
+            pressure_trigger=f"some {pressure['stall_ms'] * 1000} {pressure['window_ms'] * 1000}",
+            heartbeat=pressure["heartbeat_seconds"],
+            accounting_mode=accounting["mode"],
+            accounting_top_k=accounting["top_k"],
+            accounting_budget=accounting["budget_ms"] / 1000,
+            accounting_source=accounting["source"],
+            cgroup_detail=accounting["cgroup_detail_mb"] * MIB,
+            forecast_enabled=forecast["enabled"],
+            forecast_window=forecast["window_seconds"],
+            forecast_min_span=forecast["min_span_seconds"],
+            forecast_min_fit=forecast["min_fit"],
+            leak_rate=forecast["leak_mb_per_minute"] * MIB / 60,
+            exhaustion_warning=forecast["exhaustion_warning_minutes"] * 60,
+            preemptive_limit=forecast["preemptive_limit"],
+            history_enabled=history["enabled"],
+            history_records=history["records"],
+            history_sync=history["sync_seconds"],
+            trace_enabled=trace["enabled"],
+            trace_max_bytes=trace["max_mb"] * MIB,
+            trace_sync=trace["sync_seconds"],
+            relief_enabled=relief["enabled"],
+            relief_targets=relief["targets"],
+            relief_min_app=relief["min_app_mb"] * MIB,
+            relief_max_apps=relief["max_apps"],
+            relief_high_ratio=relief["high_percent"] / 100,
+            relief_reclaim_psi=relief["reclaim_psi"],
+            relief_reclaim_ratio=relief["reclaim_percent"] / 100,
+            relief_freeze=relief["freeze"],
+            relief_kill_after=relief["kill_after_seconds"],
+            relief_hysteresis=relief["hysteresis_percent"],
+            relief_protect=frozenset(p.lower() for p in relief["protect"]),
+            metrics_enabled=metrics["enabled"],
+            metrics_textfile=metrics["textfile"],
+            metrics_textfile_interval=metrics["textfile_seconds"],
+            whitelist=frozenset(p.lower() for p in config["whitelist"]["processes"]),
+            app_limits=MappingProxyType(
+                {k.lower(): v for k, v in config["electron_apps"].items()}
+            ),
+            matcher=matcher,
+        )
+
+    def is_whitelisted(self, name: str) -> bool:
+        return name.lower() in self.whitelist
+
+    def sample_interval(self, memory_percent: float, slow_interval: float) -> float:
+        """Seconds until the next cheap sample: fast near warning, slow well below."""
+        if slow_interval <= self.fast_interval:
+            return slow_interval
+        headroom = self.warning_percent - memory_percent
+        fraction = min(max(headroom / self.warning_band, 0.0), 1.0) if self.warning_band > 0 else 1.0
+        return self.fast_interval + (slow_interval - self.fast_interval) * fraction
+
+    def limit_for(self, app_name: str) -> int:
+        return self.app_limits.get(app_name.lower(), self.max_memory_mb)
+
+    def classify(self, name: str, cmdline: str) -> tuple[bool, Optional[str]]:
+        """Check if process is Electron-based and identify the app."""
+        # Known apps by name first, then anywhere in the cmdline
+        for match in self.matcher.finditer(name.lower()):
+            if match.lastgroup == "app":
+                return True, KNOWN_ELECTRON_APPS[match.group()]
+
+        is_electron = False
+        for match in self.matcher.finditer(cmdline.lower()):
+            if match.lastgroup == "app":
+                return True, KNOWN_ELECTRON_APPS[match.group()]
+            is_electron = True
+        return is_electron, None
+
+
+class ConfigWriter:
+    """Write-behind for config changes.
+
+    Bursts of changes (e.g. several menu actions) coalesce into a single
+    write after `delay` seconds. The file is replaced atomically, and a
+    stowed symlink is written through rather than replaced. A failed write
+    is logged and retried after `retry` seconds; the change stays pending.
+    """
+
+    def __init__(self, path: Path, snapshot: Callable[[], dict], log: Callable[[str], None],
+                 delay: float = 2.0, retry: float = 30.0):
+        self.path = path
+        self.snapshot = snapshot
+        self.log = log
+        self.delay = delay
+        self.retry = retry
+        self.last_written: Optional[tuple[int, int]] = None  # (inode, mtime_ns)
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def pending(self) -> bool:
+        return self._timer is not None
+
+    def schedule(self) -> None:
+        with self._lock:
+            if self._timer is None:
+                self._start(self.delay)
+
+    def _start(self, delay: float) -> None:
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._timer is None:
+                return
+            self._timer.cancel()
+            self._timer = None
+            target = self.path.resolve()
+            tmp = target.with_name(f".{target.name}.tmp")
+            try:
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with open(tmp, "w") as f:
+                    f.write(_dump_toml(self.snapshot()) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, target)
+                st = target.stat()
+            except OSError as e:
+                self.log(f"Cannot save config to {target} ({e}); retrying in {self.retry:g}s")
+                try:
+                    tmp.unlink(missing_ok=True)
+                except OSError:
+                    pass  # Failing the same way; the next attempt truncates it
+                self._start(self.retry)
+                return
+            self.last_written = (st.st_ino, st.st_mtime_ns)
+
+
+class ConfigWatcher:
+    """Calls `on_change` when inotify reports the config file was rewritten."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    def __init__(self, path: Path, on_change: Callable[[], None]):
+        self.path = path
+        self.on_change = on_change
+        self.running = False
+
+    def start(self) -> bool:
+        target = self.path.resolve()
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+            if fd < 0:
+                return False
+            mask = self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+            if libc.inotify_add_watch(fd, str(target.parent).encode(), mask) < 0:
+                os.close(fd)
+                return False
+        except (AttributeError, OSError):
+            return False
+
+        self.running = True
+        thread = threading.Thread(target=self._watch, args=(fd, target.name), daemon=True)
+        thread.start()
+        return True
+
+    def _watch(self, fd: int, filename: str) -> None:
+        wanted = filename.encode()
+        try:
+            while self.running:
+                ready, _, _ = select.select([fd], [], [], 1.0)
+                if not ready:
+                    continue
+                try:
+                    data = os.read(fd, 4096)
+                except BlockingIOError:
+                    continue
+                changed = False
+                offset = 0
+                # struct inotify_event { int wd; u32 mask, cookie, len; char name[]; }
+                while offset < len(data):
+                    name_len = int.from_bytes(data[offset + 12:offset + 16], sys.byteorder)
+                    name = data[offset + 16:offset + 16 + name_len].rstrip(b"\0")
+                    offset += 16 + name_len
+                    changed = changed or name == wanted
+                if changed:
+                    self.on_change()
+        finally:
+            os.close(fd)
+
+
+def _parse_psi(text: str) -> dict:
+    """Parse PSI "some avg10=.. avg60=.. avg300=.. total=.." lines."""
+    result = {}
+    for line in text.splitlines():
+        kind, *fields = line.split()
+        values = {}
+        for item in fields:
+            key, _, value = item.partition("=")
+            values[key] = int(value) if key == "total" else float(value)
+        result[kind] = values
+    return result
+
+
+def _user_cgroup_dir(cgroup_root: Path = CGROUP_MOUNT) -> Optional[Path]:
+    """Return the cgroup of our user@UID.service, which the user owns."""
+    try:
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    path = line[3:].strip()
+                    marker = f"/user@{os.getuid()}.service"
+                    if marker in path:
+                        return cgroup_root / path[1:path.index(marker) + len(marker)].lstrip("/")
+    except OSError:
+        pass
+    return None
+
+
+def _unit_app_name(unit: str) -> str:
+    """App name from a unit's cgroup name, e.g. app-Hyprland-signal\\x2ddesktop-1234.scope.
+
+    XDG app units are app-[<launcher>-]<app>[-<random>].scope or
+    app-[<launcher>-]<app>[@<random>].service, with dashes in <app> escaped;
+    reverse-DNS (flatpak) IDs are shortened to their last component. Other
+    units keep their name without the suffix.
+    """
+    name = unit.rpartition(".")[0] or unit
+    if name.startswith("ramguard-"):
+        return name[9:]
+    if not name.startswith("app-"):
+        return name
+    parts = name[4:].partition("@")[0].split("-")
+    if len(parts) > 2 or (len(parts) == 2 and "@" not in name and parts[-1].isdigit()):
+        parts.pop()  # <random>
+    name = re.sub(r"\\x([0-9a-f]{2})", lambda m: chr(int(m[1], 16)), parts[-1])
+    return name.rsplit(".", 1)[1] if name.count(".") >= 2 else name
+
+
+def _hyprland_active_pid() -> Optional[int]:
+    """PID of the focused window from Hyprland's IPC socket, or None."""
+    runtime = Path(os.environ.get("XDG_RUNTIME_DIR") or f"/run/user/{os.getuid()}") / "hypr"
+    signature = os.environ.get("HYPRLAND_INSTANCE_SIGNATURE")
+    if signature:
+        instances = [runtime / signature]
+    else:  # A systemd service may not have the session environment
+        try:
+            instances = sorted(runtime.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True)
+        except OSError:
+            return None
+    for instance in instances:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(0.2)
+                sock.connect(str(instance / ".socket.sock"))
+                sock.sendall(b"j/activewindow")
+                data = b"".join(iter(lambda: sock.recv(65536), b""))
+            return json.loads(data).get("pid")
+        except (OSError, ValueError, AttributeError):
+            continue
+    return None
+
+
+class CgroupLimiter:
+    """Confines apps to per-app cgroup v2 scopes by writing cgroupfs directly.
+
+    Scopes are created under `root`, by default the user@UID.service cgroup
+    that systemd delegates to the user, so no privileges or fork/exec are
+    needed. All processes of an app share one scope.
+    """
+
+    def __init__(self, root: Optional[Path], mount: Path = CGROUP_MOUNT, proc_root: Path = PROC_ROOT):
+        self.root = root
+        self.mount = mount  # where /proc/<pid>/cgroup paths are rooted
+        self.proc_root = proc_root
+
+    @classmethod
+    def from_policy(cls, policy: "Policy", proc_root: Path = PROC_ROOT) -> "CgroupLimiter":
+        root = Path(policy.cgroup_root) if policy.cgroup_root else _user_cgroup_dir()
+        return cls(root, proc_root=proc_root)
+
+    @property
+    def available(self) -> bool:
+        return self.root is not None and self.root.is_dir()
+
+    def scope_path(self, app: str) -> Path:
+        slug = re.sub(r"[^a-z0-9]+", "-", app.lower()).strip("-") or "app"
+        return self.root / f"ramguard-{slug}.scope"
+
+    def _enable_memory_controller(self) -> None:
+        control = self.root / "cgroup.subtree_control"
+        try:
+            if "memory" not in control.read_text().split():
+                control.write_text("+memory")
+        except FileNotFoundError:
+            pass  # Not a real cgroupfs (e.g. a test tree)
+
+    def apply(self, app: str, pids: list[int], limit_mb: int) -> list[int]:
+        """Move pids into the app's scope with a memory.max; returns the PIDs moved."""
+        self._enable_memory_controller()
+        scope = self.scope_path(app)
+        scope.mkdir(exist_ok=True)
+        (scope / "memory.max").write_text(str(limit_mb * 1024 * 1024))
+        try:
+            (scope / "memory.swap.max").write_text("0")
+        except OSError:
+            pass  # Swap accounting disabled
+        return self._move(scope, pids)
+
+    def move(self, app: str, pids: list[int]) -> tuple[Path, list[int]]:
+        """Move pids into the app's scope without limiting it; returns (scope, PIDs moved)."""
+        self._enable_memory_controller()
+        scope = self.scope_path(app)
+        scope.mkdir(exist_ok=True)
+        return scope, self._move(scope, pids)
+
+    def _move(self, scope: Path, pids: list[int]) -> list[int]:
+        # cgroupfs migrates one PID per write(); reuse a single open fd
+        fd = os.open(scope / "cgroup.procs", os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            for pid in pids:
+                try:
+                    os.write(fd, f"{pid}\n".encode())
+                except OSError:
+                    pass  # Exited meanwhile, or not ours to move; the read-back decides
+        finally:
+            os.close(fd)
+
+        # Verify the migration actually happened
+        members = set(self.members(scope))
+        return [pid for pid in pids if pid in members]
+
+    def restore(self, origins: dict[int, Path]) -> list[int]:
+        """Move PIDs back to the cgroups they came from; returns the live ones that didn't go."""
+        by_origin: dict[Path, list[int]] = {}
+        for pid, origin in origins.items():
+            by_origin.setdefault(origin, []).append(pid)
+        missed = []
+        for origin, pids in by_origin.items():
+            try:
+                moved = set(self._move(origin, pids))
+            except OSError:  # The cgroup is gone
+                moved = set()
+            missed.extend(pid for pid in pids if pid not in moved and self.cgroup_of(pid) is not None)
+        return missed
+
+    def cgroup_of(self, pid: int) -> Optional[Path]:
+        """The cgroup v2 directory pid is in, or None if it has exited."""
+        try:
+            with open(f"{self.proc_root}/{pid}/cgroup") as f:
+                for line in f:
+                    if line.startswith("0::"):
+                        return self.mount / line[3:].strip().lstrip("/")
+        except OSError:
+            pass
+        return None
+
+    def own_leaf(self, cgroups: AbstractSet[Optional[Path]], pids: list[int]) -> Optional[Path]:
+        """The one cgroup an app's processes share, if it can be acted on in place.
+
+        That is an XDG app-*.scope or .service (or one of our scopes) below
+        root that holds nothing but pids and whose memory.high and
+        cgroup.freeze the user may write, as on a systemd session that
+        delegates the memory controller. An app started from a terminal
+        shares the terminal's scope, so it doesn't qualify.
+        """
+        if len(cgroups) != 1 or self.root is None:
+            return None
+        (leaf,) = cgroups
+        if leaf is None or leaf == self.root or not leaf.is_relative_to(self.root):
+            return None
+        if not leaf.name.startswith(("app-", "ramguard-")):
+            return None
+        if not all(os.access(leaf / name, os.W_OK) for name in ("memory.high", "cgroup.freeze")):
+            return None
+        if not set(self.members(leaf)) <= set(pids):
+            return None
+        return leaf
+
+    def members(self, scope: Path) -> list[int]:
+        try:
+            return [int(line) for line in (scope / "cgroup.procs").read_text().split()]
+        except (OSError, ValueError):
+            return []
+
+    @staticmethod
+    def current(scope: Path) -> Optional[int]:
+        """memory.current in bytes, or None if unreadable."""
+        try:
+            return int((scope / "memory.current").read_text())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def high(scope: Path) -> Optional[int]:
+        """memory.high in bytes; None when unset ("max") or unreadable."""
+        try:
+            return int((scope / "memory.high").read_text())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def limit(scope: Path) -> Optional[int]:
+        """memory.max in bytes; None when unlimited or unreadable."""
+        try:
+            return int((scope / "memory.max").read_text())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def set_high(scope: Path, high: Optional[int]) -> None:
+        """Throttle the scope above `high` bytes; None lifts it."""
+        (scope / "memory.high").write_text(str(high) if high is not None else "max")
+
+    @staticmethod
+    def reclaim(scope: Path, amount: int) -> None:
+        """Ask the kernel to page out `amount` bytes of the scope now (5.19+)."""
+        try:
+            (scope / "memory.reclaim").write_text(str(amount))
+        except BlockingIOError:
+            pass  # EAGAIN: reclaimed less than asked, which is fine
+
+    @staticmethod
+    def freeze(scope: Path, frozen: bool) -> None:
+        (scope / "cgroup.freeze").write_text("1" if frozen else "0")
+
+    @staticmethod
+    def kill(scope: Path) -> None:
+        """SIGKILL every process in the scope (5.14+)."""
+        (scope / "cgroup.kill").write_text("1")
+
+    def prune(self) -> None:
+        """Remove scopes whose processes have all exited."""
+        if not self.available:
+            return
+        for scope in self.root.glob("ramguard-*.scope"):
+            if not self.members(scope):
+                try:
+                    scope.rmdir()
+                except OSError:
+                    pass
+
+
+@dataclass(slots=True)
+class CgroupUsage:
+    """One leaf cgroup's memory, as the kernel charges it."""
+    path: str  # relative to the accountant's root
+    name: str  # app name from the unit name
+    current: int  # bytes; memory.current
+    anon: int  # bytes; anon, file and shmem from memory.stat
+    file: int
+    shmem: int
+    swap: int  # bytes; memory.swap.current, 0 without swap accounting
+    events: dict[str, int]  # memory.events: low, high, max, oom, oom_kill, ...
+    pids: list[int] = field(default_factory=list, repr=False)  # cgroup.procs
+    detailed: bool = False  # its processes were scanned on this read
+
+
+class CgroupAccountant:
+    """Per-app memory from the leaf cgroups under user@UID.service.
+
+    On a systemd session nearly every app runs in its own app-*.scope or
+    .service, so reading memory.current, memory.stat, memory.swap.current
+    and memory.events per leaf costs O(apps) reads instead of a stat read
+    per process. Only some leaves get a per-PID scan: those above the
+    detail budget, those whose high/max/oom counters moved since the last
+    read, those a client asked about and our own ramguard-* scopes.
+    """
+
+    def __init__(self, root: Optional[Path]):
+        self.root = root
+        self.active = False  # refreshed on the last scan
+        self.leaves: dict[str, CgroupUsage] = {}
+        self.pids: set[int] = set()  # PIDs in leaves that were not detailed
+        self.requested: dict[str, float] = {}  # path -> monotonic time the request lapses
+        self.oom_kills: list[tuple[CgroupUsage, int]] = []  # new OOM kills per leaf, last read
+        self.totals: dict[str, int] = {}  # memory.events of the root, which are hierarchical
+        self.reads = 0  # files read on the last refresh
+
+    @property
+    def available(self) -> bool:
+        return self.root is not None and self.root.is_dir()
+
+    def _read(self, path: str) -> Optional[bytes]:
+        self.reads += 1
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _read_keyed(self, path: str) -> dict[str, int]:
+        """A flat-keyed cgroup file (memory.stat, memory.events) as a dict."""
+        data = self._read(path) or b""
+        return {key.decode(): int(value) for key, value in map(bytes.split, data.splitlines())}
+
+    def _read_int(self, path: str) -> int:
+        data = self._read(path)
+        try:
+            return int(data) if data else 0
+        except ValueError:
+            return 0  # "max" and friends
+
+    def _leaf_paths(self) -> list[str]:
+        """Paths, relative to the root, of every cgroup without children."""
+        leaves = []
+        stack = [""]
+        root = str(self.root)
+        while stack:
+            rel = stack.pop()
+            try:
+                with os.scandir(f"{root}/{rel}" if rel else root) as entries:
+                    children = [
+                        f"{rel}/{entry.name}" if rel else entry.name
+                        for entry in entries if entry.is_dir(follow_symlinks=False)
+                    ]
+            except OSError:
+                continue  # Removed meanwhile
+            if children:
+                stack.extend(children)
+            elif rel:
+                leaves.append(rel)
+        return leaves
+
+    def _read_leaf(self, rel: str) -> CgroupUsage:
+        base = f"{self.root}/{rel}"
+        stat = self._read_keyed(f"{base}/memory.stat")
+        procs = self._read(f"{base}/cgroup.procs") or b""
+        return CgroupUsage(
+            path=rel,
+            name=_unit_app_name(rel.rpartition("/")[2]),
+            current=self._read_int(f"{base}/memory.current"),
+            anon=stat.get("anon", 0),
+            file=stat.get("file", 0),
+            shmem=stat.get("shmem", 0),
+            swap=self._read_int(f"{base}/memory.swap.current"),
+            events=self._read_keyed(f"{base}/memory.events"),
+            pids=[int(pid) for pid in procs.split()],
+        )
+
+    def refresh(self, detail_min: int, now: float) -> list[int]:
+        """Re-read every leaf; return the PIDs of the leaves to scan per process."""
+        self.reads = 0
+        previous = self.leaves
+        self.requested = {rel: until for rel, until in self.requested.items() if until > now}
+        leaves = {}
+        detail: list[int] = []
+        undetailed: set[int] = set()
+        oom_kills = []
+        for rel in self._leaf_paths():
+            usage = self._read_leaf(rel)
+            events = usage.events
+            old = previous.get(rel)
+            moved = False
+            if old is not None:
+                moved = any(events.get(key, 0) > old.events.get(key, 0) for key in ("high", "max", "oom"))
+                killed = events.get("oom_kill", 0) - old.events.get("oom_kill", 0)
+                if killed > 0:
+                    oom_kills.append((usage, killed))
+            usage.detailed = (
+                usage.current >= detail_min
+                or moved
+                or rel in self.requested
+                or rel.rpartition("/")[2].startswith("ramguard-")
+            )
+            if usage.detailed:
+                detail.extend(usage.pids)
+            else:
+                undetailed.update(usage.pids)
+            leaves[rel] = usage
+
+        self.totals = self._read_keyed(f"{self.root}/memory.events")
+        self.leaves = leaves
+        self.pids = undetailed
+        self.oom_kills = oom_kills
+        self.active = True
+        return detail
+
+    def clear(self) -> None:
+        self.active = False
+        self.leaves = {}
+        self.pids = set()
+        self.oom_kills = []
+        self.totals = {}
+
+    def request(self, query: str, now: float) -> list[str]:
+        """Have leaves matching query (path, unit or app name) detailed for a while."""
+        query = query.lower()
+        matches = [
+            rel for rel, usage in self.leaves.items()
+            if query in (rel.lower(), rel.rpartition("/")[2].lower(), usage.name.lower())
+        ]
+        for rel in matches:
+            self.requested[rel] = now + CGROUP_DETAIL_SECONDS
+        return matches
+
+    @staticmethod
+    def usage_dict(usage: CgroupUsage) -> dict:
+        return {
+            "path": usage.path,
+            "name": usage.name,
+            "memory_mb": round(usage.current / MIB, 1),
+            "anon_mb": round(usage.anon / MIB, 1),
+            "file_mb": round(usage.file / MIB, 1),
+            "shmem_mb": round(usage.shmem / MIB, 1),
+            "swap_mb": round(usage.swap / MIB, 1),
+            "events": usage.events,
+            "process_count": len(usage.pids),
+            "detailed": usage.detailed,
+        }
+
+    def stats(self) -> dict:
+        leaves = self.leaves.values()
+        totals = self.totals or {
+            key: sum(usage.events.get(key, 0) for usage in leaves) for key in ("oom", "oom_kill")
+        }
+        return {
+            "root": str(self.root),
+            "leaves": len(self.leaves),
+            "detailed": sum(usage.detailed for usage in leaves),
+            "reads": self.reads,
+            "memory_mb": round(sum(usage.current for usage in leaves) / MIB, 1),
+            "swap_mb": round(sum(usage.swap for usage in leaves) / MIB, 1),
+            "oom": totals.get("oom", 0),
+            "oom_kill": totals.get("oom_kill", 0),
+        }
+
+
+@dataclass(slots=True)
+class ReliefAction:
+    time: float  # Unix time
+    app: str
+    step: str  # throttle, reclaim, freeze, kill, release or thaw
+    recovered: int  # bytes: memory.current before the step minus after
+
+
+class ReliefEngine:
+    """Escalating, reversible pressure relief on per-app cgroup scopes.
+
+    At warning the largest apps get a memory.high just under their usage,
+    so the kernel throttles and reclaims them before anything else. While
+    pressure keeps rising, background apps are also paged out through
+    memory.reclaim. At critical, apps that aren't focused are frozen, and
+    only if RAM stays critical for kill_after_seconds after that is the
+    largest frozen app killed. Nothing is frozen while the focused app is
+    unknown. Freezes are undone once RAM drops hysteresis_percent below
+    critical, throttles once it drops that far below warning.
+
+    An app whose processes share a writable app-*.scope or .service is
+    acted on in place. Otherwise its processes move into a ramguard scope
+    and go back to the cgroups they came from once relief lets go of it,
+    unless the scope has meanwhile been given the app's memory limit;
+    memory.high gets back the value it had either way.
+    """
+
+    def __init__(self, limiter: CgroupLimiter, log: Callable[[str], None], clock=time):
+        self.limiter = limiter
+        self.log = log
+        self.clock = clock  # for the Unix time of actions
+        self.throttled: dict[str, Path] = {}  # app -> scope with memory.high set
+        self.frozen: dict[str, tuple[Path, float]] = {}  # app -> (scope, monotonic time)
+        self.highs: dict[str, Optional[int]] = {}  # app -> memory.high before throttling
+        self.origins: dict[str, dict[int, Path]] = {}  # app -> {pid: cgroup it was moved out of}
+        self.actions: deque[ReliefAction] = deque(maxlen=32)
+        self.stage = "none"
+        self._last_psi = 0.0
+        self._focus_unknown = False
+
+    @property
+    def active(self) -> bool:
+        return bool(self.throttled or self.frozen)
+
+    def _record(self, app: str, step: str, before: Optional[int], scope: Path) -> ReliefAction:
+        after = self.limiter.current(scope)
+        recovered = before - after if before is not None and after is not None else 0
+        action = ReliefAction(self.clock.time(), app, step, recovered)
+        self.actions.append(action)
+        self.log(f"Relief: {step} {app}" + (f", {recovered / MIB:.0f}MB recovered" if recovered > 0 else ""))
+        return action
+
+    def _confine(self, app: str, pids: list[int]) -> Path:
+        """The cgroup to act on for an app: its own if writable, else its ramguard scope."""
+        limiter = self.limiter
+        origins = {pid: limiter.cgroup_of(pid) for pid in pids}
+        leaf = limiter.own_leaf(set(origins.values()), pids)
+        if leaf is not None:
+            return leaf
+        scope, moved = limiter.move(app, pids)
+        known = self.origins.setdefault(app, {})
+        for pid in moved:
+            origin = origins[pid]
+            if origin is not None and origin != scope:
+                known.setdefault(pid, origin)
+        return scope
+
+    def _let_go(self, app: str) -> None:
+        """Move an app's processes back once it is neither throttled nor frozen."""
+        if app in self.throttled or app in self.frozen:
+            return
+        self.highs.pop(app, None)
+        origins = self.origins.pop(app, None)
+        if origins:
+            scope = self.limiter.scope_path(app)
+            if self.limiter.limit(scope) is not None:
+                # The same scope carries the app's memory limit; moving out would drop it
+                self.log(f"Relief: leaving {app} in {scope.name}, which has a memory limit")
+                return
+            missed = self.limiter.restore(origins)
+            if missed:
+                self.log(f"Relief: cannot move PIDs {missed} of {app} back to their cgroups")
+
+    def _thaw_all(self, done: list[ReliefAction]) -> None:
+        for app, (scope, _) in list(self.frozen.items()):
+            try:
+                self.limiter.freeze(scope, False)
+            except OSError as e:
+                self.log(f"Relief: cannot thaw {app}: {e}")
+                continue
+            del self.frozen[app]
+            done.append(self._record(app, "thaw", None, scope))
+            self._let_go(app)
+
+    def _release_all(self, done: list[ReliefAction]) -> None:
+        for app, scope in list(self.throttled.items()):
+            try:
+                self.limiter.set_high(scope, self.highs.get(app))
+            except OSError as e:
+                self.log(f"Relief: cannot release {app}: {e}")
+                continue
+            del self.throttled[app]
+            done.append(self._record(app, "release", None, scope))
+            self._let_go(app)
+
+    def undo_all(self) -> list[ReliefAction]:
+        """Thaw and un-throttle everything (relief disabled, or the daemon stopping)."""
+        done: list[ReliefAction] = []
+        self._thaw_all(done)
+        self._release_all(done)
+        self.stage = "none"
+        return done
+
+    def step(
+        self,
+        state: "SystemState",
+        offenders: list[tuple[str, int, list[int]]],
+        focused: Callable[[], Optional[str]],
+        policy: "Policy",
+        now: float,
+    ) -> list[ReliefAction]:
+        """Escalate or undo one tick's worth; offenders are (app, bytes, pids), largest first."""
+        done: list[ReliefAction] = []
+        limiter = self.limiter
+        percent = state.memory_percent
+        psi = state.pressure.get("some", {}).get("avg10", 0.0)
+        rising, self._last_psi = psi > self._last_psi, psi
+
+        # Forget apps whose processes have all exited; prune() removes their scopes
+        for app, scope in list(self.throttled.items()):
+            if not limiter.members(scope):
+                del self.throttled[app]
+                self.origins.pop(app, None)
+                self._let_go(app)
+        for app, (scope, _) in list(self.frozen.items()):
+            if not limiter.members(scope):
+                del self.frozen[app]
+                self.origins.pop(app, None)
+                self._let_go(app)
+
+        # Undo first, so a step is never applied and reversed on the same tick
+        if self.frozen and percent < policy.critical_percent - policy.relief_hysteresis:
+            self._thaw_all(done)
+        if self.throttled and percent < policy.warning_percent - policy.relief_hysteresis:
+            self._release_all(done)
+
+        if state.alert_level == "normal" or not limiter.available:
+            self.stage = "throttle" if self.throttled else "none"
+            return done
+
+        targets = offenders[:policy.relief_max_apps]
+        scopes = {}
+        for app, memory, pids in targets:
+            if app in self.throttled:  # Already moved; new helpers inherit the scope
+                scopes[app] = self.throttled[app]
+                continue
+            try:
+                scopes[app] = self._confine(app, pids)
+            except OSError as e:
+                self.log(f"Relief: cannot move {app} into a scope: {e}")
+        stage = "throttle"
+
+        for app, memory, _ in targets:
+            scope = scopes.get(app)
+            if scope is None or app in self.throttled:
+                continue
+            before = limiter.current(scope)
+            high = limiter.high(scope)
+            try:
+                limiter.set_high(scope, int((before or memory) * policy.relief_high_ratio))
+            except OSError as e:
+                self.log(f"Relief: cannot throttle {app}: {e}")
+                continue
+            self.throttled[app] = scope
+            self.highs[app] = high
+            done.append(self._record(app, "throttle", before, scope))
+
+        reclaim = psi >= policy.relief_reclaim_psi and rising
+        freeze = state.alert_level == "critical" and policy.relief_freeze
+        focus = focused() if reclaim or freeze else None
+        if freeze and focus is None:
+            # Freezing blind could stop the app in use; throttles and reclaim go on
+            if not self._focus_unknown:
+                self.log("Relief: focused app unknown; not freezing anything")
+            self._focus_unknown = True
+            freeze = False
+        elif freeze:
+            self._focus_unknown = False
+        if reclaim:
+            stage = "reclaim"
+            for app, memory, _ in targets:
+                scope = scopes.get(app)
+                if scope is None or app == focus or app in self.frozen:
+                    continue
+                before = limiter.current(scope)
+                try:
+                    limiter.reclaim(scope, int((before or memory) * policy.relief_reclaim_ratio))
+                except OSError as e:
+                    self.log(f"Relief: cannot reclaim from {app}: {e}")
+                    continue
+                done.append(self._record(app, "reclaim", before, scope))
+
+        if freeze:
+            stage = "freeze"
+            for app, _, _ in targets:
+                scope = scopes.get(app)
+                if scope is None or app == focus or app in self.frozen:
+                    continue
+                try:
+                    limiter.freeze(scope, True)
+                except OSError as e:
+                    self.log(f"Relief: cannot freeze {app}: {e}")
+                    continue
+                self.frozen[app] = (scope, now)
+                done.append(self._record(app, "freeze", None, scope))
+
+            # Last resort: the largest app frozen for long enough
+            if policy.relief_kill_after > 0:
+                for app, _, _ in targets:
+                    entry = self.frozen.get(app)
+                    if entry is None or now - entry[1] < policy.relief_kill_after:
+                        continue
+                    scope = entry[0]
+                    before = limiter.current(scope)
+                    try:
+                        limiter.kill(scope)
+                    except OSError as e:
+                        self.log(f"Relief: cannot kill {app}: {e}")
+                        continue
+                    del self.frozen[app]
+                    self.origins.pop(app, None)  # Nothing left to move back
+                    action = ReliefAction(self.clock.time(), app, "kill", before or 0)
+                    self.actions.append(action)
+                    self.log(f"Relief: killed {app} after {now - entry[1]:.0f}s frozen at critical")
+                    done.append(action)
+                    stage = "kill"
+                    break  # One at a time; the next tick sees what it freed
+
+        self.stage = stage
+        return done
+
+    def status(self) -> dict:
+        return {
+            "stage": self.stage,
+            "throttled": sorted(self.throttled),
+            "frozen": sorted(self.frozen),
+            "recent": [asdict(action) for action in list(self.actions)[-5:]],
+        }
+
+
+class PressureMonitor:
+    """Memory pressure (PSI) trigger the main loop can poll on.
+
+    Writing "some <stall_us> <window_us>" to a pressure file arms a trigger
+    that raises POLLPRI when tasks stalled on memory for longer than
+    stall_us within window_us. A FIFO may stand in for the pressure file;
+    it is polled for POLLIN and any write to it counts as an event.
+    """
+
+    def __init__(self, path: Optional[Path], trigger: str):
+        self.path = path
+        self.trigger = trigger
+        self.fd: Optional[int] = None
+        self.events = select.POLLPRI
+        self.wakeups = 0
+        self.error = ""
+        self._fifo = False
+
+    @classmethod
+    def from_policy(cls, policy: "Policy") -> "PressureMonitor":
+        if policy.pressure_path:
+            path = Path(policy.pressure_path)
+        else:
+            cgroup = _user_cgroup_dir()
+            if cgroup and (cgroup / "memory.pressure").exists():
+                path = cgroup / "memory.pressure"
+            else:
+                path = Path("/proc/pressure/memory")
+        return cls(path, policy.pressure_trigger)
+
+    @property
+    def active(self) -> bool:
+        return self.fd is not None
+
+    def open(self) -> bool:
+        """Arm the trigger; returns False if PSI is unavailable."""
+        try:
+            self._fifo = stat.S_ISFIFO(os.stat(self.path).st_mode)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_NONBLOCK)
+            if self._fifo:
+                self.events = select.POLLIN
+            else:
+                os.write(self.fd, self.trigger.encode() + b"\0")
+        except OSError as e:
+            self.close()
+            self.error = str(e)
+            return False
+        return True
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def consume(self) -> None:
+        """Acknowledge an event."""
+        self.wakeups += 1
+        if self._fifo:
+            try:
+                while os.read(self.fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def averages(self) -> dict:
+        """Current some/full stall averages, or {} if not readable."""
+        if self._fifo or self.path is None:
+            return {}
+        try:
+            with open(self.path) as f:
+                return _parse_psi(f.read())
+        except (OSError, ValueError):
+            return {}
+
+
+@dataclass(slots=True)
+class HistoryRecord:
+    time: float  # Unix timestamp
+    used: int  # bytes
+    available: int  # bytes
+    total: int  # bytes
+    level: str
+    top: list[tuple[int, str, int]]  # (pid, name, rss bytes), largest first
+
+
+class HistoryLog:
+    """Fixed-size ring of samples in a memory-mapped file.
+
+    A 64-byte header (magic, record size, capacity, top-N, records ever
+    written) is followed by `capacity` fixed-size records. Appending packs
+    straight into the mapping and bumps the count afterwards, so the file
+    is readable at any time and survives daemon restarts and crashes; a
+    file with a different layout is started over.
+    """
+
+    MAGIC = b"RGHIST01"
+    HEADER = struct.Struct("<8sIII4xQ")
+    HEADER_SIZE = 64
+    COUNT = struct.Struct("<Q")
+    COUNT_OFFSET = 24
+    LEVELS = ("normal", "warning", "critical")
+
+    def __init__(self, path: Path, capacity: int, sync_interval: float = 5.0,
+                 top_n: int = HISTORY_TOP_N):
+        self.path = path
+        self.capacity = capacity
+        self.sync_interval = sync_interval
+        self.top_n = top_n
+        self.record = self.record_struct(top_n)
+        self.count = 0  # records ever written
+        self._mm: Optional[mmap.mmap] = None
+        self._last_sync = 0.0
+        # Reused for every append: head fields, then (pid, rss KiB, name) per slot
+        self._args: list = [0.0, 0, 0, 0, 0, 0] + [0, 0, b""] * top_n
+        self._names: dict[str, bytes] = {}
+
+    @staticmethod
+    def record_struct(top_n: int) -> struct.Struct:
+        # time, used, available, total, level, process count, then per process
+        # pid and RSS in KiB (u32 covers 4 TiB) and the 15-char comm
+        return struct.Struct("<dQQQBB6x" + "II16s" * top_n)
+
+    @property
+    def active(self) -> bool:
+        return self._mm is not None
+
+    def open(self) -> None:
+        """Map the file, continuing an existing ring with the same layout."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        size = self.HEADER_SIZE + self.capacity * self.record.size
+        header = (self.MAGIC, self.record.size, self.capacity, self.top_n)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC, 0o600)
+        try:
+            raw = os.pread(fd, self.HEADER.size, 0)
+            fields = self.HEADER.unpack(raw) if len(raw) == self.HEADER.size else None
+            fresh = fields is None or fields[:4] != header or os.fstat(fd).st_size != size
+            if fresh:
+                os.ftruncate(fd, 0)  # Drop old contents rather than misread them
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        if fresh:
+            self.HEADER.pack_into(self._mm, 0, *header, 0)
+            self.count = 0
+        else:
+            self.count = fields[4]
+
+    def close(self) -> None:
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._mm = None
+
+    def append(self, now: float, state: "SystemState") -> None:
+        """Record one sample; costs a few microseconds, no file I/O."""
+        args = self._args
+        args[0] = now
+        args[1] = state.memory_used
+        args[2] = state.memory_available
+        args[3] = state.memory_total
+        args[4] = self.LEVELS.index(state.alert_level)
+        top = state.top_processes
+        n = min(len(top), self.top_n)
+        args[5] = n
+        names = self._names
+        for i in range(self.top_n):
+            base = 6 + 3 * i
+            if i < n:
+                proc = top[i]
+                name = names.get(proc.name)
+                if name is None:
+                    if len(names) > 4096:
+                        names.clear()
+                    name = names[proc.name] = proc.name.encode(errors="replace")
+                args[base] = proc.pid
+                args[base + 1] = min(proc.rss >> 10, 0xFFFFFFFF)
+                args[base + 2] = name
+            else:
+                args[base] = args[base + 1] = 0
+                args[base + 2] = b""
+
+        offset = self.HEADER_SIZE + (self.count % self.capacity) * self.record.size
+        self.record.pack_into(self._mm, offset, *args)
+        self.count += 1
+        self.COUNT.pack_into(self._mm, self.COUNT_OFFSET, self.count)
+
+        # Dirty pages normally reach disk within the kernel's writeback
+        # interval; when memory is tight, push them out sooner
+        if state.alert_level != "normal":
+            mono = time.monotonic()
+            if mono - self._last_sync >= self.sync_interval:
+                self._last_sync = mono
+                start = offset - offset % mmap.ALLOCATIONGRANULARITY
+                self._mm.flush(0, self.HEADER_SIZE)
+                self._mm.flush(start, offset + self.record.size - start)
+
+    @classmethod
+    def read(cls, path: Path, since: float = 0.0) -> list[HistoryRecord]:
+        """Records at or after `since`, oldest first; works without the daemon."""
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < cls.HEADER_SIZE:
+            raise ValueError(f"{path}: not a history file")
+        magic, record_size, capacity, top_n, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path}: not a history file")
+        record = cls.record_struct(top_n)
+        if record.size != record_size or len(data) < cls.HEADER_SIZE + capacity * record_size:
+            raise ValueError(f"{path}: corrupt history file")
+
+        records = []
+        stamp = struct.Struct("<d")
+        names: dict[bytes, str] = {}
+        for i in range(max(0, count - capacity), count):
+            offset = cls.HEADER_SIZE + (i % capacity) * record_size
+            if stamp.unpack_from(data, offset)[0] < since:
+                continue  # Skip before unpacking the whole record
+            fields = record.unpack_from(data, offset)
+            timestamp, used, available, total, level, n = fields[:6]
+            if level >= len(cls.LEVELS) or timestamp <= 0:
+                continue
+            end = 6 + 3 * min(n, top_n)
+            top = []
+            for pid, kib, raw in zip(fields[6:end:3], fields[7:end:3], fields[8:end:3]):
+                name = names.get(raw)
+                if name is None:
+                    name = names[raw] = raw.rstrip(b"\0").decode(errors="replace")
+                top.append((pid, name, kib << 10))
+            records.append(HistoryRecord(timestamp, used, available, total, cls.LEVELS[level], top))
+        return records
+
+
+# === D-Bus ===
+# Just enough of the wire protocol for notifications: EXTERNAL auth,
+# method calls, replies and signals, little-endian on our side.
+
+_DBUS_ALIGN = {
+    "y": 1, "b": 4, "n": 2, "q": 2, "i": 4, "u": 4, "x": 8, "t": 8, "d": 8,
+    "h": 4, "s": 4, "o": 4, "g": 1, "v": 1, "a": 4, "(": 8, "{": 8,
+}
+_DBUS_FIXED = {
+    "y": "B", "b": "I", "n": "h", "q": "H", "i": "i", "u": "I", "x": "q", "t": "Q",
+    "d": "d", "h": "I",
+}
+DBUS_METHOD_CALL, DBUS_METHOD_RETURN, DBUS_ERROR, DBUS_SIGNAL = 1, 2, 3, 4
+
+
+def _dbus_type_end(sig: str, i: int) -> int:
+    c = sig[i]
+    if c == "a":
+        return _dbus_type_end(sig, i + 1)
+    if c in "({":
+        close = ")" if c == "(" else "}"
+        i += 1
+        while sig[i] != close:
+            i = _dbus_type_end(sig, i)
+    return i + 1
+
+
+def _dbus_split(sig: str) -> list[str]:
+    """Split a signature into its complete types."""
+    types = []
+    i = 0
+    while i < len(sig):
+        end = _dbus_type_end(sig, i)
+        types.append(sig[i:end])
+        i = end
+    return types
+
+
+def _dbus_marshal(buf: bytearray, sig: str, value, endian: str = "<") -> None:
+    """Append one complete type. Variants are given as (signature, value)."""
+    c = sig[0]
+    buf.extend(b"\0" * (-len(buf) % _DBUS_ALIGN[c]))
+    if c in _DBUS_FIXED:
+        buf.extend(struct.pack(endian + _DBUS_FIXED[c], value))
+    elif c in "so":
+        data = value.encode()
+        buf.extend(struct.pack(endian + "I", len(data)) + data + b"\0")
+    elif c == "g":
+        data = value.encode()
+        buf.extend(bytes([len(data)]) + data + b"\0")
+    elif c == "v":
+        _dbus_marshal(buf, "g", value[0], endian)
+        _dbus_marshal(buf, value[0], value[1], endian)
+    elif c == "a":
+        elem = sig[1:]
+        length_at = len(buf)
+        buf.extend(b"\0\0\0\0")
+        buf.extend(b"\0" * (-len(buf) % _DBUS_ALIGN[elem[0]]))
+        start = len(buf)
+        for item in (value.items() if elem[0] == "{" else value):
+            _dbus_marshal(buf, elem, item, endian)
+        struct.pack_into(endian + "I", buf, length_at, len(buf) - start)
+    else:  # struct or dict entry
+        for sub, item in zip(_dbus_split(sig[1:-1]), value):
+            _dbus_marshal(buf, sub, item, endian)
+
+
+def _dbus_unmarshal(buf: bytes, pos: int, sig: str, endian: str = "<") -> tuple[object, int]:
+    """Read one complete type at pos; returns (value, new_pos)."""
+    c = sig[0]
+    pos += -pos % _DBUS_ALIGN[c]
+    if c in _DBUS_FIXED:
+        fmt = endian + _DBUS_FIXED[c]
+        return struct.unpack_from(fmt, buf, pos)[0], pos + struct.calcsize(fmt)
+    if c in "so":
+        (length,) = struct.unpack_from(endian + "I", buf, pos)
+        pos += 4
+        return buf[pos:pos + length].decode(errors="replace"), pos + length + 1
+    if c == "g":
+        length = buf[pos]
+        return buf[pos + 1:pos + 1 + length].decode(), pos + length + 2
+    if c == "v":
+        inner, pos = _dbus_unmarshal(buf, pos, "g", endian)
+        return _dbus_unmarshal(buf, pos, inner, endian)
+    if c == "a":
+        (length,) = struct.unpack_from(endian + "I", buf, pos)
+        elem = sig[1:]
+        pos += 4
+        pos += -pos % _DBUS_ALIGN[elem[0]]
+        end = pos + length
+        items = []
+        while pos < end:
+            item, pos = _dbus_unmarshal(buf, pos, elem, endian)
+            items.append(item)
+        return (dict(items) if elem[0] == "{" else items), pos
+    values = []
+    for sub in _dbus_split(sig[1:-1]):
+        item, pos = _dbus_unmarshal(buf, pos, sub, endian)
+        values.append(item)
+    return tuple(values), pos
+
+
+@dataclass(slots=True)
+class DBusMessage:
+    type: int
+    serial: int
+    fields: dict  # header field code -> value (1 path, 2 interface, 3 member, 5 reply serial)
+    body: tuple
+
+    @property
+    def member(self) -> Optional[str]:
+        return self.fields.get(3)
+
+    @property
+    def reply_serial(self) -> Optional[int]:
+        return self.fields.get(5)
+
+
+class DBusConnection:
+    """Minimal blocking D-Bus client over a Unix socket."""
+
+    def __init__(self, address: str):
+        self.address = address
+        self.sock: Optional[socket.socket] = None
+        self.unique_name = ""
+        self._serial = 0
+        self._buf = b""
+        self._send_lock = threading.Lock()
+
+    @staticmethod
+    def session_address() -> Optional[str]:
+        address = os.environ.get("DBUS_SESSION_BUS_ADDRESS")
+        if address:
+            return address
+        runtime = os.environ.get("XDG_RUNTIME_DIR", f"/run/user/{os.getuid()}")
+        bus = Path(runtime) / "bus"
+        return f"unix:path={bus}" if bus.exists() else None
+
+    def _open_socket(self) -> socket.socket:
+        for entry in self.address.split(";"):
+            transport, _, params = entry.partition(":")
+            if transport != "unix":
+                continue
+            options = dict(p.split("=", 1) for p in params.split(",") if "=" in p)
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                if "path" in options:
+                    sock.connect(options["path"])
+                elif "abstract" in options:
+                    sock.connect("\0" + options["abstract"])
+                else:
+                    sock.close()
+                    continue
+                return sock
+            except OSError:
+                sock.close()
+        raise OSError(f"No usable D-Bus address in {self.address!r}")
+
+    def connect(self, timeout: float = 5.0) -> None:
+        self.sock = self._open_socket()
+        self.sock.settimeout(timeout)
+        uid = str(os.getuid()).encode().hex()
+        self.sock.sendall(b"\0AUTH EXTERNAL " + uid.encode() + b"\r\n")
+        line = self._read_line()
+        if not line.startswith(b"OK "):
+            raise OSError(f"D-Bus authentication failed: {line!r}")
+        self.sock.sendall(b"BEGIN\r\n")
+        serial = self.call("org.freedesktop.DBus", "/org/freedesktop/DBus",
+                           "org.freedesktop.DBus", "Hello")
+        while True:
+            msg = self.read_message()
+            if msg.reply_serial == serial:
+                self.unique_name = msg.body[0] if msg.body else ""
+                break
+        self.sock.settimeout(None)
+
+    def close(self) -> None:
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            finally:
+                self.sock = None
+
+    def _read_line(self) -> bytes:
+        while b"\r\n" not in self._buf:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("D-Bus connection closed")
+            self._buf += chunk
+        line, _, self._buf = self._buf.partition(b"\r\n")
+        return line
+
+    def _recv_exact(self, size: int) -> bytes:
+        while len(self._buf) < size:
+            chunk = self.sock.recv(max(4096, size - len(self._buf)))
+            if not chunk:
+                raise ConnectionError("D-Bus connection closed")
+            self._buf += chunk
+        data, self._buf = self._buf[:size], self._buf[size:]
+        return data
+
+    def send(self, msg_type: int, fields: list[tuple[int, str, object]],
+             signature: str = "", args: tuple = (), flags: int = 0) -> int:
+        body = bytearray()
+        for sig, arg in zip(_dbus_split(signature), args):
+            _dbus_marshal(body, sig, arg)
+        if signature:
+            fields = fields + [(8, "g", signature)]
+        with self._send_lock:
+            self._serial += 1
+            serial = self._serial
+            header = bytearray(b"l" + bytes([msg_type, flags, 1]))
+            header.extend(struct.pack("<II", len(body), serial))
+            _dbus_marshal(header, "a(yv)", [(code, (sig, value)) for code, sig, value in fields])
+            header.extend(b"\0" * (-len(header) % 8))
+            self.sock.sendall(bytes(header + body))
+        return serial
+
+    def call(self, destination: str, path: str, interface: str, member: str,
+             signature: str = "", args: tuple = ()) -> int:
+        """Send a method call; the reply arrives via read_message()."""
+        fields = [(1, "o", path), (2, "s", interface), (3, "s", member), (6, "s", destination)]
+        return self.send(DBUS_METHOD_CALL, fields, signature, args)
+
+    def read_message(self) -> DBusMessage:
+        fixed = self._recv_exact(16)
+        endian = "<" if fixed[:1] == b"l" else ">"
+        body_len, serial, fields_len = struct.unpack_from(endian + "III", fixed, 4)
+        buf = fixed + self._recv_exact(fields_len + (-(16 + fields_len) % 8) + body_len)
+        field_list, pos = _dbus_unmarshal(buf, 12, "a(yv)", endian)
+        fields = dict(field_list)
+        pos += -pos % 8
+        body = []
+        for sig in _dbus_split(fields.get(8, "")):
+            value, pos = _dbus_unmarshal(buf, pos, sig, endian)
+            body.append(value)
+        return DBusMessage(fixed[1], serial, fields, tuple(body))
+
+
+class NotificationDispatcher:
+    """Delivers notifications from a worker thread with a bounded queue.
+
+    Notifications are coalesced by category: a newer notification replaces
+    a queued one of the same category, and an already shown one is updated
+    in place through replaces_id. Actions come back as ActionInvoked
+    signals and are handed to `on_action` on a separate thread. Without a
+    session bus it falls back to notify-send, still off the main loop.
+    """
+
+    BUS_NAME = "org.freedesktop.Notifications"
+    OBJECT_PATH = "/org/freedesktop/Notifications"
+    URGENCY = {"low": 0, "normal": 1, "critical": 2}
+
+    def __init__(
+        self,
+        on_action: Callable[[str, str], None],
+        log: Callable[[str], None],
+        address: Optional[str] = None,
+        maxsize: int = 16,
+        app_name: str = "RAM Guardian",
+    ):
+        self.on_action = on_action
+        self.log = log
+        self.address = address
+        self.maxsize = maxsize
+        self.app_name = app_name
+        self.bus: Optional[DBusConnection] = None
+        self.sent = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.running = False
+        self._cond = threading.Condition()
+        self._order: deque[str] = deque()
+        self._pending: dict[str, tuple[str, str, str, list[tuple[str, str]]]] = {}
+        self._ids: dict[str, int] = {}  # category -> shown notification id
+        self._categories: dict[int, str] = {}  # notification id -> category
+        self._replies: dict[int, list] = {}  # Notify serial -> [Event, DBusMessage, category]
+        self._replies_lock = threading.Lock()
+        self._bus_failed = False
+
+    @property
+    def depth(self) -> int:
+        return len(self._order)
+
+    def start(self) -> None:
+        self.running = True
+        threading.Thread(target=self._worker, name="notify", daemon=True).start()
+
+    def stop(self) -> None:
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
+        if self.bus is not None:
+            self.bus.close()
+
+    def submit(self, title: str, body: str, urgency: str,
+               actions: list[tuple[str, str]], category: str) -> bool:
+        """Queue a notification; returns False if the queue is full."""
+        with self._cond:
+            if category in self._pending:
+                self.coalesced += 1
+            elif len(self._order) >= self.maxsize:
+                self.dropped += 1
+                return False
+            else:
+                self._order.append(category)
+            self._pending[category] = (title, body, urgency, actions)
+            self._cond.notify()
+        return True
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._order or not self.running)
+                if not self.running:
+                    return
+                category = self._order.popleft()
+                note = self._pending.pop(category)
+            try:
+                if self._connect():
+                    self._send_dbus(category, *note)
+                else:
+                    self._send_fallback(category, *note)
+                self.sent += 1
+            except Exception as e:
+                self.log(f"Notification error: {e}")
+
+    def _connect(self) -> bool:
+        if self.bus is not None:
+            return True
+        if self._bus_failed:
+            return False
+        address = self.address or DBusConnection.session_address()
+        if not address:
+            self._bus_failed = True
+            return False
+        bus = DBusConnection(address)
+        try:
+            bus.connect()
+            bus.call("org.freedesktop.DBus", "/org/freedesktop/DBus", "org.freedesktop.DBus",
+                     "AddMatch", "s", (f"type='signal',interface='{self.BUS_NAME}'",))
+        except OSError as e:
+            bus.close()
+            self._bus_failed = True
+            self.log(f"Session bus unavailable ({e}); using notify-send")
+            return False
+        self.bus = bus
+        threading.Thread(target=self._reader, args=(bus,), name="notify-signals", daemon=True).start()
+        return True
+
+    def _reader(self, bus: DBusConnection) -> None:
+        try:
+            while True:
+                msg = bus.read_message()
+                if msg.type in (DBUS_METHOD_RETURN, DBUS_ERROR):
+                    with self._replies_lock:
+                        waiter = self._replies.get(msg.reply_serial)
+                    if waiter is not None:
+                        if msg.type == DBUS_METHOD_RETURN and msg.body:
+                            # Before reading on: an ActionInvoked may follow right away
+                            self._track(waiter[2], msg.body[0])
+                        waiter[1] = msg
+                        waiter[0].set()
+                elif msg.type == DBUS_SIGNAL and msg.fields.get(2) == self.BUS_NAME:
+                    self._on_signal(msg)
+        except (OSError, ValueError, struct.error):
+            pass
+        if self.bus is bus:
+            self.bus = None  # Reconnect on the next notification
+        with self._replies_lock:
+            for waiter in self._replies.values():
+                waiter[0].set()
+
+    def _on_signal(self, msg: DBusMessage) -> None:
+        if msg.member == "ActionInvoked" and len(msg.body) == 2:
+            notification_id, action = msg.body
+            category = self._categories.get(notification_id)
+            if category is not None:
+                threading.Thread(
+                    target=self._run_action, args=(action, category), daemon=True
+                ).start()
+        elif msg.member == "NotificationClosed" and msg.body:
+            category = self._categories.pop(msg.body[0], None)
+            if category is not None and self._ids.get(category) == msg.body[0]:
+                del self._ids[category]
+
+    def _track(self, category: str, notification_id: int) -> None:
+        """Remember which category a shown notification belongs to (reader thread)."""
+        old = self._ids.get(category)
+        if old is not None and old != notification_id:
+            self._categories.pop(old, None)
+        self._ids[category] = notification_id
+        self._categories[notification_id] = category
+
+    def _run_action(self, action: str, category: str) -> None:
+        try:
+            self.on_action(action, category)
+        except Exception as e:
+            self.log(f"Notification action {action} failed: {e}")
+
+    def _send_dbus(self, category: str, title: str, body: str, urgency: str,
+                   actions: list[tuple[str, str]]) -> None:
+        bus = self.bus
+        flat_actions = [item for pair in actions for item in pair]
+        hints = {"urgency": ("y", self.URGENCY.get(urgency, 1)), "category": ("s", category)}
+        waiter = [threading.Event(), None, category]
+        # Register while holding the lock the reader uses, so a fast reply can't be missed
+        with self._replies_lock:
+            serial = bus.call(
+                self.BUS_NAME, self.OBJECT_PATH, self.BUS_NAME, "Notify", "susssasa{sv}i",
+                (self.app_name, self._ids.get(category, 0), "", title, body, flat_actions, hints, -1),
+            )
+            self._replies[serial] = waiter
+        try:
+            waiter[0].wait(5)
+        finally:
+            with self._replies_lock:
+                self._replies.pop(serial, None)
+        reply = waiter[1]
+        if reply is None:
+            raise TimeoutError("no reply from notification server")
+        if reply.type == DBUS_ERROR:
+            raise OSError(reply.fields.get(4, "D-Bus error"))
+        # The reader has already tracked the returned id
+
+    def _send_fallback(self, category: str, title: str, body: str, urgency: str,
+                       actions: list[tuple[str, str]]) -> None:
+        cmd = ["notify-send", "-u", urgency, "-a", self.app_name, "-c", category]
+        for action_id, action_label in actions:
+            cmd.extend(["-A", f"{action_id}={action_label}"])
+        cmd.extend([title, body])
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        if not actions:
+            proc.wait(timeout=5)
+            return
+
+        # notify-send blocks until an action is clicked; wait on a side thread
+        def wait_for_action():
+            action = proc.communicate()[0].strip()
+            if action:
+                self._run_action(action, category)
+
+        threading.Thread(target=wait_for_action, daemon=True).start()
+
+
+@dataclass(slots=True)
+class ProcessInfo:
+    """An app group: a process and the same-named helpers below it."""
+    pid: int  # the group's topmost process
+    start_time: int  # clock ticks since boot; (pid, start_time) is the identity
+    name: str
+    rss: int  # bytes, summed over members
+    memory_mb: float  # memory under the accounting mode, as are memory_percent and ranking
+    memory_percent: float
+    is_electron: bool
+    electron_app_name: Optional[str] = None
+    members: list[tuple[int, int]] = field(default_factory=list, repr=False)  # (pid, rss)
+    memory: int = 0  # bytes: rss, pss or uss
+    pss: Optional[int] = None  # bytes, from cached smaps_rollup; unmeasured members at RSS
+    uss: Optional[int] = None
+    measured_at: float = 0.0  # monotonic time of the oldest member measurement; 0 = estimated
+    growth: Optional["GrowthWindow"] = field(default=None, repr=False, compare=False)
+    cpu: int = 0  # clock ticks, summed over members
+    active_at: float = 0.0  # monotonic time of the scan that last saw cpu change
+
+    @property
+    def key(self) -> tuple[int, int]:
+        """(pid, start_time): the group root's identity, safe against PID reuse."""
+        return self.pid, self.start_time
+
+
+@dataclass(slots=True)
+class ScanDiff:
+    """What changed in the process table during one scan."""
+    appeared: list[ProcessInfo] = field(default_factory=list)
+    exited: list[ProcessInfo] = field(default_factory=list)
+    changed: list[ProcessInfo] = field(default_factory=list)
+
+
+class ProcessTable:
+    """Long-lived table of reportable app groups, indexed by root PID.
+
+    Records are updated in place; only new identities are classified, plus
+    a group that was a lone process and has since gained helpers.
+    """
+
+    def __init__(self):
+        self.records: dict[int, ProcessInfo] = {}
+
+    def update(
+        self,
+        rows: list[tuple[int, int, int, str, Optional[list[str]], list[tuple[int, int]], int]],
+        total: int,
+        classify: Callable[
+            [int, int, str, Optional[list[str]], list[tuple[int, int]]], tuple[bool, Optional[str]]
+        ],
+        now: float,
+    ) -> ScanDiff:
+        diff = ScanDiff()
+        records = self.records
+        seen = set()
+        change_min = CHANGE_MIN_MB * 1024 * 1024
+
+        for pid, start_time, rss, name, argv, members, cpu in rows:
+            seen.add(pid)
+            rec = records.get(pid)
+            if rec is not None and rec.start_time == start_time and rec.name == name:
+                old_rss = rec.rss
+                rec.rss = rss
+                if not rec.is_electron and len(rec.members) == 1 and len(members) > 1:
+                    # Helpers showed up; their cmdlines may give the app away
+                    rec.is_electron, rec.electron_app_name = classify(
+                        pid, start_time, name, argv, members
+                    )
+                rec.members = members
+                if cpu != rec.cpu:
+                    rec.cpu = cpu
+                    rec.active_at = now
+                if abs(rss - old_rss) >= change_min:
+                    diff.changed.append(rec)
+                continue
+
+            if rec is not None:  # PID reused or exec'd into something else
+                diff.exited.append(rec)
+            is_electron, app_name = classify(pid, start_time, name, argv, members)
+            rec = ProcessInfo(
+                pid=pid,
+                start_time=start_time,
+                name=name,
+                rss=rss,
+                memory_mb=rss / (1024 * 1024),
+                memory_percent=rss / total * 100,
+                is_electron=is_electron,
+                electron_app_name=app_name,
+                members=members,
+                memory=rss,
+                cpu=cpu,
+                active_at=now,
+            )
+            records[pid] = rec
+            diff.appeared.append(rec)
+
+        for pid in records.keys() - seen:
+            diff.exited.append(records.pop(pid))
+        return diff
+
+    def top(self, n: int) -> list[ProcessInfo]:
+        return heapq.nlargest(n, self.records.values(), key=attrgetter("memory"))
+
+
+@dataclass
+class SystemState:
+    memory_percent: float
+    memory_used_gb: float
+    memory_total_gb: float
+    top_processes: list[ProcessInfo] = field(default_factory=list)
+    electron_processes: list[ProcessInfo] = field(default_factory=list)
+    alert_level: str = "normal"  # normal, warning, critical
+    memory_used: int = 0  # bytes
+    memory_total: int = 0  # bytes
+    memory_available: int = 0  # bytes
+    pressure: dict = field(default_factory=dict)  # PSI some/full averages
+    forecast: "Forecast" = field(default_factory=lambda: Forecast())
+
+
+@dataclass
+class ScanStats:
+    """What the scanner saw and dropped on the last tick."""
+    total: int = 0  # processes
+    vanished: int = 0  # processes that exited or were unreadable mid-scan
+    grouped: int = 0  # processes folded into a parent's group
+    small: int = 0  # groups with RSS below MIN_PROCESS_MB
+    whitelisted: int = 0  # groups named on the whitelist
+    kept: int = 0  # groups that passed all filters
+
+
+class ProcessScanner:
+    """/proc scanner that rolls processes up into app groups.
+
+    Stage 1 reads only /proc/<pid>/stat for every PID, which gives the
+    parent, comm, start time and RSS in one read. Stage 2 groups each
+    process under its topmost ancestor reached through same-comm parents,
+    which is how Electron/Chromium helpers and worker pools hang off their
+    main process, then drops small and whitelisted groups. cmdlines are left
+    to the caller, which only needs them for groups it has not seen before.
+    """
+
+    def __init__(self, proc_root: Path = PROC_ROOT, workers: int = 1):
+        self.proc_root = str(proc_root)
+        self.workers = workers  # stage 1 shards; may be changed between scans
+        self.stats = ScanStats()
+        self.start_times: dict[int, int] = {}  # pid -> start_time of every process seen last scan
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_size = 0
+
+    @staticmethod
+    def _read(path: str, size: int = 4096) -> Optional[bytes]:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            return os.read(fd, size)
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+
+    def read_cmdline(self, pid: int) -> Optional[list[str]]:
+        data = self._read(f"{self.proc_root}/{pid}/cmdline")
+        if data is None:
+            return None
+        return data.decode(errors="replace").rstrip("\0").split("\0") if data else []
+
+    def _read_stat(self, pid: str) -> Optional[tuple[int, bytes, int, int, int]]:
+        """Return (ppid, comm, start_time, rss_bytes, cpu_ticks) from /proc/<pid>/stat.
+
+        start_time is in clock ticks since boot and, together with the PID,
+        identifies a process across PID reuse. cpu_ticks is utime + stime.
+        """
+        data = self._read(f"{self.proc_root}/{pid}/stat", 1024)
+        if not data:
+            return None
+        rparen = data.rfind(b")")
+        fields = data[rparen + 2:].split(None, 22)
+        try:
+            ppid, start_time, rss = int(fields[1]), int(fields[19]), int(fields[21])
+            cpu = int(fields[11]) + int(fields[12])
+        except (IndexError, ValueError):
+            return None
+        return ppid, data[data.find(b"(") + 1:rparen], start_time, rss * PAGE_SIZE, cpu
+
+    def read_start_time(self, pid: int) -> Optional[int]:
+        """The process's current start_time, to check its identity; None if gone."""
+        row = self._read_stat(str(pid))
+        return row[2] if row is not None else None
+
+    def read_oom(self, pid: int) -> Optional[tuple[int, int]]:
+        """Return (oom_score, oom_score_adj), or None if the process is gone."""
+        try:
+            with open(f"{self.proc_root}/{pid}/oom_score", "rb") as f:
+                score = int(f.read())
+            with open(f"{self.proc_root}/{pid}/oom_score_adj", "rb") as f:
+                adj = int(f.read())
+        except (OSError, ValueError):
+            return None
+        return score, adj
+
+    def _read_stats(self, names: list[str]) -> list[Optional[tuple[int, bytes, int, int, int]]]:
+        return [self._read_stat(name) for name in names]
+
+    def _read_all_stats(self, names: list[str]) -> list[Optional[tuple[int, bytes, int, int, int]]]:
+        """_read_stat for every PID, in order; sharded over threads for big tables.
+
+        The reads release the GIL, so shards overlap their syscalls. Shards
+        are contiguous and map() keeps their order, so the merged result is
+        identical to a serial scan.
+        """
+        workers = self.workers
+        if workers <= 1 or len(names) < PARALLEL_MIN_PIDS:
+            return self._read_stats(names)
+        if self._pool_size != workers:
+            self.close()
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan")
+            self._pool_size = workers
+        size = -(-len(names) // workers)
+        shards = [names[i:i + size] for i in range(0, len(names), size)]
+        return [row for shard in self._pool.map(self._read_stats, shards) for row in shard]
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+            self._pool_size = 0
+
+    def _full_name(self, pid: int, comm: bytes) -> tuple[str, Optional[list[str]]]:
+        """Decode comm; it is truncated to 15 chars, so recover long names
+        from the cmdline like psutil does (returning the cmdline it read)."""
+        name = comm.decode(errors="replace")
+        if len(comm) < 15:
+            return name, None
+        cmdline = self.read_cmdline(pid)
+        if cmdline:
+            exe = os.path.basename(cmdline[0])
+            if exe.startswith(name):
+                name = exe
+        return name, cmdline
+
+    def read_smaps_rollup(self, pid: int) -> Optional[tuple[int, int]]:
+        """Return (pss, uss) in bytes, or None if unreadable (not ours, gone, old kernel)."""
+        data = self._read(f"{self.proc_root}/{pid}/smaps_rollup")
+        if not data:
+            return None
+        pss = uss = 0
+        for line in data.split(b"\n"):
+            if line.startswith(b"Pss:"):
+                pss = int(line.split()[1]) * 1024
+            elif line.startswith((b"Private_Clean:", b"Private_Dirty:")):
+                uss += int(line.split()[1]) * 1024
+        return pss, uss
+
+    def read_exe_id(self, pid: int) -> Optional[tuple[int, int]]:
+        """Return the (device, inode) of the process executable, if readable."""
+        try:
+            st = os.stat(f"{self.proc_root}/{pid}/exe")
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino
+
+    def scan(
+        self, min_rss: int, is_excluded: Callable[[str], bool], pids: Optional[Iterable[int]] = None
+    ) -> list[tuple[int, int, int, str, Optional[list[str]], list[tuple[int, int]], int]]:
+        """Return (pid, start_time, rss_bytes, name, cmdline, members, cpu_ticks) per app group.
+
+        pid, start_time and name are the group root's; rss and cpu_ticks are
+        summed over members, which are (pid, rss_bytes) pairs including the root. cmdline
+        is None unless it was already read to recover a truncated name;
+        callers read it with read_cmdline() when they need it.
+
+        pids limits the scan to those processes; their groups then stop at
+        the first parent outside the set.
+        """
+        stats = ScanStats()
+        start_times = {}
+
+        # Stage 1: one stat read per PID builds the ppid index
+        if pids is None:
+            names = [entry.name for entry in os.scandir(self.proc_root) if entry.name.isdigit()]
+        else:
+            names = [str(pid) for pid in set(pids)]
+        procs: dict[int, tuple[int, bytes, int, int, int]] = {}
+        for name, row in zip(names, self._read_all_stats(names)):
+            if row is None:
+                stats.vanished += 1
+                continue
+            pid = int(name)
+            start_times[pid] = row[2]
+            if row[3]:  # Kernel threads have no RSS
+                procs[pid] = row
+        stats.total = len(names)
+
+        # Stage 2: walk each process up through same-comm parents; paths
+        # are memoized, so the whole table is resolved in one pass
+        root_of: dict[int, int] = {}
+        groups: dict[int, list[tuple[int, int]]] = {}
+        for pid, (_, _, _, rss, _) in procs.items():
+            path = []
+            node = pid
+            while node not in root_of:
+                ppid, comm = procs[node][0], procs[node][1]
+                parent = procs.get(ppid)
+                if parent is None or parent[1] != comm:
+                    root_of[node] = node
+                    break
+                path.append(node)
+                node = ppid
+            root = root_of[node]
+            for node in path:
+                root_of[node] = root
+            groups.setdefault(root, []).append((pid, rss))
+
+        result = []
+        for root, members in groups.items():
+            stats.grouped += len(members) - 1
+            rss = sum(member[1] for member in members)
+            if rss < min_rss:
+                stats.small += 1
+                continue
+            _, comm, start_time, _, _ = procs[root]
+            name, cmdline = self._full_name(root, comm)
+            if is_excluded(name):
+                stats.whitelisted += 1
+                continue
+            cpu = sum(procs[member][4] for member, _ in members)
+            result.append((root, start_time, rss, name, cmdline, members, cpu))
+
+        stats.kept = len(result)
+        self.stats = stats
+        self.start_times = start_times
+        return result
+
+
+def trace_files(path: Path) -> list[Path]:
+    """A trace and the rotated files before it (<path>.1, .2, ...) that exist, oldest first."""
+    rotated = []
+    while (older := path.with_name(f"{path.name}.{len(rotated) + 1}")).exists():
+        rotated.append(older)
+    return [*reversed(rotated), *([path] if path.exists() else [])]
+
+
+class TraceRecorder:
+    """Appends every tick's inputs to a gzip'd JSON-lines trace for `ramguard.py replay`.
+
+    A line holds what the policy logic read on that tick: the system
+    sample, PSI averages, the focused window and, on scan ticks, the
+    scanner's rows and start-time changes, plus the cmdlines, executable
+    IDs, smaps_rollup figures and oom scores read for them. A PID's cmdline
+    is only written when it differs from the last one written. Each file starts with a header
+    holding the config in effect and the live start times and cmdlines, so
+    it replays on its own. A new file is started when the daemon starts
+    and once one reaches max_bytes. Earlier files shift to <path>.1, .2
+    and so on, and the oldest are dropped once the rotated files would
+    exceed max_bytes together; the newest of them is always kept.
+    """
+
+    def __init__(
+        self, path: Path, max_bytes: int, sync_interval: float, config: Callable[[], dict], clock=time
+    ):
+        self.path = path
+        self.clock = clock
+        self.max_bytes = max_bytes
+        self.sync_interval = sync_interval
+        self._config = config
+        self._raw = None
+        self._file: Optional[gzip.GzipFile] = None
+        self._lock = threading.Lock()  # IPC requests read through the scanner too
+        self._tick: dict = {}
+        self._start_times: dict[int, int] = {}  # as of the last scan
+        self._cmdlines: dict[int, Optional[list[str]]] = {}  # pid -> last written, this file
+        self._synced = 0.0
+        self.ticks = 0  # in the current file
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if self.path.exists():
+            self._rotate()
+        self._raw = open(self.path, "wb")
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=6)
+        self.ticks = 0
+        with self._lock:
+            self._write({
+                "trace": TRACE_VERSION,
+                "started": self.clock.time(),
+                "config": self._config(),
+                "born": self._start_times,
+                "cmd": self._cmdlines,
+            })
+
+    def _rotate(self) -> None:
+        """Shift the trace to <path>.1, .1 to .2 and so on, within max_bytes."""
+        files = trace_files(self.path)[::-1]  # Newest first
+        budget = self.max_bytes
+        keep = 0
+        for path in files:
+            size = path.stat().st_size
+            if keep and size > budget:
+                break
+            budget -= size
+            keep += 1
+        for path in files[keep:]:
+            path.unlink()
+        for n in range(keep, 0, -1):
+            os.replace(files[n - 1], self.path.with_name(f"{self.path.name}.{n}"))
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        try:
+            self._file.close()  # Writes the gzip trailer
+        finally:
+            self._raw.close()
+            self._file = self._raw = None
+
+    def _write(self, record: dict) -> None:
+        self._file.write(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+
+    def sample(self, total: int, available: int, used: int, percent: float,
+               pressure: Optional[dict]) -> None:
+        with self._lock:
+            tick = self._tick
+            tick["t"] = round(self.clock.time(), 3)
+            tick["m"] = round(self.clock.monotonic(), 3)
+            tick["mem"] = [total, available, used, percent]
+            if pressure is not None:
+                tick["psi"] = pressure
+
+    def scan(
+        self,
+        rows: list[tuple[int, int, int, str, Optional[list[str]], list[tuple[int, int]], int]],
+        start_times: dict[int, int],
+    ) -> None:
+        old = self._start_times
+        born = {pid: start for pid, start in start_times.items() if old.get(pid) != start}
+        died = list(old.keys() - start_times.keys())
+        with self._lock:
+            self._start_times = start_times  # The scanner makes a new dict every scan
+            self._cmdlines = {
+                pid: cmdline for pid, cmdline in self._cmdlines.items() if pid in start_times
+            }
+            tick = self._tick
+            tick["rows"] = [
+                [pid, start, rss, name, cmdline, [n for member in members for n in member], cpu]
+                for pid, start, rss, name, cmdline, members, cpu in rows
+            ]
+            tick["born"] = born
+            tick["died"] = died
+
+    def note(self, kind: str, pid: int, value) -> None:
+        """Record a read: "cmd", "exe", "smaps" or "oom"."""
+        with self._lock:
+            if kind == "cmd":
+                if pid in self._cmdlines and self._cmdlines[pid] == value:
+                    return
+                self._cmdlines[pid] = value
+            self._tick.setdefault(kind, {})[pid] = value
+
+    def focus(self, pid: Optional[int]) -> None:
+        with self._lock:
+            self._tick["focus"] = pid
+
+    def commit(self) -> None:
+        """Write the tick gathered since the last commit."""
+        with self._lock:
+            tick, self._tick = self._tick, {}
+        if self._file is None or "mem" not in tick:
+            return
+        self._write(tick)
+        self.ticks += 1
+        now = time.monotonic()
+        if now - self._synced >= self.sync_interval:
+            self._synced = now
+            self._file.flush()
+            if self._raw.tell() >= self.max_bytes:
+                self.close()
+                self.open()
+
+
+class RecordingScanner(ProcessScanner):
+    """A ProcessScanner that also writes what it returns into a trace."""
+
+    def __init__(self, trace: TraceRecorder, proc_root: Path = PROC_ROOT, workers: int = 1):
+        super().__init__(proc_root, workers)
+        self.trace = trace
+
+    def scan(
+        self, min_rss: int, is_excluded: Callable[[str], bool], pids: Optional[Iterable[int]] = None
+    ) -> list[tuple[int, int, int, str, Optional[list[str]], list[tuple[int, int]], int]]:
+        rows = super().scan(min_rss, is_excluded, pids)
+        self.trace.scan(rows, self.start_times)
+        return rows
+
+    def read_cmdline(self, pid: int) -> Optional[list[str]]:
+        cmdline = super().read_cmdline(pid)
+        self.trace.note("cmd", pid, cmdline)
+        return cmdline
+
+    def read_exe_id(self, pid: int) -> Optional[tuple[int, int]]:
+        exe = super().read_exe_id(pid)
+        self.trace.note("exe", pid, exe)
+        return exe
+
+    def read_smaps_rollup(self, pid: int) -> Optional[tuple[int, int]]:
+        result = super().read_smaps_rollup(pid)
+        self.trace.note("smaps", pid, result)
+        return result
+
+    def read_oom(self, pid: int) -> Optional[tuple[int, int]]:
+        result = super().read_oom(pid)
+        self.trace.note("oom", pid, result)
+        return result
+
+
+class ClassificationCache:
+    """Memoizes Electron classification, which never changes for a process.
+
+    The first level is keyed by (pid, start_time) so a reused PID is never
+    served a stale result. The second level is keyed by the executable's
+    (device, inode) and only holds results that the process name alone
+    decided, so a new renderer of a known app resolves without matching.
+    """
+
+    def __init__(self, classify: Callable[[str, str], tuple[bool, Optional[str]]]):
+        self._classify = classify
+        # pid -> (start_time, exe_id, result)
+        self._by_pid: dict[int, tuple[int, Optional[tuple[int, int]], tuple[bool, Optional[str]]]] = {}
+        self._by_exe: dict[tuple[int, int], tuple[bool, Optional[str]]] = {}
+        self.hits = 0
+        self.exe_hits = 0
+        self.misses = 0
+
+    def lookup(
+        self, pid: int, start_time: int, name: str, cmdline: Callable[[], str],
+        exe_id: Callable[[int], Optional[tuple[int, int]]],
+    ) -> tuple[bool, Optional[str]]:
+        entry = self._by_pid.get(pid)
+        if entry is not None and entry[0] == start_time:
+            self.hits += 1
+            return entry[2]
+
+        exe = exe_id(pid)
+        result = self._by_exe.get(exe) if exe is not None else None
+        if result is not None:
+            self.exe_hits += 1
+        else:
+            self.misses += 1
+            result = self._classify(name, cmdline())
+            if exe is not None and result[1] is not None and self._classify(name, "") == result:
+                self._by_exe[exe] = result
+
+        self._by_pid[pid] = (start_time, exe, result)
+        return result
+
+    def evict(self, live_pids: AbstractSet[int]) -> None:
+        """Drop entries for processes that have exited."""
+        for pid in self._by_pid.keys() - live_pids:
+            del self._by_pid[pid]
+        live_exes = {entry[1] for entry in self._by_pid.values()}
+        for exe in self._by_exe.keys() - live_exes:
+            del self._by_exe[exe]
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "exe_hits": self.exe_hits,
+            "misses": self.misses,
+            "entries": len(self._by_pid),
+            "executables": len(self._by_exe),
+        }
+
+
+class MemoryAccountant:
+    """PSS/USS for app groups from /proc/<pid>/smaps_rollup under a time budget.
+
+    smaps_rollup walks every mapping of a process, far too slow to read for
+    everything on every scan. The top-K processes by RSS are re-measured
+    every scan; the other members of each group are re-measured group by
+    group, oldest first, until the scan's budget runs out. Results are cached per PID with the time they
+    were taken; members never measured (or unreadable) count at their RSS.
+    """
+
+    def __init__(self, read: Callable[[int], Optional[tuple[int, int]]]):
+        self._read = read
+        self._cache: dict[int, tuple[Optional[int], Optional[int], float]] = {}  # pid -> pss, uss, at
+        self.reads = 0  # on the last scan
+        self.rotated = 0  # groups re-measured beyond the top-K on the last scan
+        self.deferred = 0  # groups left for a later scan
+
+    def _measure(self, pids: list[int], now: float) -> None:
+        cache = self._cache
+        for pid in pids:
+            result = self._read(pid)
+            cache[pid] = (result[0], result[1], now) if result else (None, None, now)
+        self.reads += len(pids)
+
+    def refresh(self, records: Iterable[ProcessInfo], policy: "Policy", now: float) -> None:
+        """Re-measure what the budget allows and set each record's memory fields."""
+        mode = policy.accounting_mode
+        if mode == "rss":
+            for rec in records:
+                rec.memory = rec.rss
+                rec.pss = rec.uss = None
+                rec.measured_at = now
+            return
+
+        self.reads = self.rotated = self.deferred = 0
+        records = list(records)
+        top = heapq.nlargest(
+            policy.accounting_top_k, ((rss, pid) for rec in records for pid, rss in rec.members)
+        )
+        top_pids = {pid for _, pid in top}
+        self._measure([pid for _, pid in top], now)
+        deadline = time.perf_counter() + policy.accounting_budget
+        cache = self._cache
+        never = (None, None, 0.0)
+        rest = []
+        for rec in records:
+            pids = [pid for pid, _ in rec.members if pid not in top_pids]
+            if pids:
+                # Oldest attempt first; unreadable members count as attempted
+                rest.append((min(cache.get(pid, never)[2] for pid in pids), pids))
+        rest.sort(key=itemgetter(0))
+        for i, (_, pids) in enumerate(rest):
+            if i and time.perf_counter() >= deadline:  # At least one, so the rotation moves
+                self.deferred = len(rest) - i
+                break
+            self._measure(pids, now)
+            self.rotated += 1
+
+        for rec in records:
+            pss = uss = 0
+            oldest = now
+            for pid, rss in rec.members:
+                entry = cache.get(pid)
+                if entry is None or entry[0] is None:
+                    pss += rss
+                    uss += rss
+                    oldest = 0.0  # Estimated
+                else:
+                    pss += entry[0]
+                    uss += entry[1]
+                    oldest = min(oldest, entry[2])
+            rec.pss, rec.uss, rec.measured_at = pss, uss, oldest
+            rec.memory = pss if mode == "pss" else uss
+
+    def evict(self, live_pids: AbstractSet[int]) -> None:
+        for pid in self._cache.keys() - live_pids:
+            del self._cache[pid]
+
+    def stats(self) -> dict:
+        return {
+            "reads": self.reads,
+            "rotated": self.rotated,
+            "deferred": self.deferred,
+            "cached": len(self._cache),
+        }
+
+
+class GrowthWindow:
+    """Least-squares line through a series over a sliding time window.
+
+    Running sums make adding and expiring a point O(1) and the slope falls
+    straight out of them, so refreshing every tracked process after a scan
+    is one pass with no refitting. Points are stored relative to an origin
+    (seconds, MiB) that moves forward now and then to keep the sums well
+    conditioned.
+    """
+
+    __slots__ = ("points", "t0", "y0", "n", "st", "sy", "stt", "sty", "syy")
+    MAX_POINTS = 512
+    REBASE_SECONDS = 3600
+
+    def __init__(self, t0: float, value: float):
+        self.points: deque[tuple[float, float]] = deque()
+        self.t0 = t0
+        self.y0 = value
+        self.n = 0
+        self.st = self.sy = self.stt = self.sty = self.syy = 0.0
+
+    def _account(self, x: float, y: float, sign: int) -> None:
+        self.n += sign
+        self.st += sign * x
+        self.sy += sign * y
+        self.stt += sign * x * x
+        self.sty += sign * x * y
+        self.syy += sign * y * y
+
+    def add(self, t: float, value: float, window: float) -> None:
+        x = t - self.t0
+        y = (value - self.y0) / MIB
+        points = self.points
+        points.append((x, y))
+        self._account(x, y, 1)
+        horizon = x - window
+        while points[0][0] < horizon or len(points) > self.MAX_POINTS:
+            self._account(*points.popleft(), -1)
+        if x > self.REBASE_SECONDS:
+            self._rebase()
+
+    def _rebase(self) -> None:
+        """Move the origin to the oldest point and recompute the sums exactly."""
+        dx, dy = self.points[0]
+        self.t0 += dx
+        self.y0 += dy * MIB
+        self.points = deque((x - dx, y - dy) for x, y in self.points)
+        self.n = 0
+        self.st = self.sy = self.stt = self.sty = self.syy = 0.0
+        for x, y in self.points:
+            self._account(x, y, 1)
+
+    @property
+    def span(self) -> float:
+        return self.points[-1][0] - self.points[0][0] if self.points else 0.0
+
+    def fit(self) -> tuple[float, float]:
+        """(slope in bytes/s, r²); (0.0, 0.0) until there are three distinct times."""
+        n = self.n
+        if n < 3:
+            return 0.0, 0.0
+        var_t = n * self.stt - self.st * self.st
+        var_y = n * self.syy - self.sy * self.sy
+        if var_t <= 0:
+            return 0.0, 0.0
+        cov = n * self.sty - self.st * self.sy
+        r2 = cov * cov / (var_t * var_y) if var_y > 0 else 0.0
+        return cov / var_t * MIB, r2
+
+
+@dataclass(slots=True)
+class Forecast:
+    available_rate: float = 0.0  # bytes/s; negative while memory is being used up
+    exhaustion_seconds: Optional[float] = None  # until available memory hits zero
+    leaks: list[tuple[ProcessInfo, float]] = field(default_factory=list)  # (proc, bytes/s)
+
+
+class GrowthTracker:
+    """Growth rates for available memory and every process in the table.
+
+    The system series gets a point every sample and each process one per
+    scan; windows live on the ProcessInfo records, so they go away with them.
+    """
+
+    def __init__(self):
+        self.system: Optional[GrowthWindow] = None
+
+    def add_system(self, now: float, available: int, forecast: Forecast, policy: "Policy") -> None:
+        """Record a sample and refresh the system-wide part of the forecast."""
+        if self.system is None:
+            self.system = GrowthWindow(now, available)
+        self.system.add(now, available, policy.forecast_window)
+        rate, r2 = self.system.fit()
+        trusted = self.system.span >= policy.forecast_min_span and r2 >= policy.forecast_min_fit
+        forecast.available_rate = rate if trusted else 0.0
+        forecast.exhaustion_seconds = available / -rate if trusted and rate < 0 else None
+
+    def add_processes(
+        self, now: float, records: Iterable[ProcessInfo], forecast: Forecast, policy: "Policy"
+    ) -> None:
+        """Record a scan and refresh the leak suspects."""
+        window = policy.forecast_window
+        leaks = []
+        for rec in records:
+            if rec.growth is None:
+                rec.growth = GrowthWindow(now, rec.rss)
+            growth = rec.growth
+            growth.add(now, rec.rss, window)
+            if growth.n < 3 or growth.span < policy.forecast_min_span:
+                continue
+            rate, r2 = growth.fit()
+            if rate >= policy.leak_rate and r2 >= policy.forecast_min_fit:
+                leaks.append((rec, rate))
+        leaks.sort(key=lambda leak: leak[1], reverse=True)
+        forecast.leaks = leaks
+
+
+@dataclass(slots=True)
+class Victim:
+    proc: ProcessInfo
+    score: float
+    reclaimable: int  # bytes: USS when measured, else the accounted memory
+    oom_score: int
+    oom_score_adj: int
+    growth: float  # bytes/s; 0 unless a trusted upward trend
+    idle: float  # seconds since the group last used CPU, at scan resolution
+    focused: bool
+
+    def to_dict(self) -> dict:
+        proc = self.proc
+        return {
+            "pid": proc.pid,
+            "start_time": proc.start_time,
+            "name": proc.name,
+            "app_name": proc.electron_app_name,
+            "score": round(self.score, 1),
+            "reclaimable_mb": round(self.reclaimable / MIB, 1),
+            "oom_score": self.oom_score,
+            "oom_score_adj": self.oom_score_adj,
+            "growth_mb_per_min": round(self.growth * 60 / MIB, 1),
+            "idle_seconds": round(self.idle),
+            "focused": self.focused,
+            "member_count": len(proc.members),
+        }
+
+
+class VictimScorer:
+    """Ranks app groups by how much killing them would help, and hurt.
+
+    The base is reclaimable memory in MiB: USS when measured, since shared
+    pages outlive the process. It is scaled by:
+      oom_score_adj  1 + adj/1000; groups at -1000 are never candidates
+      growth         up to x3 at twice leak_mb_per_minute
+      idle           up to x2 after IDLE_FULL seconds without CPU
+      focus          FOCUS_FACTOR for the focused app
+    oom_score is reported but not weighed again; it is mostly the memory
+    share the base already measures.
+    """
+
+    IDLE_FULL = 600.0
+    FOCUS_FACTOR = 0.1
+
+    def __init__(self, read_oom: Callable[[int], Optional[tuple[int, int]]]):
+        self._read_oom = read_oom
+
+    def rank(
+        self, records: Iterable[ProcessInfo], focused_app: Optional[str], policy: "Policy", now: float
+    ) -> list[Victim]:
+        own = os.getpid()
+        protect = policy.relief_protect
+        victims = []
+        for rec in records:
+            app = rec.electron_app_name or rec.name
+            if rec.pid == own or app.lower() in protect or rec.name.lower() in protect:
+                continue
+            oom = self._read_oom(rec.pid)
+            if oom is None or oom[1] <= -1000:
+                continue
+            reclaimable = rec.uss if rec.uss is not None else rec.memory
+            growth = 0.0
+            if rec.growth is not None and rec.growth.span >= policy.forecast_min_span:
+                rate, r2 = rec.growth.fit()
+                if rate > 0 and r2 >= policy.forecast_min_fit:
+                    growth = rate
+            idle = now - rec.active_at if rec.active_at else 0.0
+            focused = app == focused_app
+
+            score = reclaimable / MIB * (1 + oom[1] / 1000) * (1 + min(idle / self.IDLE_FULL, 1.0))
+            if policy.leak_rate > 0:
+                score *= 1 + min(growth / policy.leak_rate, 2.0)
+            if focused:
+                score *= self.FOCUS_FACTOR
+            victims.append(Victim(rec, score, reclaimable, oom[0], oom[1], growth, idle, focused))
+        victims.sort(key=attrgetter("score"), reverse=True)
+        return victims
+
+
+class Histogram:
+    """Fixed-bucket histogram of durations in seconds (Prometheus semantics)."""
+
+    __slots__ = ("counts", "count", "sum")
+
+    def __init__(self):
+        self.counts = [0] * (len(METRIC_BUCKETS) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(METRIC_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile; None if empty or past the last bound."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(METRIC_BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+
+class _PhaseTimer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class DaemonMetrics:
+    """The daemon's own cost: phase timings, tick overruns and process usage.
+
+    Each phase is only ever timed from one thread (IPC handling from the
+    event loop), so histograms need no lock; a reader may see one update
+    half-applied, which is fine for monitoring. Disabled, timer() hands
+    back a shared no-op context manager.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.phases = {phase: Histogram() for phase in METRIC_PHASES}
+        self.overruns = 0  # ticks that took longer than the interval before them
+        self.last_tick = 0.0  # seconds
+        self.started = time.monotonic()
+
+    def timer(self, phase: str):
+        if not self.enabled:
+            return _NULL_TIMER
+        return _PhaseTimer(self.phases[phase])
+
+    def observe(self, phase: str, seconds: float) -> None:
+        if self.enabled:
+            self.phases[phase].observe(seconds)
+
+    def tick(self, seconds: float, interval: float) -> None:
+        """Record a main loop iteration; interval is the sleep scheduled before it."""
+        if not self.enabled:
+            return
+        self.phases["tick"].observe(seconds)
+        self.last_tick = seconds
+        if interval and seconds > interval:
+            self.overruns += 1
+
+    @staticmethod
+    def process_usage() -> dict:
+        """The daemon's own RSS, CPU time and thread count."""
+        try:
+            with open("/proc/self/statm", "rb") as f:
+                rss = int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            rss = 0
+        times = os.times()
+        return {
+            "rss_bytes": rss,
+            "cpu_seconds": round(times.user + times.system, 3),
+            "threads": threading.active_count(),
+        }
+
+    def snapshot(self, extra: dict) -> dict:
+        """JSON-ready view: phase summaries, process usage and the caller's extra fields."""
+        return {
+            "enabled": self.enabled,
+            "uptime_seconds": round(time.monotonic() - self.started, 1),
+            "tick_overruns": self.overruns,
+            "last_tick_ms": round(self.last_tick * 1000, 3),
+            "process": self.process_usage(),
+            "phases": {
+                phase: {
+                    "count": h.count,
+                    "total_ms": round(h.sum * 1000, 3),
+                    "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else None,
+                    "p50_ms_le": _ms(h.quantile(0.5)),
+                    "p99_ms_le": _ms(h.quantile(0.99)),
+                }
+                for phase, h in self.phases.items()
+            },
+            **extra,
+        }
+
+    def prometheus(self, counters: dict, gauges: dict) -> str:
+        """Prometheus text exposition format; counters and gauges map name -> (help, value)."""
+        lines = [
+            "# HELP ramguard_phase_seconds Time spent per daemon phase.",
+            "# TYPE ramguard_phase_seconds histogram",
+        ]
+        for phase, h in self.phases.items():
+            cumulative = 0
+            for bound, n in zip(METRIC_BUCKETS, h.counts):
+                cumulative += n
+                lines.append(f'ramguard_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+            lines.append(f'ramguard_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {h.count}')
+            lines.append(f'ramguard_phase_seconds_sum{{phase="{phase}"}} {h.sum:.6f}')
+            lines.append(f'ramguard_phase_seconds_count{{phase="{phase}"}} {h.count}')
+
+        usage = self.process_usage()
+        counters = {
+            "ramguard_tick_overruns_total": ("Ticks longer than their interval.", self.overruns),
+            "ramguard_process_cpu_seconds_total": ("Daemon CPU time.", usage["cpu_seconds"]),
+            **counters,
+        }
+        gauges = {
+            "ramguard_process_resident_memory_bytes": ("Daemon RSS.", usage["rss_bytes"]),
+            "ramguard_process_threads": ("Daemon threads.", usage["threads"]),
+            **gauges,
+        }
+        described = set()
+        for kind, metrics in (("counter", counters), ("gauge", gauges)):
+            for name, (text, value) in metrics.items():
+                family = name.partition("{")[0]  # Labelled series share one HELP/TYPE
+                if family not in described:
+                    described.add(family)
+                    lines += [f"# HELP {family} {text}", f"# TYPE {family} {kind}"]
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def _cap_table(table: dict, cap: int) -> int:
+    """Drop the oldest entries (insertion order) beyond cap; returns how many went."""
+    excess = len(table) - cap
+    if excess <= 0:
+        return 0
+    for key in list(islice(table, excess)):
+        del table[key]
+    return excess
+
+
+def render_waybar(status: dict) -> dict:
+    """Waybar custom-module JSON (text/tooltip/class) for a status dict."""
+    level = status.get("alert_level", "normal")
+    icon = "󰀦" if level == "critical" else "󰍛"
+    percent = status.get("memory_percent", 0)
+    top = status.get("top_process")
+
+    text = f"{icon} {percent}% {top}" if top else f"{icon} {percent}%"
+    tooltip = (
+        f"RAM: {status.get('memory_used_gb', 0)}GB / "
+        f"{status.get('memory_total_gb', 0)}GB ({percent}%)"
+    )
+    if top:
+        tooltip += f"\nTop: {top} ({status.get('top_memory_mb', 0)}MB)"
+    if status.get("electron_count"):
+        tooltip += f"\nElectron apps: {status['electron_count']}"
+    if status.get("limited_count"):
+        tooltip += f"\nMemory limited: {status['limited_count']}"
+    forecast = status.get("forecast") or {}
+    if forecast.get("exhaustion_minutes") is not None:
+        tooltip += f"\nFull in ~{forecast['exhaustion_minutes']:.0f} min at the current rate"
+    for leak in forecast.get("leaks", [])[:3]:
+        tooltip += f"\nGrowing: {leak['name']} +{leak['mb_per_min']:.0f}MB/min"
+    relief = status.get("relief") or {}
+    if relief.get("frozen"):
+        tooltip += f"\nFrozen: {', '.join(relief['frozen'])}"
+    if relief.get("throttled"):
+        tooltip += f"\nThrottled: {', '.join(relief['throttled'])}"
+    return {"text": text, "tooltip": tooltip, "class": level}
+
+
+class Snapshot:
+    """What clients are shown of one tick, published whole and never modified.
+
+    The main loop builds a new snapshot after every scan and tick and
+    publishes it by assigning RamGuard.snapshot. IPC and notification
+    threads read that reference once per request, so a response never
+    mixes two ticks and takes no lock. records are copies of the scan's
+    app groups, which the next scan updates in place; top, electron and
+    the ranked victims point at those copies. victims is None when the
+    scan didn't rank them (no client asked lately). leaves is the cgroup
+    accountant's dict, which a refresh replaces rather than updates.
+    Encoded responses are cached on first use: status and waybar per tick,
+    the process list and deltas per scan, carried over to the later ticks'
+    snapshots. Threads racing to encode the same response store identical
+    bytes.
+    """
+
+    __slots__ = (
+        "generation", "status", "processes", "records", "top", "electron", "victims", "leaves",
+        "_lines", "_scan_lines",
+    )
+
+    def __init__(
+        self,
+        generation: int,
+        status: dict,
+        processes: list[dict],
+        records: dict[int, ProcessInfo],
+        top: tuple[ProcessInfo, ...],
+        electron: tuple[ProcessInfo, ...],
+        victims: Optional[tuple[Victim, ...]],
+        leaves: dict[str, CgroupUsage],
+    ):
+        self.generation = generation
+        self.status = status
+        self.processes = processes
+        self.records = records
+        self.top = top
+        self.electron = electron
+        self.victims = victims
+        self.leaves = leaves
+        self._lines: dict[str, bytes] = {}
+        self._scan_lines: dict[str, bytes] = {}
+
+    def with_status(self, status: dict) -> "Snapshot":
+        """The same scan with a later tick's status."""
+        snapshot = copy.copy(self)
+        snapshot.status = status
+        snapshot._lines = {}
+        return snapshot
+
+    def line(self, kind: str) -> bytes:
+        """The response to "status", "waybar" or "processes", newline included."""
+        lines = self._scan_lines if kind == "processes" else self._lines
+        line = lines.get(kind)
+        if line is None:
+            if kind == "status":
+                text = json.dumps(self.status)
+            elif kind == "waybar":
+                text = json.dumps(render_waybar(self.status), ensure_ascii=False)
+            else:
+                text = json.dumps(self.processes)
+            line = lines[kind] = text.encode() + b"\n"
+        return line
+
+    def scan_line(self, key: str, build: Callable[[], dict]) -> bytes:
+        """A per-scan response, built and encoded on first use."""
+        line = self._scan_lines.get(key)
+        if line is None:
+            line = self._scan_lines[key] = json.dumps(build()).encode() + b"\n"
+        return line
+
+
+class RamGuard:
+    def __init__(
+        self,
+        proc_root: Path = PROC_ROOT,
+        config: Optional[dict] = None,
+        scanner: Optional[ProcessScanner] = None,
+        clock=time,
+    ):
+        # time() and monotonic() for everything the policy decides on; a
+        # replay passes the trace's clock. perf_counter is always real
+        self.clock = clock
+        self.focus_source = _hyprland_active_pid  # PID of the focused window, or None
+        self.config = config if config is not None else self._load_config()
+        self.policy = Policy.compile(self.config)
+        self._config_lock = threading.Lock()
+        self._reload_requested = threading.Event()
+        self._wake_r, self._wake_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        self.config_writer = ConfigWriter(CONFIG_FILE, self._config_snapshot, self._log)
+        self.config_watcher = ConfigWatcher(CONFIG_FILE, self._request_reload)
+        self.pressure = PressureMonitor.from_policy(self.policy)
+        self.history = HistoryLog(HISTORY_FILE, self.policy.history_records, self.policy.history_sync)
+        # Two-tier sampling: cheap system samples vs. full process scans
+        self.sample_runs = 0
+        self.scan_runs = 0
+        self.sample_interval = 0.0
+        self._last_scan_time = 0.0
+        self._last_scan_used = 0
+        self._last_scan_level = ""
+        self._scan_requested = False
+        self._scan_cond = threading.Condition()
+        self._victims_until = 0.0  # monotonic time until which scans rank kill candidates
+        self.running = True
+        self.state = SystemState(0, 0, 0)
+        # Per-process state is keyed by (pid, start_time), so a reused PID
+        # starts fresh; _prune_state() drops exited processes after each scan
+        self.last_notification_time: dict[str, float] = {}  # category:title -> time
+        self.known_electron: dict[tuple[int, int], float] = {}  # -> time detected
+        self.limited: dict[tuple[int, int], str] = {}  # every limited member -> scope name
+        self.leak_suspects: dict[tuple[int, int], float] = {}  # -> time reported
+        self.state_evictions = 0  # entries dropped by the caps rather than by exits
+        self.limited_groups = 0  # groups in the table whose root is limited
+        self.socket_server: Optional[asyncio.AbstractServer] = None
+        self.ipc_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.ipc_thread: Optional[threading.Thread] = None
+        self.ipc_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ipc")
+        # Subscriber queue -> stream kind ("status" or "waybar"); IPC loop only
+        self._subscribers: dict[asyncio.Queue, str] = {}
+        # Each finished scan is a generation. Numbering starts at the start
+        # time in ms, so a generation a client kept from a previous run
+        # never matches one of this run's
+        self.generation = int(self.clock.time() * 1000)
+        self._generations: tuple[Snapshot, ...] = ()  # the last GENERATIONS_KEPT scans; swapped whole
+        self._waiters: list[asyncio.Future] = []  # wait?since= requests; IPC loop only
+        self.notifier = NotificationDispatcher(self._handle_notification_action, self._log)
+        self.trace: Optional[TraceRecorder] = None
+        if scanner is None:
+            if self.policy.trace_enabled:
+                self.trace = TraceRecorder(
+                    TRACE_FILE, self.policy.trace_max_bytes, self.policy.trace_sync,
+                    self._config_snapshot, clock,
+                )
+                scanner = RecordingScanner(self.trace, proc_root, workers=self.policy.scan_workers)
+            else:
+                scanner = ProcessScanner(proc_root, workers=self.policy.scan_workers)
+        self.scanner = scanner
+        self.limiter = CgroupLimiter.from_policy(self.policy, proc_root)
+        self.relief = ReliefEngine(self.limiter, self._log, clock)
+        self.cgroups = CgroupAccountant(self.limiter.root)
+        self.victims = VictimScorer(self.scanner.read_oom)
+        self.table = ProcessTable()
+        self.diff = ScanDiff()  # Last scan's changes, consumed by _check_and_notify
+        self.classifier = ClassificationCache(self._is_electron_process)
+        self.accountant = MemoryAccountant(self.scanner.read_smaps_rollup)
+        self.growth = GrowthTracker()
+        self.metrics = DaemonMetrics(self.policy.metrics_enabled)
+        self._textfile_written = 0.0
+        self.snapshot = Snapshot(self.generation, self._get_status(), [], {}, (), (), None, {})
+
+    def _load_config(self) -> dict:
+        config = copy.deepcopy(DEFAULT_CONFIG)
+        if CONFIG_FILE.exists():
+            try:
+                with open(CONFIG_FILE, "rb") as f:
+                    user_config = tomllib.load(f)
+                    self._deep_merge(config, user_config)
+            except Exception as e:
+                self._log(f"Error loading config: {e}")
+        return config
+
+    def _config_snapshot(self) -> dict:
+        with self._config_lock:
+            return copy.deepcopy(self.config)
+
+    def _update_config(self, mutate: Callable[[dict], None]) -> None:
+        """Apply a change to the config, swap in a new policy and save later."""
+        with self._config_lock:
+            mutate(self.config)
+            self.policy = Policy.compile(self.config)
+        self.config_writer.schedule()
+
+    def _wake(self) -> None:
+        """Interrupt the main loop's wait."""
+        try:
+            os.write(self._wake_w, b"\0")
+        except BlockingIOError:
+            pass  # Already pending
+        except OSError:
+            pass  # Closed; shutting down
+
+    def close(self) -> None:
+        """Release the wake pipe, the IPC executor and the scanner's workers."""
+        self.ipc_executor.shutdown(wait=False)
+        self.scanner.close()
+        if self._wake_r >= 0:
+            os.close(self._wake_r)
+            os.close(self._wake_w)
+            self._wake_r = self._wake_w = -1
+
+    def _request_reload(self) -> None:
+        self._reload_requested.set()
+        self._wake()
+
+    def _reload_config(self) -> None:
+        """Re-read the config file and atomically swap in the new policy."""
+        try:
+            st = CONFIG_FILE.resolve().stat()
+            if (st.st_ino, st.st_mtime_ns) == self.config_writer.last_written:
+                return  # Our own write
+        except OSError:
+            pass
+        if self.config_writer.pending:
+            self._log("Config changed on disk; discarding unsaved changes")
+            self.config_writer.cancel()
+
+        config = self._load_config()
+        try:
+            policy = Policy.compile(config)
+        except (KeyError, TypeError, AttributeError, ValueError) as e:
+            self._log(f"Invalid config, keeping previous: {e}")
+            return
+        with self._config_lock:
+            self.config = config
+            self.policy = policy
+        self.metrics.enabled = policy.metrics_enabled
+        self._log("Config reloaded")
+
+    @staticmethod
+    def _deep_merge(base: dict, override: dict) -> None:
+        for key, value in override.items():
+            if key in base and isinstance(base[key], dict) and isinstance(value, dict):
+                RamGuard._deep_merge(base[key], value)
+            else:
+                base[key] = value
+
+    def _log(self, msg: str) -> None:
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        print(f"[{timestamp}] {msg}", file=sys.stderr)
+
+    def _notify(
+        self,
+        title: str,
+        body: str,
+        urgency: str = "normal",
+        actions: Optional[list[tuple[str, str]]] = None,
+        category: str = "ramguard",
+    ) -> None:
+        policy = self.policy
+        if not policy.notifications_enabled:
+            return
+
+        # Rate limiting
+        now = self.clock.time()
+        min_interval = policy.min_notify_interval
+        key = f"{category}:{title}"
+        if key in self.last_notification_time:
+            if now - self.last_notification_time[key] < min_interval:
+                return
+        self.last_notification_time[key] = now
+
+        if not policy.swaync_actions:
+            actions = None
+        if not self.notifier.submit(title, body, urgency, actions or [], category):
+            self._log(f"Notification queue full, dropped: {title}")
+
+    def _handle_notification_action(self, action: str, category: str) -> None:
+        """Handle notification button clicks (called off the main thread)."""
+        if action == "open_menu":
+            subprocess.Popen(["rofi-ramguard-menu"])
+        elif action == "kill_top":
+            victims = self._published_victims()
+            if victims:
+                self._kill_process(victims[0].proc.pid, victims[0].proc.start_time)
+        elif action.startswith("set_limit:"):
+            pid = int(action.split(":")[1])
+            subprocess.Popen(["rofi-ramguard-menu", "--set-limit", str(pid)])
+        elif action.startswith("whitelist:"):
+            name = action.split(":")[1]
+            self._add_to_whitelist(name)
+
+    def _is_whitelisted(self, name: str) -> bool:
+        return self.policy.is_whitelisted(name)
+
+    def _add_to_whitelist(self, name: str) -> None:
+        if not self.policy.is_whitelisted(name):
+            self._update_config(lambda c: c["whitelist"]["processes"].append(name))
+            self._notify("Whitelisted", f"{name} added to whitelist", "low")
+
+    def _is_electron_process(self, name: str, cmdline: str) -> tuple[bool, Optional[str]]:
+        """Check if process is Electron-based and identify the app."""
+        return self.policy.classify(name, cmdline)
+
+    def _apply_memory_limit(self, proc_info: ProcessInfo) -> bool:
+        """Apply a cgroup memory limit to the process and the rest of its app."""
+        if not self.policy.auto_limit:
+            return False
+
+        if proc_info.key in self.limited:
+            return True  # Already limited
+
+        if not self.limiter.available:
+            self._log("Cannot apply memory limit: no writable cgroup v2 root")
+            return False
+
+        # Get app-specific limit or default
+        app = proc_info.electron_app_name or proc_info.name
+        limit_mb = self.policy.limit_for(app)
+
+        # Batch every member of every group of the same app into one scope
+        start_times = self.scanner.start_times
+        pids = [
+            pid for p in self.table.records.values() if (p.electron_app_name or p.name) == app
+            for pid, _ in p.members if (pid, start_times.get(pid)) not in self.limited
+        ]
+        if proc_info.pid not in pids:
+            pids.append(proc_info.pid)
+
+        try:
+            with self.metrics.timer("limit"):
+                moved = self.limiter.apply(app, pids, limit_mb)
+        except OSError as e:
+            self._log(f"Error applying memory limit: {e}")
+            return False
+
+        scope_name = self.limiter.scope_path(app).name
+        for pid in moved:
+            self.limited[(pid, start_times.get(pid, 0))] = scope_name
+        if len(moved) < len(pids):
+            missed = sorted(set(pids) - set(moved))
+            self._log(f"Could not move PIDs {missed} into {scope_name}")
+        self._count_limited()
+        if proc_info.pid not in moved:
+            return False
+        self._log(f"Applied {limit_mb}MB limit to {app} ({len(moved)} processes in {scope_name})")
+        return True
+
+    def _kill_process(self, pid: int, start_time: Optional[int] = None) -> bool:
+        """SIGTERM a process, then SIGKILL after 3s, if it is still the one meant.
+
+        start_time defaults to what the last scan saw for pid. The identity
+        is checked after opening a pidfd, and signals go through that pidfd,
+        so a PID reused in the meantime is never signalled.
+        """
+        expected = start_time if start_time is not None else self.scanner.start_times.get(pid)
+        try:
+            fd = os.pidfd_open(pid)
+        except ProcessLookupError:
+            return True  # Already gone
+        except OSError as e:
+            self._log(f"Error killing process: {e}")
+            return False
+        try:
+            if expected is not None and self.scanner.read_start_time(pid) != expected:
+                self._log(f"Not killing PID {pid}: it now belongs to a different process")
+                return False
+            rec = self.snapshot.records.get(pid)
+            name = rec.name if rec is not None else str(pid)
+            signal.pidfd_send_signal(fd, signal.SIGTERM)
+            poller = select.poll()
+            poller.register(fd, select.POLLIN)  # Readable once the process exits
+            if not poller.poll(3000):
+                signal.pidfd_send_signal(fd, signal.SIGKILL)
+            self._notify("Process Killed", f"Terminated {name} (PID {pid})", "normal")
+            return True
+        except ProcessLookupError:
+            return True  # Exited meanwhile
+        except OSError as e:
+            self._log(f"Error killing process: {e}")
+            return False
+        finally:
+            os.close(fd)
+
+    def _rank_victims(
+        self, focused_app: Optional[str] = None, records: Optional[list[ProcessInfo]] = None
+    ) -> list[Victim]:
+        """Kill candidates from the current table (or records), best first (main thread).
+
+        Other threads use the ranking published in the snapshot.
+        """
+        if focused_app is None:
+            focused_app = self._focused_app()
+        if records is None:
+            records = list(self.table.records.values())
+        return self.victims.rank(records, focused_app, self.policy, self.clock.monotonic())
+
+    def _poll_memory(self) -> None:
+        """Poll system and process memory."""
+        self._sample_system()
+        self._scan_processes()
+
+    def _sample_system(self) -> None:
+        """Cheap tier: system memory, alert level and pressure only."""
+        mem = psutil.virtual_memory()
+        pressure = self.pressure.averages() if self.pressure.path is not None else None
+        self._apply_sample(mem.total, mem.available, mem.used, mem.percent, pressure)
+
+    def _apply_sample(
+        self, total: int, available: int, used: int, percent: float, pressure: Optional[dict]
+    ) -> None:
+        """Take in one system sample, live or from a trace."""
+        if self.trace is not None:
+            self.trace.sample(total, available, used, percent, pressure)
+        self.state.memory_percent = percent
+        self.state.memory_used = used
+        self.state.memory_total = total
+        self.state.memory_available = available
+        self.state.memory_used_gb = used / (1024**3)
+        self.state.memory_total_gb = total / (1024**3)
+
+        # Determine alert level
+        warning = self.policy.warning_percent
+        critical = self.policy.critical_percent
+
+        if percent >= critical:
+            self.state.alert_level = "critical"
+        elif percent >= warning:
+            self.state.alert_level = "warning"
+        else:
+            self.state.alert_level = "normal"
+
+        if pressure is not None:
+            self.state.pressure = pressure
+        if self.policy.forecast_enabled:
+            self.growth.add_system(self.clock.monotonic(), available, self.state.forecast, self.policy)
+        self.sample_runs += 1
+
+    def _scan_due(self) -> bool:
+        """Whether the last sample warrants the expensive per-process tier."""
+        if self._scan_requested or self.state.alert_level != self._last_scan_level:
+            return True
+        if self.clock.monotonic() - self._last_scan_time >= self.policy.max_staleness:
+            return True
+        delta = abs(self.state.memory_used - self._last_scan_used)
+        return delta > self.policy.scan_delta_mb * 1024 * 1024
+
+    def _request_scan(self, timeout: float, max_age: float = 1.0) -> None:
+        """Ask the main loop for a fresh process scan and wait for it."""
+        with self._scan_cond:
+            if self.clock.monotonic() - self._last_scan_time < max_age:
+                return  # Fresh enough
+            seen = self.scan_runs
+            self._scan_requested = True
+        self._wake()
+        with self._scan_cond:
+            self._scan_cond.wait_for(lambda: self.scan_runs != seen, timeout)
+
+    def _classify(
+        self, pid: int, start_time: int, name: str, argv: Optional[list[str]],
+        members: list[tuple[int, int]],
+    ) -> tuple[bool, Optional[str]]:
+        def cmdline() -> str:
+            return " ".join(argv if argv is not None else self.scanner.read_cmdline(pid) or [])
+
+        with self.metrics.timer("classify"):
+            result = self.classifier.lookup(pid, start_time, name, cmdline, self.scanner.read_exe_id)
+            if result[0] or len(members) < 2:
+                return result
+            # An Electron main process can look ordinary; its helpers carry --type=
+            helper = max((m for m in members if m[0] != pid), key=itemgetter(1))[0]
+            return self._is_electron_process(name, " ".join(self.scanner.read_cmdline(helper) or []))
+
+    def _scan_processes(self) -> None:
+        """Expensive tier: per-process scan and Electron detection."""
+        total = self.state.memory_total
+
+        # The scanner drops tiny and whitelisted processes before any
+        # cmdline is read; the table only classifies new identities
+        min_rss = MIN_PROCESS_MB * 1024 * 1024
+        self.scanner.workers = self.policy.scan_workers
+        pids = None
+        if self.policy.accounting_source == "cgroup":
+            if self.cgroups.available:
+                # Only the processes of cgroups worth a closer look
+                pids = self.cgroups.refresh(self.policy.cgroup_detail, self.clock.monotonic())
+            elif self.cgroups.active or not self.scan_runs:
+                self._log("No user cgroup to account from; scanning every process")
+        if pids is None and self.cgroups.active:
+            self.cgroups.clear()
+        rows = self.scanner.scan(min_rss, self._is_whitelisted, pids)
+        self.diff = self.table.update(rows, total, self._classify, self.clock.monotonic())
+        self.accountant.refresh(self.table.records.values(), self.policy, self.clock.monotonic())
+        for rec in self.table.records.values():
+            rec.memory_mb = rec.memory / MIB
+            rec.memory_percent = rec.memory / total * 100
+        if self.policy.forecast_enabled:
+            self.growth.add_processes(
+                self.clock.monotonic(), self.table.records.values(), self.state.forecast, self.policy
+            )
+
+        self.state.top_processes = self.table.top(TOP_N)
+        electron_procs = [p for p in self.table.records.values() if p.is_electron]
+        electron_procs.sort(key=attrgetter("memory"), reverse=True)
+        self.state.electron_processes = electron_procs
+        live = self.scanner.start_times.keys()
+        self.classifier.evict(live)
+        self.accountant.evict(live)
+        self._prune_state()
+
+        now = self.clock.monotonic()
+        processes = [self._process_dict(p, now) for p in self.state.top_processes]
+        records = {pid: copy.copy(rec) for pid, rec in self.table.records.items()}
+        top = tuple(records[p.pid] for p in self.state.top_processes)
+        electron = tuple(records[p.pid] for p in self.state.electron_processes)
+        victims = None
+        if now < self._victims_until:
+            victims = tuple(self._rank_victims(records=list(records.values()))[:VICTIMS_KEPT])
+        with self._scan_cond:
+            self._scan_requested = False
+            self._last_scan_time = now
+            self._last_scan_used = self.state.memory_used
+            self._last_scan_level = self.state.alert_level
+            self.scan_runs += 1
+            self.generation += 1
+            # Published before _request_scan() callers wake, so they are served this scan
+            self.snapshot = Snapshot(
+                self.generation, self._get_status(), processes, records, top, electron, victims,
+                self.cgroups.leaves,
+            )
+            self._generations = (*self._generations[1 - GENERATIONS_KEPT:], self.snapshot)
+            self._scan_cond.notify_all()
+        if self.ipc_loop is not None:
+            self.ipc_loop.call_soon_threadsafe(self._release_waiters)
+
+    def _published_victims(self) -> tuple[Victim, ...]:
+        """Kill candidates ranked by a recent scan (IPC and notification threads).
+
+        A scan already past its ranking check when the request came in
+        publishes no victims, so this waits for the next one, up to 2s.
+        """
+        self._victims_until = self.clock.monotonic() + VICTIMS_SECONDS
+        deadline = time.monotonic() + 2.0
+        self._request_scan(timeout=2.0)
+        while self.snapshot.victims is None and (left := deadline - time.monotonic()) > 0:
+            self._request_scan(timeout=left, max_age=0.0)  # The next scan ranks them
+        return self.snapshot.victims or ()
+
+    def _exited(self, key: tuple[int, int]) -> bool:
+        """Whether the process behind a (pid, start_time) key is gone."""
+        start_time = self.scanner.start_times.get(key[0])
+        if start_time is None:  # Not scanned; with the cgroup source, alive while a cgroup lists it
+            return key[0] not in self.cgroups.pids
+        return start_time != key[1]
+
+    def _prune_state(self) -> None:
+        """Forget exited processes and expired rate limits, then cap every table."""
+        for table in (self.known_electron, self.leak_suspects):
+            for key in [key for key in table if self._exited(key)]:
+                del table[key]
+        exited = [key for key in self.limited if self._exited(key)]
+        for key in exited:
+            del self.limited[key]
+        if exited:
+            self.limiter.prune()
+        horizon = self.clock.time() - self.policy.min_notify_interval
+        sent = self.last_notification_time
+        for key in [key for key, when in sent.items() if when < horizon]:
+            del sent[key]
+
+        evicted = sum(
+            _cap_table(table, STATE_TABLE_CAP)
+            for table in (self.known_electron, self.limited, self.leak_suspects, sent)
+        )
+        if evicted:
+            self.state_evictions += evicted
+            self._log(f"State tables over {STATE_TABLE_CAP} entries; dropped {evicted} oldest")
+        self._count_limited()
+
+    def _count_limited(self) -> None:
+        limited = self.limited
+        self.limited_groups = sum(
+            (p.pid, p.start_time) in limited for p in self.table.records.values()
+        )
+
+    def _state_sizes(self) -> dict:
+        """Entries in every table that grows with the process population."""
+        return {
+            "process_table": len(self.table.records),
+            "scanned_pids": len(self.scanner.start_times),
+            "known_electron": len(self.known_electron),
+            "limited": len(self.limited),
+            "leak_suspects": len(self.leak_suspects),
+            "notification_times": len(self.last_notification_time),
+            "classifier": self.classifier.stats()["entries"],
+            "classifier_executables": self.classifier.stats()["executables"],
+            "accounting_cache": self.accountant.stats()["cached"],
+            "cgroups": len(self.cgroups.leaves),
+            "subscribers": len(self._subscribers),
+            "waiters": len(self._waiters),
+            "generations": len(self._generations),
+        }
+
+    def _check_and_notify(self) -> None:
+        """Check thresholds and send notifications."""
+        state = self.state
+
+        # System memory alerts
+        if state.alert_level == "critical":
+            top = state.top_processes[0] if state.top_processes else None
+            top_msg = f" - {top.name} using {top.memory_mb:.0f}MB" if top else ""
+            self._notify(
+                "󰀦 RAM Critical!",
+                f"RAM at {state.memory_percent:.0f}%{top_msg}\nConsider closing apps",
+                urgency="critical",
+                actions=[("open_menu", "Open Menu"), ("kill_top", "Kill Top")],
+                category="ramguard-alert",
+            )
+        elif state.alert_level == "warning":
+            top = state.top_processes[0] if state.top_processes else None
+            top_msg = f" - {top.name} using {top.memory_mb:.0f}MB" if top else ""
+            self._notify(
+                "󰍛 RAM Warning",
+                f"RAM at {state.memory_percent:.0f}%{top_msg}",
+                urgency="normal",
+                actions=[("open_menu", "Open Menu")],
+                category="ramguard-alert",
+            )
+
+        # The kernel's OOM killer struck inside an app's cgroup
+        oom_kills, self.cgroups.oom_kills = self.cgroups.oom_kills, []
+        for usage, killed in oom_kills:
+            self._notify(
+                f"󰀦 {usage.name} Ran Out of Memory",
+                f"The kernel killed {killed} of its processes ({usage.events['oom_kill']} so far)",
+                urgency="critical",
+                category="ramguard-oom",
+            )
+
+        diff, self.diff = self.diff, ScanDiff()
+
+        # Trend alerts fire before the thresholds are crossed
+        policy = self.policy
+        forecast = state.forecast
+        if (
+            forecast.exhaustion_seconds is not None
+            and forecast.exhaustion_seconds < policy.exhaustion_warning
+            and state.alert_level != "critical"
+        ):
+            grower = forecast.leaks[0][0] if forecast.leaks else None
+            grower_msg = (
+                f"\n{grower.electron_app_name or grower.name} is growing fastest" if grower else ""
+            )
+            self._notify(
+                "󰀦 RAM Running Out",
+                f"RAM full in ~{forecast.exhaustion_seconds / 60:.0f} min at the current rate"
+                f"{grower_msg}",
+                urgency="normal",
+                actions=[("open_menu", "Open Menu")],
+                category="ramguard-alert",
+            )
+        for proc, rate in forecast.leaks:
+            if proc.key in self.leak_suspects:
+                continue
+            self.leak_suspects[proc.key] = self.clock.monotonic()
+            app_name = proc.electron_app_name or proc.name
+            per_min = rate * 60 / MIB
+            self._log(f"Leak suspected: {app_name} (PID {proc.pid}) +{per_min:.0f}MB/min")
+            body = f"Growing {per_min:.0f}MB/min ({proc.memory_mb:.0f}MB now)"
+            # Limit by slope rather than waiting for 80% of the limit
+            if (
+                policy.preemptive_limit
+                and policy.electron_enabled
+                and proc.is_electron
+                and proc.key not in self.limited
+                and self._apply_memory_limit(proc)
+            ):
+                body += f"\n{policy.limit_for(app_name)}MB limit applied"
+            self._notify(
+                f"󰁝 {app_name} May Be Leaking",
+                body,
+                urgency="normal",
+                actions=[(f"set_limit:{proc.pid}", "Set Limit"), ("open_menu", "Open Menu")],
+                category="ramguard-leak",
+            )
+
+        # Electron app detection and limiting react to the last scan's diff
+        if policy.electron_enabled:
+            for proc in diff.appeared:
+                if proc.is_electron and proc.key not in self.known_electron:
+                    self.known_electron[proc.key] = self.clock.monotonic()
+
+                    if policy.notify_on_detect:
+                        self._notify(
+                            "󰘔 Electron App Detected",
+                            f"{proc.electron_app_name or proc.name} ({proc.memory_mb:.0f}MB)",
+                            urgency="normal",
+                            actions=[
+                                (f"set_limit:{proc.pid}", "Set Limit"),
+                                (f"whitelist:{proc.name}", "Whitelist"),
+                            ],
+                            category="ramguard-electron",
+                        )
+
+            # Apply memory limit to new or grown processes
+            if policy.auto_limit:
+                for proc in diff.appeared + diff.changed:
+                    if not proc.is_electron or proc.key in self.limited:
+                        continue
+                    app_name = proc.electron_app_name or proc.name
+                    max_mem = policy.limit_for(app_name)
+                    if proc.memory_mb > max_mem * 0.8:  # If using >80% of limit
+                        if self._apply_memory_limit(proc):
+                            self._notify(
+                                "󰄰 Memory Limit Applied",
+                                f"{app_name}: {max_mem}MB limit",
+                                urgency="low",
+                                actions=[("open_menu", "Configure")],
+                                category="ramguard-limit",
+                            )
+
+    def _relief_offenders(self, focused_app: Optional[str]) -> list[tuple[str, int, list[int]]]:
+        """(app, bytes, pids) for every app relief may act on, best kill candidate first."""
+        policy = self.policy
+        records = self.table.records.values()
+        if policy.relief_targets == "electron":
+            records = [rec for rec in records if rec.is_electron]
+        apps: dict[str, list] = {}  # app -> [score, bytes, pids]
+        for victim in self._rank_victims(focused_app, list(records)):
+            rec = victim.proc
+            entry = apps.setdefault(rec.electron_app_name or rec.name, [0.0, 0, []])
+            entry[0] += victim.score
+            entry[1] += rec.memory
+            entry[2].extend(pid for pid, _ in rec.members)
+        ranked = sorted(apps.items(), key=lambda item: item[1][0], reverse=True)
+        return [
+            (app, memory, pids) for app, (_, memory, pids) in ranked
+            if memory >= policy.relief_min_app
+        ]
+
+    def _active_pid(self) -> Optional[int]:
+        pid = self.focus_source()
+        if self.trace is not None:
+            self.trace.focus(pid)
+        return pid
+
+    def _focused_app(self) -> Optional[str]:
+        """The focused window's app, from the live table (main thread)."""
+        pid = self._active_pid()
+        if pid is None:
+            return None
+        for rec in self.table.records.values():
+            if any(member == pid for member, _ in rec.members):
+                return rec.electron_app_name or rec.name
+        return None
+
+    def _relieve_pressure(self) -> None:
+        """Run the relief engine for this tick and tell the user what it did."""
+        relief = self.relief
+        if not self.policy.relief_enabled:
+            actions = relief.undo_all() if relief.active else []
+        elif self.state.alert_level == "normal" and not relief.active:
+            return
+        else:
+            focused = self._focused_app()
+            actions = relief.step(
+                self.state, self._relief_offenders(focused), lambda: focused, self.policy,
+                self.clock.monotonic(),
+            )
+
+        frozen = [a.app for a in actions if a.step == "freeze"]
+        thawed = [a.app for a in actions if a.step == "thaw"]
+        if frozen:
+            self._notify(
+                "󰏤 Apps Paused",
+                f"{', '.join(frozen)} frozen until RAM recovers",
+                urgency="critical",
+                actions=[("open_menu", "Open Menu")],
+                category="ramguard-relief",
+            )
+        elif thawed:
+            self._notify("󰐊 Apps Resumed", ", ".join(thawed), urgency="low", category="ramguard-relief")
+        for action in actions:
+            if action.step == "kill":
+                self._notify(
+                    f"󰆴 {action.app} Killed",
+                    f"Still out of memory after freezing it; freed ~{action.recovered / MIB:.0f}MB",
+                    urgency="critical",
+                    category="ramguard-kill",
+                )
+
+    def _get_status(self) -> dict:
+        """Get current status for clients."""
+        state = self.state
+        top = state.top_processes[0] if state.top_processes else None
+        forecast = state.forecast
+
+        status = {
+            "memory_percent": round(state.memory_percent, 1),
+            "memory_used_gb": round(state.memory_used_gb, 2),
+            "memory_total_gb": round(state.memory_total_gb, 2),
+            "alert_level": state.alert_level,
+            "top_process": top.name if top else None,
+            "top_memory_mb": round(top.memory_mb, 0) if top else None,
+            "top_memory_age": self._memory_age(top, self.clock.monotonic()) if top else None,
+            "electron_count": len(state.electron_processes),
+            "limited_count": self.limited_groups,
+            "generation": self.generation,
+            "pressure": {
+                "source": str(self.pressure.path) if self.pressure.active else None,
+                "wakeups": self.pressure.wakeups,
+                **state.pressure,
+            },
+            "tiers": {
+                "sample_runs": self.sample_runs,
+                "scan_runs": self.scan_runs,
+                "sample_interval": round(self.sample_interval, 2),
+                "scan_age": round(self.clock.monotonic() - self._last_scan_time, 1),
+            },
+            "notifications": {
+                "queued": self.notifier.depth,
+                "sent": self.notifier.sent,
+                "coalesced": self.notifier.coalesced,
+                "dropped": self.notifier.dropped,
+            },
+            "forecast": {
+                "available_mb_per_min": round(forecast.available_rate * 60 / MIB, 1),
+                "exhaustion_minutes": (
+                    round(forecast.exhaustion_seconds / 60, 1)
+                    if forecast.exhaustion_seconds is not None else None
+                ),
+                "leaks": [
+                    {
+                        "pid": proc.pid,
+                        "name": proc.electron_app_name or proc.name,
+                        "mb_per_min": round(rate * 60 / MIB, 1),
+                    }
+                    for proc, rate in forecast.leaks
+                ],
+            },
+            "history": {
+                "path": str(self.history.path) if self.history.active else None,
+                "written": self.history.count,
+                "capacity": self.history.capacity,
+            },
+            "trace": (
+                {"path": str(self.trace.path), "ticks": self.trace.ticks}
+                if self.trace is not None and self.trace.active else None
+            ),
+            "accounting": {"mode": self.policy.accounting_mode, **self.accountant.stats()},
+            "cgroups": self.cgroups.stats() if self.cgroups.active else None,
+            "relief": self.relief.status(),
+            "scan": asdict(self.scanner.stats),
+            "table_size": len(self.table.records),
+            "classifier": self.classifier.stats(),
+        }
+        return status
+
+    def _render_view(self, view: str) -> list[str]:
+        """Ready-to-display rofi menu lines."""
+        snapshot = self.snapshot
+        if view == "processes":
+            return [
+                f"{'󰘔' if p.is_electron else '󰓩'} {p.memory_mb:.0f}MB {p.name}"
+                + (f" ({len(p.members)} processes)" if len(p.members) > 1 else "")
+                for p in snapshot.top[:15]
+            ]
+        if view == "electron":
+            return [
+                f"󰘔 {p.memory_mb:.0f}MB {p.electron_app_name or p.name}"
+                for p in snapshot.electron
+            ] or ["No Electron apps detected"]
+        if view == "kill":  # Best candidates first; pid|name|MB|start_time
+            return [
+                f"{v.proc.pid}|{v.proc.name}|{v.proc.memory_mb:.0f}MB|{v.proc.start_time}"
+                for v in self._published_victims()
+            ]
+        if view == "status":
+            status = snapshot.status
+            return [
+                f"RAM: {status['memory_used_gb']:.1f}G / {status['memory_total_gb']:.1f}G "
+                f"({status['memory_percent']:.0f}%)"
+            ]
+        raise ValueError(f"unknown view {view!r}")
+
+    @staticmethod
+    def _memory_age(proc: ProcessInfo, now: float) -> Optional[float]:
+        """Seconds since the group's memory figure was measured; None while estimated from RSS."""
+        return round(now - proc.measured_at, 1) if proc.measured_at else None
+
+    def _process_dict(self, proc: ProcessInfo, now: float) -> dict:
+        return {
+            "pid": proc.pid,
+            "name": proc.name,
+            "memory_mb": round(proc.memory_mb, 1),
+            "rss_mb": round(proc.rss / MIB, 1),
+            "pss_mb": round(proc.pss / MIB, 1) if proc.pss is not None else None,
+            "uss_mb": round(proc.uss / MIB, 1) if proc.uss is not None else None,
+            "memory_age": self._memory_age(proc, now),
+            "is_electron": proc.is_electron,
+            "app_name": proc.electron_app_name,
+            "member_count": len(proc.members),
+        }
+
+    def _processes_since(self, snapshot: Snapshot, since: int) -> bytes:
+        """processes?since=<gen> against a snapshot, cached on it per `since`.
+
+        "unchanged" if nothing moved; added and changed entries in full and
+        removed PIDs if `since` is still kept; otherwise the whole list.
+        """
+        generation = snapshot.generation
+        if since == generation:
+            return snapshot.scan_line("unchanged", lambda: {"generation": generation, "unchanged": True})
+        old = next((kept for kept in self._generations if kept.generation == since), None)
+        if old is None or since > generation:
+            return snapshot.scan_line(
+                "all", lambda: {"generation": generation, "processes": snapshot.processes}
+            )
+        return snapshot.scan_line(
+            f"since:{since}",
+            lambda: self._process_delta(old.processes, snapshot.processes, since, generation),
+        )
+
+    @staticmethod
+    def _process_delta(old: list[dict], current: list[dict], since: int, generation: int) -> dict:
+        """memory_age alone doesn't make an entry changed."""
+
+        def figures(proc: dict) -> dict:
+            return {key: value for key, value in proc.items() if key != "memory_age"}
+
+        before = {proc["pid"]: figures(proc) for proc in old}
+        added = [proc for proc in current if proc["pid"] not in before]
+        changed = [
+            proc for proc in current
+            if proc["pid"] in before and figures(proc) != before[proc["pid"]]
+        ]
+        removed = list(before.keys() - {proc["pid"] for proc in current})
+        order = [proc["pid"] for proc in current]
+        if not added and not changed and not removed and order == [proc["pid"] for proc in old]:
+            return {"generation": generation, "unchanged": True}
+        return {
+            "generation": generation,
+            "since": since,
+            "added": added,
+            "changed": changed,
+            "removed": removed,
+            "order": order,  # PIDs, largest first
+        }
+
+    def _snapshot_line(self, command: str) -> bytes:
+        """Serve SNAPSHOT_COMMANDS and processes?since=<gen> from the published snapshot."""
+        snapshot = self.snapshot
+        if command.startswith("processes?"):
+            try:
+                since = int(self._query(command)["since"])
+            except (KeyError, ValueError) as e:
+                return json.dumps({"error": f"bad request: {e}"}).encode() + b"\n"
+            return self._processes_since(snapshot, since)
+        return snapshot.line(command)
+
+    @staticmethod
+    def _query(command: str) -> dict[str, str]:
+        """Parameters of a "name?key=value&key=value" request."""
+        query = command.partition("?")[2]
+        return dict(part.partition("=")[::2] for part in query.split("&") if part)
+
+    def _release_waiters(self) -> None:
+        """Answer wait?since= requests after a scan (IPC loop)."""
+        waiters, self._waiters = self._waiters, []
+        for future in waiters:
+            if not future.done():
+                future.set_result(None)
+
+    async def _wait_generation(self, command: str) -> bytes:
+        """wait?since=<gen>: processes?since=<gen> once a newer scan exists.
+
+        Waits on the IPC loop rather than an executor thread, so any number
+        of clients can wait; answers "unchanged" after WAIT_SECONDS.
+        """
+        try:
+            since = int(self._query(command).get("since", self.generation))
+        except ValueError as e:
+            return json.dumps({"error": f"bad request: {e}"}).encode() + b"\n"
+        if since >= self.generation:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            try:
+                await asyncio.wait_for(future, WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                self._waiters.remove(future)
+        return self._processes_since(self.snapshot, since)
+
+    def _cgroup_detail(self, snapshot: Snapshot, rel: str) -> dict:
+        """A leaf cgroup's usage with the app groups scanned inside it."""
+        usage = snapshot.leaves.get(rel)
+        if usage is None:
+            return {"path": rel, "error": "cgroup is gone"}
+        pids = set(usage.pids)
+        now = self.clock.monotonic()
+        return {
+            **CgroupAccountant.usage_dict(usage),
+            "processes": [
+                self._process_dict(p, now)
+                for p in sorted(snapshot.records.values(), key=attrgetter("memory"), reverse=True)
+                if p.pid in pids
+            ],
+        }
+
+    def _group_members(self, snapshot: Snapshot, pid: int) -> list[dict]:
+        """Members of the app group rooted at pid, largest first, with their role."""
+        proc = snapshot.records.get(pid)
+        if proc is None:
+            return []
+        members = []
+        for member, rss in sorted(proc.members, key=itemgetter(1), reverse=True):
+            argv = self.scanner.read_cmdline(member) or []
+            role = next((arg[7:] for arg in argv if arg.startswith("--type=")), None)
+            members.append({
+                "pid": member,
+                "memory_mb": round(rss / MIB, 1),
+                "type": role or ("main" if member == pid else None),
+            })
+        return members
+
+    def _handle_command(self, command: str) -> str:
+        """Serve one IPC request; returns a single-line JSON response."""
+        try:
+            if command.startswith("rofi:"):
+                view = command.split(":", 1)[1]
+                if view not in ("status", "kill"):  # The kill view asks for its own scan
+                    self._request_scan(timeout=2.0)
+                return json.dumps(self._render_view(view), ensure_ascii=False)
+            elif command == "cgroups":
+                if not self.cgroups.active:
+                    return json.dumps({"error": "not accounting from cgroups"})
+                leaves = sorted(self.snapshot.leaves.values(), key=attrgetter("current"), reverse=True)
+                return json.dumps([CgroupAccountant.usage_dict(usage) for usage in leaves])
+            elif command.startswith("cgroup:"):
+                # cgroup:<path, unit or app name>: scan its processes too, for a while
+                if not self.cgroups.active:
+                    return json.dumps({"error": "not accounting from cgroups"})
+                matches = self.cgroups.request(command.split(":", 1)[1], self.clock.monotonic())
+                if not matches:
+                    return json.dumps({"error": "no such cgroup"})
+                self._request_scan(timeout=2.0, max_age=0.0)
+                snapshot = self.snapshot
+                return json.dumps([self._cgroup_detail(snapshot, rel) for rel in matches])
+            elif command == "metrics":
+                return json.dumps(self.metrics.snapshot(self._metrics_extra()))
+            elif command == "metrics:prometheus":
+                return json.dumps(self._metrics_prometheus())  # One line; clients decode it
+            elif command.startswith("members:"):
+                return json.dumps(self._group_members(self.snapshot, int(command.split(":")[1])))
+            elif command == "victims":
+                return json.dumps([victim.to_dict() for victim in self._published_victims()[:10]])
+            elif command.startswith("kill:"):
+                # kill:<pid>[:<start_time>], as listed by "victims"
+                parts = command.split(":")
+                start_time = int(parts[2]) if len(parts) > 2 else None
+                success = self._kill_process(int(parts[1]), start_time)
+                return json.dumps({"success": success})
+            elif command.startswith("limit:"):
+                parts = command.split(":")
+                pid, limit_mb = int(parts[1]), int(parts[2])
+                proc = self.snapshot.records.get(pid)
+                if proc:
+                    key = (proc.electron_app_name or proc.name).lower()
+                    self._update_config(
+                        lambda c: c["electron_apps"].__setitem__(key, limit_mb)
+                    )
+                    return json.dumps({"success": True})
+                return json.dumps({"success": False})
+            return json.dumps({"error": "unknown command"})
+        except (IndexError, KeyError, ValueError) as e:
+            return json.dumps({"error": f"bad request: {e}"})
+        except Exception as e:
+            self._log(f"Socket error: {e}")
+            return json.dumps({"error": str(e)})
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve newline-delimited requests until the client disconnects."""
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    line = await reader.readuntil(b"\n")
+                except asyncio.IncompleteReadError as e:
+                    line = e.partial  # EOF; serve a final unterminated request
+                except asyncio.LimitOverrunError:
+                    writer.write(b'{"error": "request too large"}\n')
+                    break
+
+                command = line.decode(errors="replace").strip()
+                if command in ("subscribe", "subscribe:status", "subscribe:waybar"):
+                    await self._stream_status(writer, command.partition(":")[2] or "status")
+                    break
+                if command in SNAPSHOT_COMMANDS or command.startswith("processes?"):
+                    # processes?since=<gen> never waits for a scan
+                    start = time.perf_counter()
+                    if command == "processes":
+                        await loop.run_in_executor(self.ipc_executor, self._request_scan, 2.0)
+                    writer.write(self._snapshot_line(command))
+                    self.metrics.observe("ipc", time.perf_counter() - start)
+                    await writer.drain()
+                elif command == "wait" or command.startswith("wait?"):
+                    writer.write(await self._wait_generation(command))
+                    await writer.drain()
+                elif command:
+                    start = time.perf_counter()
+                    if command.startswith(BLOCKING_COMMANDS):
+                        response = await loop.run_in_executor(
+                            self.ipc_executor, self._handle_command, command
+                        )
+                    else:
+                        response = self._handle_command(command)
+                    self.metrics.observe("ipc", time.perf_counter() - start)
+                    writer.write(response.encode() + b"\n")
+                    await writer.drain()
+                if not line.endswith(b"\n"):
+                    break
+        except (ConnectionError, OSError):
+            pass
+        except asyncio.CancelledError:
+            pass  # Daemon shutting down
+        finally:
+            writer.close()
+
+    async def _stream_status(self, writer: asyncio.StreamWriter, kind: str) -> None:
+        """Push a line after every tick until the client goes away.
+
+        "waybar" streams only send a line when the rendered output changes,
+        or again once RESEND_SECONDS have passed without one, tick or not,
+        so a quiet stream still tells the client the daemon is alive
+        whatever heartbeat_seconds is.
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        if self.sample_runs:
+            queue.put_nowait(self.snapshot.line(kind))
+        self._subscribers[queue] = kind
+        last = None
+        sent = 0.0
+        resend = RESEND_SECONDS if kind == "waybar" else None
+        try:
+            while True:
+                try:
+                    line = await asyncio.wait_for(queue.get(), resend)
+                except asyncio.TimeoutError:
+                    if last is None:
+                        continue
+                    line = last  # Quiet for RESEND_SECONDS: repeat it
+                else:
+                    if kind == "waybar" and line == last and self.clock.monotonic() - sent < RESEND_SECONDS:
+                        continue
+                writer.write(line)
+                await writer.drain()
+                last = line
+                sent = self.clock.monotonic()
+        finally:
+            del self._subscribers[queue]
+
+    def _broadcast(self, snapshot: Snapshot) -> None:
+        for queue, kind in self._subscribers.items():
+            if queue.full():  # Slow reader: only the latest line matters
+                queue.get_nowait()
+            queue.put_nowait(snapshot.line(kind))  # Encoded once for every subscriber
+
+    def _metrics_extra(self) -> dict:
+        notifier = self.notifier
+        return {
+            "notifications": {
+                "queued": notifier.depth,
+                "sent": notifier.sent,
+                "coalesced": notifier.coalesced,
+                "dropped": notifier.dropped,
+            },
+            "ticks": {"samples": self.sample_runs, "scans": self.scan_runs},
+            "tables": self._state_sizes(),
+            "state_evictions": self.state_evictions,
+        }
+
+    def _metrics_prometheus(self) -> str:
+        notifier = self.notifier
+        counters = {
+            "ramguard_samples_total": ("Cheap system samples taken.", self.sample_runs),
+            "ramguard_scans_total": ("Full process scans.", self.scan_runs),
+            "ramguard_notifications_sent_total": ("Notifications delivered.", notifier.sent),
+            "ramguard_notifications_coalesced_total": (
+                "Notifications replaced by a newer one of the same category.", notifier.coalesced
+            ),
+            "ramguard_notifications_dropped_total": (
+                "Notifications dropped on a full queue.", notifier.dropped
+            ),
+            "ramguard_state_evictions_total": (
+                "State entries dropped by the table caps.", self.state_evictions
+            ),
+        }
+        gauges = {
+            "ramguard_notification_queue_depth": ("Notifications waiting.", notifier.depth),
+            "ramguard_sample_interval_seconds": ("Current sampling interval.", self.sample_interval),
+        }
+        for table, size in self._state_sizes().items():
+            gauges[f'ramguard_table_entries{{table="{table}"}}'] = ("Entries per state table.", size)
+        return self.metrics.prometheus(counters, gauges)
+
+    def _write_metrics_textfile(self) -> None:
+        """Atomically rewrite the Prometheus textfile, at most every textfile_seconds."""
+        now = self.clock.monotonic()
+        if now - self._textfile_written < self.policy.metrics_textfile_interval:
+            return
+        self._textfile_written = now
+        path = Path(self.policy.metrics_textfile)
+        tmp = path.with_name(f".{path.name}.tmp")
+        try:
+            tmp.write_text(self._metrics_prometheus())
+            os.replace(tmp, path)
+        except OSError as e:
+            self._log(f"Cannot write metrics to {path}: {e}")
+
+    def _commit_trace(self) -> None:
+        try:
+            self.trace.commit()
+        except OSError as e:
+            self._log(f"Trace recording stopped: {e}")
+            self.trace.close()
+
+    def _publish_status(self) -> None:
+        """Publish this tick's snapshot and hand it to subscribers (called from the main loop)."""
+        self.snapshot = snapshot = self.snapshot.with_status(self._get_status())
+        if self.ipc_loop is not None and self._subscribers:
+            self.ipc_loop.call_soon_threadsafe(self._broadcast, snapshot)
+
+    def _start_socket_server(self) -> None:
+        """Start the asyncio Unix socket server for IPC on its own thread."""
+        if SOCKET_PATH.exists():
+            SOCKET_PATH.unlink()
+
+        self.ipc_loop = asyncio.new_event_loop()
+
+        async def serve():
+            self.socket_server = await asyncio.start_unix_server(
+                self._serve_client, path=str(SOCKET_PATH), limit=MAX_REQUEST_BYTES
+            )
+
+        def run_loop():
+            asyncio.set_event_loop(self.ipc_loop)
+            self.ipc_loop.run_until_complete(serve())
+            ready.set()
+            self.ipc_loop.run_forever()
+
+        ready = threading.Event()
+        self.ipc_thread = threading.Thread(target=run_loop, name="ipc", daemon=True)
+        self.ipc_thread.start()
+        ready.wait()
+
+    async def _stop_socket_server(self) -> None:
+        """Close the listener and open connections, then stop the IPC loop."""
+        self.socket_server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        asyncio.get_running_loop().stop()
+
+    def _cleanup(self) -> None:
+        """Cleanup on shutdown."""
+        self.config_watcher.running = False
+        self.relief.undo_all()  # Never leave apps frozen or throttled behind us
+        self.notifier.stop()
+        self.pressure.close()
+        self.history.close()
+        if self.trace is not None:
+            self.trace.close()
+        self.config_writer.flush()  # Logs a failure itself
+        if self.ipc_loop is not None:
+            asyncio.run_coroutine_threadsafe(self._stop_socket_server(), self.ipc_loop)
+            self.ipc_thread.join(timeout=2)
+        self.close()
+        if SOCKET_PATH.exists():
+            SOCKET_PATH.unlink()
+
+    def run(self) -> None:
+        """Main daemon loop."""
+        self._log("RAM Guardian starting...")
+
+        # Setup signal handlers
+        def handle_signal(signum, frame):
+            self._log("Shutting down...")
+            self.running = False
+            self._wake()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        signal.signal(signal.SIGINT, handle_signal)
+        signal.signal(signal.SIGHUP, lambda signum, frame: self._request_reload())
+
+        # Start socket server and notification dispatcher
+        self._start_socket_server()
+        self.notifier.start()
+
+        if not self.config_watcher.start():
+            self._log("inotify unavailable; reload config with SIGHUP")
+
+        # Wake on memory pressure; the interval becomes a slow heartbeat
+        poller = select.poll()
+        poller.register(self._wake_r, select.POLLIN)
+        if self.policy.pressure_enabled:
+            if self.pressure.open():
+                poller.register(self.pressure.fd, self.pressure.events)
+                self._log(f"Waking on memory pressure from {self.pressure.path}")
+            else:
+                self._log(f"PSI unavailable ({self.pressure.error}); polling every "
+                          f"{self.policy.check_interval}s")
+
+        if self.policy.history_enabled:
+            try:
+                self.history.open()
+            except (OSError, ValueError) as e:
+                self._log(f"History log unavailable: {e}")
+        if self.trace is not None:
+            try:
+                self.trace.open()
+                self._log(f"Recording a trace to {self.trace.path}")
+            except OSError as e:
+                self._log(f"Trace unavailable: {e}")
+
+        metrics = self.metrics
+        try:
+            while self.running:
+                tick_start = time.perf_counter()
+                if self._reload_requested.is_set():
+                    self._reload_requested.clear()
+                    self._reload_config()
+                with metrics.timer("sample"):
+                    self._sample_system()
+                if self._scan_due():
+                    with metrics.timer("scan"):
+                        self._scan_processes()
+                if self.history.active:
+                    self.history.append(self.clock.time(), self.state)
+                with metrics.timer("notify"):
+                    self._check_and_notify()
+                with metrics.timer("relief"):
+                    self._relieve_pressure()
+                if self.trace is not None:
+                    self._commit_trace()
+                self._publish_status()
+                metrics.tick(time.perf_counter() - tick_start, self.sample_interval)
+                if self.policy.metrics_textfile:
+                    self._write_metrics_textfile()
+
+                slow = self.policy.heartbeat if self.pressure.active else self.policy.check_interval
+                self.sample_interval = self.policy.sample_interval(self.state.memory_percent, slow)
+                for fd, events in poller.poll(self.sample_interval * 1000):
+                    if fd == self._wake_r:
+                        while True:
+                            try:
+                                os.read(self._wake_r, 64)
+                            except BlockingIOError:
+                                break
+                    elif events & (select.POLLERR | select.POLLNVAL | select.POLLHUP):
+                        # The cgroup went away; fall back to fixed-interval polling
+                        poller.unregister(fd)
+                        self.pressure.close()
+                        self._log("Pressure trigger lost; falling back to interval polling")
+                    else:
+                        self.pressure.consume()
+        finally:
+            self._cleanup()
+            self._log("RAM Guardian stopped.")
+
+
+
+# === Trace replay ===
+
+class _TraceClock:
+    """The clock a replayed RamGuard reads instead of the time module.
+
+    Rate limits, growth windows and relief timers then run on the trace's
+    recorded time; the replay sets now and mono before each tick.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+        self.mono = 0.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.mono
+
+
+@dataclass(slots=True)
+class TraceEvent:
+    time: float  # Unix time, from the trace
+    kind: str  # alert, notify, limit, throttle, release, reclaim, freeze, thaw or kill
+    subject: str  # app, or notification title
+    detail: str
+
+
+@dataclass
+class TraceReport:
+    files: int = 0
+    ticks: int = 0
+    scans: int = 0
+    first: Optional[float] = None  # Unix time of the first and last tick
+    last: Optional[float] = None
+    elapsed: float = 0.0  # seconds the replay took
+    events: list[TraceEvent] = field(default_factory=list)
+
+    def counts(self) -> dict[str, int]:
+        return dict(Counter(event.kind for event in self.events))
+
+
+class ReplayScanner(ProcessScanner):
+    """Serves a trace's scans and reads instead of reading /proc.
+
+    Reads are answered with the last value recorded for the PID, so a
+    replayed config that reads more (say, a larger accounting.top_k) gets
+    what is known and RSS estimates for the rest.
+    """
+
+    def __init__(self):
+        super().__init__(Path("/nonexistent"))
+        self.rows: list[tuple[int, int, int, str, Optional[list[str]], list[tuple[int, int]], int]] = []
+        self.reads: dict[str, dict[int, object]] = {"cmd": {}, "exe": {}, "smaps": {}, "oom": {}}
+        self.focus: Optional[int] = None
+
+    def load(self, record: dict) -> None:
+        """Take in one trace line (or a file header)."""
+        for kind, known in self.reads.items():
+            for pid, value in record.get(kind, {}).items():
+                known[int(pid)] = tuple(value) if kind != "cmd" and value is not None else value
+        if "focus" in record:
+            self.focus = record["focus"]
+        if "born" in record:
+            start_times = dict(self.start_times)
+            for pid in record.get("died", ()):
+                start_times.pop(pid, None)
+            start_times.update((int(pid), start) for pid, start in record["born"].items())
+            self.start_times = start_times
+        if "rows" in record:
+            self.rows = [
+                (pid, start, rss, name, cmdline, list(zip(flat[::2], flat[1::2])), cpu)
+                for pid, start, rss, name, cmdline, flat, cpu in record["rows"]
+            ]
+
+    def scan(
+        self, min_rss: int, is_excluded: Callable[[str], bool], pids: Optional[Iterable[int]] = None
+    ) -> list[tuple[int, int, int, str, Optional[list[str]], list[tuple[int, int]], int]]:
+        rows = [row for row in self.rows if not is_excluded(row[3])]
+        self.stats = ScanStats(
+            total=len(self.start_times), whitelisted=len(self.rows) - len(rows), kept=len(rows)
+        )
+        return rows
+
+    def read_cmdline(self, pid: int) -> Optional[list[str]]:
+        return self.reads["cmd"].get(pid)
+
+    def read_exe_id(self, pid: int) -> Optional[tuple[int, int]]:
+        return self.reads["exe"].get(pid)
+
+    def read_smaps_rollup(self, pid: int) -> Optional[tuple[int, int]]:
+        return self.reads["smaps"].get(pid)
+
+    def read_oom(self, pid: int) -> Optional[tuple[int, int]]:
+        return self.reads["oom"].get(pid)
+
+    def read_start_time(self, pid: int) -> Optional[int]:
+        return self.start_times.get(pid)
+
+
+class ReplayLimiter(CgroupLimiter):
+    """Records what the limiter would have done instead of touching cgroupfs."""
+
+    def __init__(self, record: Callable[[str, str, str], None], live: Callable[[], AbstractSet[int]]):
+        super().__init__(Path("/nonexistent"))
+        self._record = record
+        self._live = live
+        self._apps: dict[Path, str] = {}
+        self._members: dict[Path, set[int]] = {}
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def _join(self, app: str, pids: list[int]) -> Path:
+        scope = self.scope_path(app)
+        self._apps[scope] = app
+        self._members.setdefault(scope, set()).update(pids)
+        return scope
+
+    def apply(self, app: str, pids: list[int], limit_mb: int) -> list[int]:
+        self._join(app, pids)
+        self._record("limit", app, f"{limit_mb}MB on {len(pids)} processes")
+        return list(pids)
+
+    def move(self, app: str, pids: list[int]) -> tuple[Path, list[int]]:
+        return self._join(app, pids), list(pids)
+
+    def cgroup_of(self, pid: int) -> Optional[Path]:
+        return None  # Not recorded; replayed apps always get a scope
+
+    def members(self, scope: Path) -> list[int]:
+        live = self._live()
+        return [pid for pid in self._members.get(scope, ()) if pid in live]
+
+    def current(self, scope: Path) -> Optional[int]:
+        return None
+
+    def set_high(self, scope: Path, high: Optional[int]) -> None:
+        if high is None:
+            self._record("release", self._apps[scope], "")
+        else:
+            self._record("throttle", self._apps[scope], f"memory.high {high / MIB:.0f}MB")
+
+    def reclaim(self, scope: Path, amount: int) -> None:
+        self._record("reclaim", self._apps[scope], f"{amount / MIB:.0f}MB")
+
+    def freeze(self, scope: Path, frozen: bool) -> None:
+        self._record("freeze" if frozen else "thaw", self._apps[scope], "")
+
+    def kill(self, scope: Path) -> None:
+        self._members.pop(scope, None)
+        self._record("kill", self._apps[scope], "")
+
+    def prune(self) -> None:
+        pass
+
+
+class ReplayNotifier:
+    """Takes the notifications a replay would have sent."""
+
+    depth = sent = coalesced = dropped = 0
+
+    def __init__(self, record: Callable[[str, str, str], None]):
+        self._record = record
+
+    def submit(self, title: str, body: str, urgency: str,
+               actions: list[tuple[str, str]], category: str) -> bool:
+        self._record("alert" if category == "ramguard-alert" else "notify", title, body)
+        return True
+
+
+def read_trace(path: Path) -> Iterator[dict]:
+    """The lines of one trace file; one cut short by a crash ends at its last whole line."""
+    with gzip.open(path, "rb") as f:
+        try:
+            for line in f:
+                if line.endswith(b"\n"):
+                    yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile):
+            return
+
+
+def config_override(setting: str) -> dict:
+    """Parse "section.key=value" (value in TOML syntax, else a string) into a config fragment."""
+    key, sep, text = setting.partition("=")
+    section, dot, name = key.strip().partition(".")
+    if not sep or not dot:
+        raise ValueError(f"expected section.key=value, got {setting!r}")
+    try:
+        value = tomllib.loads(f"v = {text}")["v"]
+    except tomllib.TOMLDecodeError:
+        value = text
+    return {section: {name: value}}
+
+
+def replay_trace(
+    paths: list[Path], config: Optional[dict] = None, overrides: Iterable[dict] = ()
+) -> TraceReport:
+    """Feed recorded ticks through the daemon's own policy logic, as fast as they go.
+
+    config defaults to the one recorded in the first file; overrides are
+    merged on top. Nothing is limited, frozen, killed or notified: the
+    limiter and notifier only record what they were asked to do. Scans
+    happen where the trace has them, whatever the replayed sampling
+    settings say. The replay is open loop: later ticks come from the trace,
+    so they don't show memory that replayed limits or kills would have freed.
+    """
+    report = TraceReport()
+    clock = _TraceClock()
+    scanner = ReplayScanner()
+    guard: Optional[RamGuard] = None
+    offset = 0.0  # keeps replayed monotonic time running across daemon restarts
+    rebase = False
+
+    def record(kind: str, subject: str, detail: str) -> None:
+        report.events.append(TraceEvent(clock.now, kind, subject, detail))
+
+    start = time.perf_counter()
+    try:
+        for path in paths:
+            report.files += 1
+            for line in read_trace(path):
+                if "trace" in line:  # File header
+                    if line["trace"] != TRACE_VERSION:
+                        raise ValueError(f"{path}: unsupported trace version {line['trace']}")
+                    if guard is None:
+                        merged = copy.deepcopy(DEFAULT_CONFIG)
+                        RamGuard._deep_merge(merged, config if config is not None else line["config"])
+                        for override in overrides:
+                            RamGuard._deep_merge(merged, override)
+                        # Inputs come from the trace; nothing is written anywhere
+                        merged["accounting"]["source"] = "proc"
+                        merged["history"]["enabled"] = False
+                        merged["metrics"]["textfile"] = ""
+                        merged["trace"]["enabled"] = False
+                        guard = RamGuard(config=merged, scanner=scanner, clock=clock)
+                        guard.limiter = guard.relief.limiter = ReplayLimiter(
+                            record, lambda: scanner.start_times.keys()
+                        )
+                        guard.notifier = ReplayNotifier(record)
+                        guard._log = guard.relief.log = lambda msg: None
+                        guard.focus_source = lambda: scanner.focus
+                    scanner.load(line)
+                    rebase = report.ticks > 0
+                    continue
+                if guard is None:
+                    raise ValueError(f"{path}: no trace header")
+
+                if rebase:
+                    offset = clock.mono + max(0.0, line["t"] - clock.now) - line["m"]
+                    rebase = False
+                clock.now, clock.mono = line["t"], line["m"] + offset
+                scanner.load(line)
+                # The tick as run() does it
+                guard._apply_sample(*line["mem"], line.get("psi"))
+                if "rows" in line:
+                    guard._scan_processes()
+                    report.scans += 1
+                guard._check_and_notify()
+                guard._relieve_pressure()
+                report.ticks += 1
+                if report.first is None:
+                    report.first = clock.now
+                report.last = clock.now
+    finally:
+        if guard is not None:
+            guard.close()
+        report.elapsed = time.perf_counter() - start
+    return report